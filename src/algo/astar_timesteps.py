@@ -1,18 +1,10 @@
-import copy
 import math
-import matplotlib.pyplot as plt
 import numpy as np
-import time
-
-from heapq import heappop, heappush, heapify
-from random import randint
-from IPython.display import HTML
-from PIL import Image, ImageDraw, ImageOps
-from IPython.display import Image as Img
-from IPython.display import display
+
 from sys import float_info
 
 from src.grid import Map, manhattan_distance
+from src.path import compact_path
 
 
 EPS = float_info.epsilon
@@ -27,14 +19,17 @@ class Node:
     - h: h-value of the node // always 0 for Dijkstra
     - f: f-value of the node // always equal to g-value for Dijkstra
     - parent: pointer to the parent-node 
+    - t: time moment, which identifies the state together with (i, j) // equal to g-value by default,
+      but all moments after the last move of dynamic obstacles are the same state
 
     '''
     
-    def __init__(self, i, j, g = 0, h = 0, f = None, parent = None):
+    def __init__(self, i, j, g = 0, h = 0, f = None, parent = None, t = None):
         self.i = i
         self.j = j
         self.g = g
         self.h = h
+        self.t = g if t is None else t
         if f is None:
             self.f = self.g + h
         else:
@@ -47,15 +42,15 @@ class Node:
         Estimating where the two search nodes are the same,
         which is needed to detect dublicates in the search tree.
         '''
-        return (self.i == other.i) and (self.j == other.j) and (self.g == other.g)
+        return (self.i == other.i) and (self.j == other.j) and (self.t == other.t)
     
     
     def __hash__(self):
         '''
         To implement CLOSED as set of nodes we need Node to be hashable.
         '''
-        ijg = self.i, self.j, self.g
-        return hash(ijg)
+        ijt = self.i, self.j, self.t
+        return hash(ijt)
 
 
     def __lt__(self, other): 
@@ -159,19 +154,111 @@ def compute_cost(i1, j1, i2, j2):
         raise Exception('Trying to compute the cost of non-supported move!')
         
         
+def obstacle_period(obstacle, prefix = 0):
+    '''
+    Returns the minimal period of the trajectory after the first prefix moments
+    (the trajectory must contain at least two full periods), or None if the trajectory is not periodic.
+    '''
+    n = len(obstacle)
+    for p in range(1, (n - prefix) // 2 + 1):
+        if obstacle[prefix + p:] == obstacle[prefix:n - p]:
+            return p
+    return None
+
+
+def detect_period(dyn_obst_traj, prefix = 0):
+    '''
+    Returns the global period of the set of obstacles after the first prefix moments
+    (the least common multiple of periods of all trajectories), or None if some trajectory is not periodic.
+    '''
+    period = 1
+    for obstacle in dyn_obst_traj:
+        p = obstacle_period(obstacle, prefix)
+        if p is None:
+            return None
+        period = math.lcm(period, p)
+    return period
+
+
 class CATable:
     '''
-    Class, which implements collision avoidance table for effective checking collisions with dynamic obstacles
+    Class, which implements collision avoidance table for effective checking collisions with dynamic obstacles.
+    
+    By default every obstacle stays in the last cell of its trajectory forever, so after the horizon
+    (the last moment of the longest trajectory) the environment does not change anymore.
+    
+    If the period is given (or detected with period='auto'), obstacles are periodic: after the
+    transient prefix they repeat their moves with the global period forever. Then the moments t and
+    t + period (t >= prefix) are the same state of the environment.
     '''
-    def __init__(self, dyn_obst_traj):       
+    def __init__(self, dyn_obst_traj, period = None, prefix = 0):       
         self.pos_time_table = dict()
         self.max_time_table = dict()
+        dyn_obst_traj = self._prepare_trajectories(dyn_obst_traj, period, prefix)
         
         for obst_id, obstacle in enumerate(dyn_obst_traj):
             for t, (i, j) in enumerate(obstacle):
                 self.pos_time_table[(i, j, t)] = obst_id
             
-            self.max_time_table[obstacle[-1]] = len(obstacle) - 1 
+            if self.period is None:
+                last = tuple(obstacle[-1])
+                self.max_time_table[last] = min(len(obstacle) - 1, self.max_time_table.get(last, math.inf))
+                
+                
+    def _prepare_trajectories(self, dyn_obst_traj, period, prefix):
+        '''
+        Sets the time model of the table (horizon or period and prefix)
+        and returns the trajectories, which should be stored in the table.
+        '''
+        self.horizon = 0
+        self.period = None
+        self.prefix = prefix
+        
+        if period == 'auto':
+            period = detect_period(dyn_obst_traj, prefix)
+            if period is not None and prefix + period > max([len(obstacle) for obstacle in dyn_obst_traj], default=0):
+                # the cycle is longer than the given trajectories, folding will not help
+                period = None
+        
+        if period is not None:
+            self.period = period
+            self.horizon = None
+            return [self._unroll(obstacle) for obstacle in dyn_obst_traj]
+        
+        self.horizon = max([len(obstacle) - 1 for obstacle in dyn_obst_traj], default=0)
+        return dyn_obst_traj
+                
+                
+    def _unroll(self, obstacle):
+        '''
+        Returns the first prefix + period moments of the periodic trajectory.
+        '''
+        length = self.prefix + self.period
+        if len(obstacle) >= length:
+            for t in range(length, len(obstacle)):
+                if obstacle[t] != obstacle[t - self.period]:
+                    raise Exception("Trajectory is not periodic with period", self.period)
+            return obstacle[:length]
+        
+        p = obstacle_period(obstacle, self.prefix)
+        if p is None or self.period % p != 0:
+            raise Exception("Trajectory is not periodic with period", self.period)
+        return [obstacle[self.prefix + (t - self.prefix) % p] if t >= self.prefix else obstacle[t] for t in range(length)]
+            
+            
+    def state_time(self, t):
+        '''
+        Returns the time moment, which identifies search states at moment t.
+        All moments after the horizon are equivalent, so the search over (i, j, t) states
+        turns into the static search over (i, j) cells and becomes finite.
+        For periodic obstacles moments are folded by the period after the prefix,
+        so the number of states is bounded by the period instead of the path length.
+        '''
+        if self.period is None:
+            return min(t, self.horizon)
+        if t < self.prefix:
+            return t
+        return self.prefix + (t - self.prefix) % self.period
             
             
     def __check_pos_at_time(self, i, j, t):
@@ -191,7 +278,9 @@ class CATable:
             False, if cell is occupied at time moment t
             True, if not occupied at time moment t
         '''
-        return not ((i, j, t) in self.pos_time_table)
+        if self.period is not None:
+            t = self.state_time(t)
+        return not ((i, j, t) in self.pos_time_table) and not t >= self.max_time_table.get((i, j), math.inf)
            
         
     def __check_rev_move(self, i1, j1, i2, j2, t_start):
@@ -213,7 +302,11 @@ class CATable:
             True if the given move does not result in the edge collision
             False if the given move does results in the edge collision
         '''
-        return not ((i2, j2, t_start) in self.pos_time_table and (i1, j1, t_start + 1) in self.pos_time_table)
+        t_end = t_start + 1
+        if self.period is not None:
+            t_start = self.state_time(t_start)
+            t_end = self.state_time(t_end)
+        return not ((i2, j2, t_start) in self.pos_time_table and (i1, j1, t_end) in self.pos_time_table)
 
     
     def check_move(self, i1, j1, i2, j2, t_start):
@@ -240,6 +333,104 @@ class CATable:
         return self.__check_rev_move(i1, j1, i2, j2, t_start) and self.__check_pos_at_time(i2, j2, t_start + 1)
     
     
+    def check_moves(self, i, j, t_start, cells):
+        '''
+        Checks the moves from (i, j) to every cell of cells at moment (t_start -> t_start+1).
+        Returns the list of cells, which can be reached without collisions.
+        '''
+        return [(i_n, j_n) for (i_n, j_n) in cells if self.check_move(i, j, i_n, j_n, t_start)]
+    
+    
+class DenseCATable(CATable):
+    '''
+    Collision avoidance table with the same time model as CATable, which stores occupancy of cells
+    as a bit-packed (time x column) NumPy matrix instead of the dict of (i, j, t) tuples.
+    Only the cells visited by obstacles get columns (columns[i * width + j], -1 for the other cells):
+    bit (c & 7) of byte bits[t, c >> 3] is set if the cell of column c is occupied at moment t.
+    Only the moments up to the horizon (or prefix + period for periodic obstacles) are stored,
+    later moments are mapped to them by state_time.
+
+    Memory is times * visited_cells / 8 bytes plus 4 bytes per cell of the map for columns. With a row per cell
+    of the map it was times * area / 8, e.g. about 72 MB for a 512 x 512 map and the horizon of 2200 steps
+    (see launch_catable_benchmark on uncropped maps); now it grows with the number of obstacles, not with the map.
+    '''
+    def __init__(self, grid_map, dyn_obst_traj, period = None, prefix = 0):
+        self._height, self._width = grid_map.get_size()
+        dyn_obst_traj = self._prepare_trajectories(dyn_obst_traj, period, prefix)
+        times = (self.horizon + 1) if self.period is None else (self.prefix + self.period)
+
+        trajectories = []
+        for obstacle in dyn_obst_traj:
+            positions = np.asarray(obstacle, dtype=np.int64).reshape(-1, 2)
+            if self.period is None and len(positions) < times:
+                # obstacle stays in the last cell till the horizon
+                positions = np.concatenate([positions, np.repeat(positions[-1:], times - len(positions), axis=0)])
+            t = np.arange(len(positions))
+            inside = (positions[:, 0] >= 0) & (positions[:, 0] < self._height) & (positions[:, 1] >= 0) & (positions[:, 1] < self._width)
+            trajectories.append((t[inside], positions[inside, 0] * self._width + positions[inside, 1]))
+
+        visited = np.unique(np.concatenate([cells for _, cells in trajectories] + [np.zeros(0, dtype=np.int64)]))
+        self.columns = np.full(self._height * self._width, -1, dtype=np.int32)
+        self.columns[visited] = np.arange(len(visited), dtype=np.int32)
+        self.bits = np.zeros((times, max((len(visited) + 7) // 8, 1)), dtype=np.uint8)
+        for t, cells in trajectories:
+            c = self.columns[cells]
+            np.bitwise_or.at(self.bits, (t, c >> 3), (1 << (c & 7)).astype(np.uint8))
+        self._rows = [memoryview(row) for row in self.bits]
+        self._column_of = dict(zip(visited.tolist(), range(len(visited))))
+
+
+    def occupied(self, i, j, t):
+        '''
+        Checks, that cell (i, j) is occupied at moment t
+        '''
+        if not (0 <= i < self._height and 0 <= j < self._width):
+            return False
+        c = self._column_of.get(i * self._width + j)
+        return c is not None and bool(self._rows[self.state_time(t)][c >> 3] >> (c & 7) & 1)
+
+
+    def check_move(self, i1, j1, i2, j2, t_start):
+        return bool(self.check_moves_array(i1, j1, i2, j2, t_start))
+
+
+    def check_moves(self, i, j, t_start, cells):
+        '''
+        Checks the moves from (i, j) to every cell of cells at moment (t_start -> t_start+1)
+        by one call of check_moves_array. Returns the list of cells, which can be reached without collisions.
+        '''
+        cells = list(cells)
+        if len(cells) == 0:
+            return []
+        targets = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        valid = self.check_moves_array(i, j, targets[:, 0], targets[:, 1], t_start)
+        return [cell for cell, ok in zip(cells, valid.tolist()) if ok]
+
+
+    def check_moves_array(self, i1, j1, i2, j2, t_start):
+        '''
+        Vectorized check_move for NumPy arrays of moves (the main path of the table, check_move and check_moves
+        call it). Returns the boolean array of valid moves.
+        '''
+        i1, j1, i2, j2, t_start = np.broadcast_arrays(*map(np.asarray, (i1, j1, i2, j2, t_start)))
+        t_end = t_start + 1
+        if self.period is None:
+            t_start = np.minimum(t_start, self.horizon)
+            t_end = np.minimum(t_end, self.horizon)
+        else:
+            t_start = np.where(t_start < self.prefix, t_start, self.prefix + (t_start - self.prefix) % self.period)
+            t_end = np.where(t_end < self.prefix, t_end, self.prefix + (t_end - self.prefix) % self.period)
+
+        def occupied(i, j, t):
+            inside = (i >= 0) & (i < self._height) & (j >= 0) & (j < self._width)
+            c = self.columns[np.where(inside, i * self._width + j, 0)]
+            visited = inside & (c >= 0)
+            c = np.where(visited, c, 0)
+            return visited & ((self.bits[t, c >> 3] >> (c & 7)) & 1 == 1)
+
+        return ~occupied(i2, j2, t_end) & ~(occupied(i2, j2, t_start) & occupied(i1, j1, t_end))
+
+
 def get_neighbors_wrt_time(i, j, t, grid_map, ca_table):
     '''
     Returns a list of neighbouring cells as (i, j) tuples. 
@@ -268,18 +459,16 @@ def get_neighbors_wrt_time(i, j, t, grid_map, ca_table):
 
     neighbors = grid_map.get_neighbors(i, j)
     neighbors.append((i, j))
-    result = []
-
-    for (i_n, j_n) in neighbors:
-        if ca_table.check_move(i, j, i_n, j_n, t):
-            result.append((i_n, j_n))
 
-    return result
+    return ca_table.check_moves(i, j, t, neighbors)
 
 
-def astar_timesteps(grid_map, ca_table, start_i, start_j, goal_i, goal_j, heuristic_func = None, search_tree = None):
+def astar_timesteps(grid_map, ca_table, start_i, start_j, goal_i, goal_j, heuristic_func = None, search_tree = None, stats = None,
+                    trace = None, keep_lists = True, compact = False):
     '''
     Runs A* search algorithm without re-expansion on dynamic obstacles domain.
+    States after the horizon of ca_table are collapsed into static (i, j) states,
+    so the search always terminates and proves that the goal is unreachable if there is no path.
 
     Parameters
     ----------
@@ -295,27 +484,51 @@ def astar_timesteps(grid_map, ca_table, start_i, start_j, goal_i, goal_j, heuris
         Heuristic function
     search_tree : type 
         Search tree data structure
+    stats : SearchStats
+        Optional instrumentation counters and timers (None -- no instrumentation)
+    trace : TraceBuffer or TraceFile
+        Optional sink of expansion trace records (None -- no tracing)
+    keep_lists : bool
+        Return OPEN and CLOSED (default). If False, they are None, so the search tree is released right after the search
+    compact : bool
+        Return CompactPath of the found path instead of the last node (it keeps no references to the search tree)
 
     Returns
     -------
     path_found : bool
         Path was found or not.  
-    last_node : Node
-        The last node in path. None if path was not found.
+    last_node : Node or CompactPath
+        The last node in path (CompactPath if compact). None if path was not found.
     steps : int
         The number of search steps
     noodes_created : int
         The number of nodes, which were created and stored during the search process (size of the resultant search tree)
     open : iterable object
-        Iterable collection of OPEN nodes
+        Iterable collection of OPEN nodes (None if not keep_lists)
     expanded : iterable object
-        Iterable collection of the expanded nodes
+        Iterable collection of the expanded nodes (None if not keep_lists)
     '''
 
+    if stats is not None:
+        return stats.record(lambda domain, tree: astar_timesteps(grid_map, domain, start_i, start_j, goal_i, goal_j, heuristic_func,
+                                          tree, trace=trace, keep_lists=keep_lists, compact=compact),
+                            ca_table, search_tree)
+    if trace is not None:
+        return trace.record(lambda tree: astar_timesteps(grid_map, ca_table, start_i, start_j, goal_i, goal_j, heuristic_func,
+                                          tree, keep_lists=keep_lists, compact=compact),
+                            search_tree)
+
     ast = search_tree()
     steps = 0
     nodes_created = 0
 
+    def lists():
+        return (ast.OPEN, ast.CLOSED) if keep_lists else (None, None)
+
+    if not grid_map.connected(start_i, start_j, goal_i, goal_j):
+        # the goal is in another component of the static map
+        return (False, None, steps, nodes_created, *lists())
+
     start_node = Node(start_i, start_j, g=0, h=heuristic_func(start_i, start_j, goal_i, goal_j))
 
     ast.add_to_open(start_node)
@@ -326,16 +539,17 @@ def astar_timesteps(grid_map, ca_table, start_i, start_j, goal_i, goal_j, heuris
         node = ast.get_best_node_from_open()
                 
         if node is None:
-            return (False, None, steps, nodes_created, ast.OPEN, ast.CLOSED)
+            return (False, None, steps, nodes_created, *lists())
         if node.i == goal_i and node.j == goal_j:
-            return (True, node, steps, nodes_created, ast.OPEN, ast.CLOSED)
+            return (True, compact_path(node) if compact else node, steps, nodes_created, *lists())
         
         successors = list(map(
             lambda neighbor: Node(
                 i=neighbor[0], j=neighbor[1], 
                 g=node.g + compute_cost(node.i, node.j, neighbor[0], neighbor[1]),
                 h=heuristic_func(neighbor[0], neighbor[1], goal_i, goal_j),
-                parent=node
+                parent=node,
+                t=ca_table.state_time(node.g + compute_cost(node.i, node.j, neighbor[0], neighbor[1]))
             ),
             get_neighbors_wrt_time(node.i, node.j, node.g, grid_map, ca_table)
         ))
@@ -348,5 +562,5 @@ def astar_timesteps(grid_map, ca_table, start_i, start_j, goal_i, goal_j, heuris
                 
         ast.add_to_closed(node)
     
-    return (False, None, steps, nodes_created, ast.OPEN, ast.CLOSED)
+    return (False, None, steps, nodes_created, *lists())
  
@@ -0,0 +1,264 @@
+import time
+
+from heapq import heappop, heappush
+
+from src.grid import SafeMap, SafeMapView, manhattan_distance
+from src.path import compact_path
+from src.algo.sipp import sipp, SearchTree
+
+
+class ConstrainedSafeMap(SafeMapView):
+    '''
+    SafeMap of one agent in Conflict-Based Search.
+    Vertex constraints (i, j, t) forbid the agent to be in cell (i, j) at moment t, they are expressed
+    as extra unsafe moments that split safe intervals of the base SafeMap.
+    Edge constraints (i, j, to_i, to_j, t) forbid the move from (i, j) to (to_i, to_j), which ends at moment t:
+    like the moves of dynamic obstacles in out_moves, they delay the arrival by get_neighbors.
+    The agent may pass its goal cell before the last vertex constraint of it: sipp with stay_at_goal
+    accepts only the arrival in the last (unbounded) safe interval of the goal.
+    '''
+
+    def __init__(self, safe_map, constraints):
+        super().__init__(safe_map)
+        self._constraints = dict()
+        self._edges = dict()
+        for constraint in constraints:
+            if len(constraint) == 5:
+                i, j, to_i, to_j, t = constraint
+                self._edges.setdefault((i, j), set()).add((to_i, to_j, t))
+                continue
+            i, j, t = constraint
+            if not (i, j) in self._constraints:
+                self._constraints[(i, j)] = []
+            self._constraints[(i, j)].append(t)
+        for times in self._constraints.values():
+            times.sort()
+        self._constrained_rows = set(i for (i, j) in self._constraints)
+
+
+    def _row_changed(self, i):
+        return i in self._constrained_rows
+
+
+    def _cell_changed(self, i, j):
+        return (i, j) in self._constraints
+
+
+    def _make_cell_intervals(self, i, j, base_intervals):
+        times = self._constraints[(i, j)]
+        intervals = []
+        for (start, end, out_moves) in base_intervals:
+            for t in times:
+                if start < t < end:
+                    if t - start > 1:
+                        intervals.append((start, t, out_moves))
+                    start = t
+                    out_moves = set()
+            if end - start > 1:
+                intervals.append((start, end, out_moves))
+        return intervals
+
+
+    def get_neighbors(self, i, j, t):
+        neighbors = super().get_neighbors(i, j, t)
+        edges = self._edges.get((i, j))
+        if edges is None:
+            return neighbors
+
+        # the forbidden move is made one step later, if the agent can wait in (i, j) and is still safe in the neighbour
+        f = self.intervals[i][j][self.get_interval(i, j, t)][1]
+        allowed = []
+        for (di, dj, t_in) in neighbors:
+            interval = self.get_interval(di, dj, t_in)
+            while (di, dj, t_in) in edges:
+                t_in += 1
+            if t_in > f or t_in >= self.intervals[di][dj][interval][1]:
+                continue
+            allowed.append((di, dj, t_in))
+        return allowed
+
+
+
+class CTNode:
+    '''
+    Node of the constraint tree
+
+    - constraints: constraints of every agent as frozensets of (i, j, t) and (i, j, to_i, to_j, t)
+    - paths: position of every agent at every timestep
+    - cost: sum of the lengths of the paths
+    '''
+
+    def __init__(self, constraints, paths):
+        self.constraints = constraints
+        self.paths = paths
+        self.cost = sum(len(path) - 1 for path in paths)
+
+
+
+def find_conflict(paths):
+    '''
+    Finds the first conflict between the paths using hashed timestep occupancy.
+    Agents stay in their goal cells after the end of their paths.
+
+    Returns
+    -------
+    tuple or None
+        (agent_1, agent_2, constraint_1, constraint_2) -- the constraints of the first and the second agent,
+        which resolve the conflict: vertex constraints (i, j, t) for a vertex conflict, edge constraints
+        (i, j, to_i, to_j, t) for a swap conflict. None if there are no conflicts
+    '''
+    horizon = max(len(path) for path in paths)
+    occupied = dict()
+    moves = dict()
+    for t in range(horizon):
+        for agent, path in enumerate(paths):
+            i, j = path[min(t, len(path) - 1)]
+            other = occupied.get((i, j, t))
+            if other is not None:
+                return other, agent, (i, j, t), (i, j, t)
+            occupied[(i, j, t)] = agent
+
+            if 0 < t < len(path):
+                prev_i, prev_j = path[t - 1]
+                if (prev_i, prev_j) != (i, j):
+                    other = moves.get((i, j, prev_i, prev_j, t))
+                    if other is not None:
+                        # swap conflict, each agent is forbidden to make its move
+                        return other, agent, (i, j, prev_i, prev_j, t), (prev_i, prev_j, i, j, t)
+                    moves[(prev_i, prev_j, i, j, t)] = agent
+    return None
+
+
+
+def cbs(grid_map,
+        dyn_obst_traj,
+        agents,
+        heuristic_func = manhattan_distance,
+        search_tree = SearchTree,
+        max_nodes = 10000,
+        time_limit = None,
+        safe_map = None):
+    '''
+    Conflict-Based Search with SIPP as the low-level planner.
+
+    Every agent is planned with sipp on a ConstrainedSafeMap, which layers constraints of the agent
+    over the base SafeMap. Child nodes of the constraint tree replan only the constrained agent,
+    the paths of other agents are shared with the parent. Low-level paths are cached by
+    (agent, constraints), so the same low-level search is never repeated, and constraint tree
+    nodes with the same constraints are generated only once.
+    Vertex conflicts are resolved by vertex constraints and swap conflicts by edge constraints on the moves
+    of the agents. Agents stay in their goal cells forever, so they reach them only in the last (unbounded)
+    safe interval.
+
+    Parameters
+    ----------
+    grid_map : Map
+        Static grid map
+    dyn_obst_traj : list[list[tuple[int, int]]]
+        Trajectories of dynamic obstacles
+    agents : iterable of tuple[int, int, int, int]
+        (start_i, start_j, goal_i, goal_j) of every agent (e.g. scenarios from iter_scenarios)
+    heuristic_func : function
+        Heuristic function
+    search_tree : type
+        Search tree data structure of sipp
+    max_nodes : int
+        Maximal number of expanded constraint tree nodes
+    time_limit : float
+        Time limit in seconds (None -- no limit)
+    safe_map : SafeMap
+        Already built SafeMap of grid_map and dyn_obst_traj (None -- build a new one)
+
+    Returns
+    -------
+    solution_found : bool
+        Conflict-free paths were found or not
+    paths : list[list[tuple[int, int]]]
+        Position of every agent at every timestep. None if solution was not found
+    stat : dict
+        "expandedNodes", "generatedNodes", "lowLevelCalls", "cacheHits", "cost" and "time" (in seconds)
+    '''
+
+    start_time = time.perf_counter()
+    agents = list(agents)
+    if safe_map is None:
+        safe_map = SafeMap(grid_map, dyn_obst_traj)
+
+    stat = dict()
+    stat["expandedNodes"] = 0
+    stat["generatedNodes"] = 0
+    stat["lowLevelCalls"] = 0
+    stat["cacheHits"] = 0
+    stat["cost"] = None
+
+    cache = dict()
+
+    def plan_agent(agent, constraints):
+        key = (agent, constraints)
+        if key in cache:
+            stat["cacheHits"] += 1
+            return cache[key]
+
+        stat["lowLevelCalls"] += 1
+        start_i, start_j, goal_i, goal_j = agents[agent][:4]
+        agent_map = ConstrainedSafeMap(safe_map, constraints) if constraints else safe_map
+        path = None
+        if agent_map.traversable(start_i, start_j, 0):
+            result = sipp(agent_map, start_i, start_j, goal_i, goal_j, heuristic_func, search_tree, keep_lists=False,
+                          stay_at_goal=True)
+            if result[0]:
+                # positions keep the waits at the start, so the timesteps of the path are not shifted
+                path = [tuple(position) for position in compact_path(result[1]).positions().tolist()]
+        cache[key] = path
+        return path
+
+    def finish(found, paths):
+        stat["time"] = time.perf_counter() - start_time
+        return found, paths, stat
+
+    constraints = tuple(frozenset() for _ in agents)
+    paths = [plan_agent(agent, constraints[agent]) for agent in range(len(agents))]
+    if any(path is None for path in paths):
+        return finish(False, None)
+
+    root = CTNode(constraints, paths)
+    open_list = []
+    counter = 0
+    heappush(open_list, (root.cost, counter, root))
+    stat["generatedNodes"] += 1
+    generated = {constraints}
+
+    while open_list:
+        if stat["expandedNodes"] >= max_nodes:
+            break
+        if time_limit is not None and time.perf_counter() - start_time > time_limit:
+            break
+
+        _, _, node = heappop(open_list)
+        stat["expandedNodes"] += 1
+
+        conflict = find_conflict(node.paths)
+        if conflict is None:
+            stat["cost"] = node.cost
+            return finish(True, node.paths)
+
+        agent_1, agent_2, constraint_1, constraint_2 = conflict
+        for agent, constraint in ((agent_1, constraint_1), (agent_2, constraint_2)):
+            if constraint in node.constraints[agent]:
+                continue
+            agent_constraints = node.constraints[agent] | {constraint}
+            path = plan_agent(agent, agent_constraints)
+            if path is None:
+                continue
+
+            child_constraints = node.constraints[:agent] + (agent_constraints,) + node.constraints[agent + 1:]
+            if child_constraints in generated:
+                continue
+            generated.add(child_constraints)
+            child_paths = node.paths[:agent] + [path] + node.paths[agent + 1:]
+            child = CTNode(child_constraints, child_paths)
+            counter += 1
+            heappush(open_list, (child.cost, counter, child))
+            stat["generatedNodes"] += 1
+
+    return finish(False, None)
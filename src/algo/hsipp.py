@@ -0,0 +1,161 @@
+from src.algo.sipp import Node
+from src.path import compact_path
+
+
+def _search_segment(safe_grid_map, start_node, goal_i, goal_j, allowed, heuristic_func, search_tree):
+    '''
+    SIPP from start_node (any cell and time) to the goal cell, which generates only the cells, where allowed(i, j)
+    is True (all cells if allowed is None).
+    '''
+    ast = search_tree()
+    steps = 0
+    nodes_created = 1
+    start_node.h = heuristic_func(start_node.i, start_node.j, goal_i, goal_j)
+    start_node.f = start_node.g + start_node.h
+    ast.add_to_open(start_node)
+
+    while not ast.open_is_empty():
+        steps += 1
+        node = ast.get_best_node_from_open()
+        if node is None:
+            break
+        if node.i == goal_i and node.j == goal_j:
+            return node, steps, nodes_created, ast
+
+        for neighbor in safe_grid_map.get_neighbors(node.i, node.j, node.g):
+            if allowed is not None and not allowed(neighbor[0], neighbor[1]):
+                continue
+            neighbor_node = Node(neighbor[0], neighbor[1], neighbor[2],
+                                 interval=safe_grid_map.get_interval(neighbor[0], neighbor[1], neighbor[2]),
+                                 h=heuristic_func(neighbor[0], neighbor[1], goal_i, goal_j),
+                                 parent = node)
+            nodes_created += 1
+            if not ast.was_expanded(neighbor_node):
+                ast.add_to_open(neighbor_node)
+
+        ast.add_to_closed(node)
+
+    return None, steps, nodes_created, ast
+
+
+
+def hsipp_segments(safe_grid_map, hierarchy,
+                   start_i, start_j,
+                   goal_i, goal_j,
+                   heuristic_func = None,
+                   search_tree = None):
+    '''
+    Generator of the segments of the hierarchical SIPP path, which are planned lazily:
+    the agent can start moving after the first one (first-move latency does not depend on the rest of the route).
+
+    The route is planned in the abstract graph of the hierarchy first. Its waypoints are the entrances, through which
+    it enters the next cluster (and the goal); every segment is a SIPP search from the end of the previous segment
+    (the same cell and time) to the next waypoint, which generates only the cells of the clusters of the abstract path
+    (the corridor). If a segment is not found in the corridor (dynamic obstacles block it), the rest of the path
+    is planned by one SIPP search from the end of the last yielded segment to the goal without the corridor, so
+    the segments, which the agent may already follow, are never changed. The yielded segments can lead to a state,
+    from which the goal cannot be reached: then None is yielded (hsipp plans the whole path again in this case).
+
+    Yields
+    ------
+    tuple[Node or None, int, int, SearchTree or None]
+        The last node of the segment (its parents lead to the start through the previous segments, None if the path
+        was not found), the number of search steps, the number of created nodes and the search tree of the segment
+    '''
+    if not safe_grid_map.connected(start_i, start_j, goal_i, goal_j):
+        # the goal is in another component of the static map
+        yield None, 0, 0, None
+        return
+
+    cells, steps = hierarchy.abstract_path(start_i, start_j, goal_i, goal_j)
+    if cells is None:
+        yield None, steps, 0, None
+        return
+
+    corridor = {hierarchy.cluster_of(i, j) for i, j in cells}
+    size = hierarchy.cluster_size
+
+    def allowed(i, j):
+        return (i // size, j // size) in corridor
+
+    waypoints = [cell for previous, cell in zip(cells, cells[1:])
+                 if hierarchy.cluster_of(*cell) != hierarchy.cluster_of(*previous) and cell != (goal_i, goal_j)]
+    waypoints.append((goal_i, goal_j))
+
+    if not safe_grid_map.traversable(start_i, start_j, 0):
+        raise Exception("Bad start:", start_i, start_j)
+    node = Node(start_i, start_j, g=0, interval=0)
+    for waypoint_i, waypoint_j in waypoints:
+        # the next segment starts at the same state, its start node replaces the last node of the previous segment
+        start_node = Node(node.i, node.j, g=node.g, interval=node.interval, parent=node.parent)
+        last_node, segment_steps, nodes_created, ast = _search_segment(safe_grid_map, start_node, waypoint_i, waypoint_j,
+                                                                      allowed, heuristic_func, search_tree)
+        if last_node is None:
+            last_node, fallback_steps, fallback_nodes, ast = _search_segment(
+                safe_grid_map, Node(node.i, node.j, g=node.g, interval=node.interval, parent=node.parent),
+                goal_i, goal_j, None, heuristic_func, search_tree)
+            yield last_node, steps + segment_steps + fallback_steps, nodes_created + fallback_nodes, ast
+            return
+        yield last_node, steps + segment_steps, nodes_created, ast
+        steps = 0
+        node = last_node
+
+
+
+def hsipp(safe_grid_map, hierarchy,
+          start_i, start_j,
+          goal_i, goal_j,
+          heuristic_func = None,
+          search_tree = None,
+          stats = None,
+          trace = None,
+          keep_lists = True,
+          compact = False):
+    '''
+    Hierarchical SIPP: plans the route in the abstract graph of ClusterHierarchy and refines it segment by segment
+    with SIPP restricted to the clusters of the route (see hsipp_segments). The search space of every segment
+    is bounded by a few clusters, so time and memory grow with the length of the route, not with the area of the map.
+    The path is not optimal in general (as in HPA*). If the segments lead to a state, from which the goal cannot be
+    reached, the path is planned again by one SIPP search from the start without the corridor.
+
+    Parameters are the same as of sipp, hierarchy is a ClusterHierarchy of the static map of safe_grid_map.
+    Returns the same as sipp: steps and nodes_created are summed over the abstract search and all segments,
+    OPEN and CLOSED (if keep_lists) are joined over all segments.
+    '''
+    if stats is not None:
+        return stats.record(lambda domain, tree: hsipp(domain, hierarchy, start_i, start_j, goal_i, goal_j, heuristic_func,
+                                           tree, trace=trace, keep_lists=keep_lists, compact=compact),
+                            safe_grid_map, search_tree)
+    if trace is not None:
+        return trace.record(lambda tree: hsipp(safe_grid_map, hierarchy, start_i, start_j, goal_i, goal_j, heuristic_func,
+                                           tree, keep_lists=keep_lists, compact=compact),
+                            search_tree)
+
+    steps = 0
+    nodes_created = 0
+    last_node = None
+    ast = None
+    open_nodes, closed_nodes = ([], set()) if keep_lists else (None, None)
+
+    def add_lists(ast):
+        if keep_lists and ast is not None:
+            open_nodes.extend(ast.OPEN)
+            closed_nodes.update(ast.CLOSED)
+
+    for last_node, segment_steps, segment_nodes, ast in hsipp_segments(safe_grid_map, hierarchy, start_i, start_j,
+                                                                       goal_i, goal_j, heuristic_func, search_tree):
+        steps += segment_steps
+        nodes_created += segment_nodes
+        add_lists(ast)
+
+    if last_node is None and ast is not None:
+        # the segments led to a dead end (the goal is reachable in the static map, otherwise there is no search tree)
+        last_node, fallback_steps, fallback_nodes, ast = _search_segment(
+            safe_grid_map, Node(start_i, start_j, g=0, interval=0), goal_i, goal_j, None, heuristic_func, search_tree)
+        steps += fallback_steps
+        nodes_created += fallback_nodes
+        add_lists(ast)
+
+    if last_node is None or last_node.i != goal_i or last_node.j != goal_j:
+        return False, None, steps, nodes_created, open_nodes, closed_nodes
+    return True, compact_path(last_node) if compact else last_node, steps, nodes_created, open_nodes, closed_nodes
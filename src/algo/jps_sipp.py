@@ -0,0 +1,236 @@
+import numpy as np
+
+from src.algo.sipp import Node
+from src.path import compact_path
+
+
+DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+
+class JumpNode(Node):
+    '''
+    Node of JPS-SIPP: direction is the move (d_i, d_j), by which the node was reached (None for the start).
+    '''
+
+    def __init__(self, i, j, g = 0, h = 0, w = 1, f = None, parent = None, interval = -1, direction = None):
+        super().__init__(i, j, g, h, w, f, parent, interval)
+        self.direction = direction
+
+
+
+class JumpMap:
+    '''
+    Static part of JPS-SIPP for one SafeMap: cells are
+        - blocked -- static obstacles,
+        - clear -- free cells (see SafeMap.free_mask), whose neighbours are free or blocked as well:
+          jumps pass only through them, the agent never needs to wait there,
+        - the rest -- cells visited by dynamic obstacles and their neighbours: jumps stop at them,
+          and their successors are generated by SIPP without pruning.
+
+    Jumps follow the 4-connected JPS rules with vertical moves first: a horizontal jump stops at a cell
+    with a forced neighbour, a vertical one also at a cell, from which a horizontal jump finds a jump point.
+    Distances of the jumps, which do not depend on the goal, are precomputed for every cell and direction
+    (as in JPS+), so a jump takes O(1). Build it once per SafeMap (and again after add_obstacle).
+    '''
+
+    def __init__(self, safe_grid_map):
+        free = safe_grid_map.free_mask()
+        walkable = ~safe_grid_map.get_cells_array()
+        dynamic = np.pad(walkable & ~free, 1)
+        near_dynamic = dynamic[1:-1, 1:-1] | dynamic[:-2, 1:-1] | dynamic[2:, 1:-1] | dynamic[1:-1, :-2] | dynamic[1:-1, 2:]
+        clear = free & ~near_dynamic
+        self.clear = clear.tolist()
+
+        # walkable with a border of blocked cells: w[1 + i, 1 + j] is the cell (i, j)
+        w = np.pad(walkable, 1)
+        center = w[1:-1, 1:-1]
+        up, down, left, right = w[:-2, 1:-1], w[2:, 1:-1], w[1:-1, :-2], w[1:-1, 2:]
+        forced = {
+            (0, 1): (up & ~w[:-2, :-2]) | (down & ~w[2:, :-2]),
+            (0, -1): (up & ~w[:-2, 2:]) | (down & ~w[2:, 2:]),
+            (1, 0): (left & ~w[:-2, :-2]) | (right & ~w[:-2, 2:]),
+            (-1, 0): (left & ~w[2:, :-2]) | (right & ~w[2:, 2:]),
+        }
+        # runs[d][i, j] -- moves from (i, j) in the direction d before a blocked cell,
+        # jumps[d][i, j] -- moves to the first jump point, which does not depend on the goal (0 -- there is none)
+        runs = dict()
+        jumps = dict()
+        for d in ((0, 1), (0, -1)):
+            runs[d], jumps[d] = self._scan(center, center & (~clear | forced[d]), d)
+        lookahead = (jumps[(0, 1)] > 0) | (jumps[(0, -1)] > 0)
+        for d in ((1, 0), (-1, 0)):
+            runs[d], jumps[d] = self._scan(center, center & (~clear | forced[d] | lookahead), d)
+        self._runs = {d: runs[d].tolist() for d in DIRECTIONS}
+        self._jumps = {d: jumps[d].tolist() for d in DIRECTIONS}
+
+
+    @staticmethod
+    def _scan(walkable, stop, d):
+        # moves are counted by one pass against the direction d (over columns or rows, vectorized over the other axis)
+        axis = 1 if d[0] == 0 else 0
+        step = d[0] + d[1]
+        walkable = np.moveaxis(walkable, axis, 0)
+        stop = np.moveaxis(stop, axis, 0)
+        runs = np.zeros(walkable.shape, dtype=np.int64)
+        jumps = np.zeros(walkable.shape, dtype=np.int64)
+        length = walkable.shape[0]
+        for k in (range(length - 2, -1, -1) if step > 0 else range(1, length)):
+            n = k + step
+            runs[k] = np.where(walkable[n], runs[n] + 1, 0)
+            jumps[k] = np.where(walkable[n], np.where(stop[n], 1, np.where(jumps[n] > 0, jumps[n] + 1, 0)), 0)
+        return np.moveaxis(runs, 0, axis), np.moveaxis(jumps, 0, axis)
+
+
+    def jump(self, i, j, d_i, d_j, goal_i, goal_j):
+        '''
+        Jumps from the clear cell (i, j) in the direction (d_i, d_j).
+
+        Returns
+        -------
+        tuple[int, int, int] or None
+            The jump point and the number of moves to it, None if the jump hits an obstacle.
+            The jump point is the goal, a cell with a forced neighbour, a cell, from which a horizontal jump
+            finds a jump point or the goal (for vertical jumps), or the first not clear cell
+        '''
+        d = (d_i, d_j)
+        steps = self._jumps[d][i][j]
+        run = self._runs[d][i][j]
+        if d_i == 0:
+            goal_steps = (goal_j - j) * d_j if goal_i == i else 0
+        else:
+            # the goal is on the line or can be found by the horizontal jump from the row of the goal
+            goal_steps = (goal_i - i) * d_i
+            if goal_steps > 0 and goal_j != j:
+                horizontal = (0, 1) if goal_j > j else (0, -1)
+                if goal_steps > run or self._runs[horizontal][goal_i][j] < abs(goal_j - j):
+                    goal_steps = 0
+        if 0 < goal_steps <= run and (steps == 0 or goal_steps < steps):
+            steps = goal_steps
+        if steps == 0:
+            return None
+        return i + d_i * steps, j + d_j * steps, steps
+
+
+    def directions(self, node):
+        '''
+        Directions of the successors of the node in a clear cell: all but the reverse of the move to the node.
+        '''
+        if node.direction is None:
+            return DIRECTIONS
+        d_i, d_j = node.direction
+        return tuple(d for d in DIRECTIONS if d != (-d_i, -d_j))
+
+
+
+def _unfold(node, safe_grid_map):
+    # inserts the cells skipped by jumps between the nodes of the path (the agent does not wait in clear cells)
+    last = node
+    while node.parent is not None:
+        parent = node.parent
+        distance = abs(node.i - parent.i) + abs(node.j - parent.j)
+        if distance > 1:
+            d_i, d_j = (node.i - parent.i) // distance, (node.j - parent.j) // distance
+            origin = parent
+            for k in range(1, distance):
+                i, j, g = origin.i + d_i * k, origin.j + d_j * k, origin.g + k
+                parent = JumpNode(i, j, g, interval=safe_grid_map.get_interval(i, j, g), parent=parent, direction=(d_i, d_j))
+            node.parent = parent
+        node = node.parent
+    return last
+
+
+
+def jps_sipp(safe_grid_map,
+             start_i, start_j,
+             goal_i, goal_j,
+             heuristic_func = None,
+             search_tree = None,
+             stats = None,
+             trace = None,
+             keep_lists = True,
+             compact = False,
+             jump_map = None):
+    '''
+    SIPP with Jump Point Search successor pruning on the 4-connected grid (JPS-SIPP).
+    From nodes in clear cells (see JumpMap) the search jumps along cardinal directions and generates only
+    jump points; nodes in other cells are expanded as in sipp. Clear cells are always safe, so every path
+    of the pruned symmetric moves has an equivalent path through jump points with the same arrival times,
+    and the search is as optimal as sipp. Cells skipped by jumps are inserted into the found path.
+
+    Parameters are the same as of sipp, jump_map is a JumpMap of safe_grid_map (it is built if None).
+    Returns the same as sipp (steps and nodes are those of the pruned search).
+    '''
+    if stats is not None:
+        return stats.record(lambda domain, tree: jps_sipp(domain, start_i, start_j, goal_i, goal_j, heuristic_func,
+                                              tree, trace=trace, keep_lists=keep_lists, compact=compact, jump_map=jump_map),
+                            safe_grid_map, search_tree)
+    if trace is not None:
+        return trace.record(lambda tree: jps_sipp(safe_grid_map, start_i, start_j, goal_i, goal_j, heuristic_func,
+                                              tree, keep_lists=keep_lists, compact=compact, jump_map=jump_map),
+                            search_tree)
+
+    if jump_map is None:
+        jump_map = JumpMap(safe_grid_map)
+    clear = jump_map.clear
+    ast = search_tree()
+    steps = 0
+    nodes_created = 0
+
+    def lists():
+        return (ast.OPEN, ast.CLOSED) if keep_lists else (None, None)
+
+    if not safe_grid_map.connected(start_i, start_j, goal_i, goal_j):
+        # the goal is in another component of the static map
+        return (False, None, steps, nodes_created, *lists())
+
+    if not safe_grid_map.traversable(start_i, start_j, 0):
+        raise Exception("Bad start:", start_i, start_j)
+
+    start_node = JumpNode(start_i, start_j,
+                          g=0,
+                          h=heuristic_func(start_i, start_j, goal_i, goal_j),
+                          interval=0)
+
+    ast.add_to_open(start_node)
+    nodes_created += 1
+
+    while not ast.open_is_empty():
+        steps += 1
+        node = ast.get_best_node_from_open()
+        if node is None:
+            return (False, None, steps, nodes_created, *lists())
+        if node.i == goal_i and node.j == goal_j:
+            node = _unfold(node, safe_grid_map)
+            return (True, compact_path(node) if compact else node, steps, nodes_created, *lists())
+
+        successors = []
+        if clear[node.i][node.j]:
+            for d_i, d_j in jump_map.directions(node):
+                jump_point = jump_map.jump(node.i, node.j, d_i, d_j, goal_i, goal_j)
+                if jump_point is None:
+                    continue
+                i, j, distance = jump_point
+                if clear[i][j]:
+                    successors.append((i, j, node.g + distance, d_i, d_j))
+                    continue
+                # the move into a not clear cell is timed by SIPP from the previous (clear) cell of the jump
+                for neighbor in safe_grid_map.get_neighbors(i - d_i, j - d_j, node.g + distance - 1):
+                    if neighbor[0] == i and neighbor[1] == j:
+                        successors.append((i, j, neighbor[2], d_i, d_j))
+        else:
+            for neighbor in safe_grid_map.get_neighbors(node.i, node.j, node.g):
+                successors.append((*neighbor, neighbor[0] - node.i, neighbor[1] - node.j))
+
+        for i, j, t, d_i, d_j in successors:
+            neighbor_node = JumpNode(i, j, t,
+                                     interval=safe_grid_map.get_interval(i, j, t),
+                                     h=heuristic_func(i, j, goal_i, goal_j),
+                                     parent = node,
+                                     direction = (d_i, d_j))
+            nodes_created += 1
+            if not ast.was_expanded(neighbor_node):
+                ast.add_to_open(neighbor_node)
+
+        ast.add_to_closed(node)
+
+    return False, None, steps, nodes_created, *lists()
@@ -1,15 +1,3 @@
-import copy
-import math
-import matplotlib.pyplot as plt
-import numpy as np
-import time
-
-from heapq import heappop, heappush, heapify
-from random import randint
-from IPython.display import HTML
-from PIL import Image, ImageDraw, ImageOps
-from IPython.display import Image as Img
-from IPython.display import display
 from sys import float_info
 
 from src.grid import Map, SafeMap, manhattan_distance
@@ -0,0 +1,91 @@
+import time
+
+from src.grid import SafeMap, manhattan_distance
+from src.path import compact_path
+from src.algo.sipp import sipp, SearchTree
+
+
+def prioritized_plan(grid_map,
+                     dyn_obst_traj,
+                     agents,
+                     heuristic_func = manhattan_distance,
+                     search_tree = SearchTree):
+    '''
+    Plans paths for several agents one by one in the given priority order using SIPP.
+    After every agent its path is reserved in the SafeMap as a new dynamic obstacle
+    (the agent stays in its goal cell forever), so the following agents avoid it.
+    An agent reaches its goal only in the last (unbounded) safe interval of the goal cell,
+    so it is never run over while it stays there; if there is no such interval, the agent fails.
+    The SafeMap is built only once and then updated incrementally.
+
+    Parameters
+    ----------
+    grid_map : Map
+        Static grid map
+    dyn_obst_traj : list[list[tuple[int, int]]]
+        Trajectories of dynamic obstacles
+    agents : iterable of tuple[int, int, int, int]
+        (start_i, start_j, goal_i, goal_j) of every agent, from the highest priority to the lowest.
+        Can be a generator, e.g. of scenarios from iter_scenarios
+    heuristic_func : function
+        Heuristic function
+    search_tree : type
+        Search tree data structure
+
+    Returns
+    -------
+    paths : list[list[tuple[int, int]] or None]
+        Position of every agent at every timestep. None if path for the agent was not found
+    stat : dict
+        Statistics of the run:
+         - "wasFind", "lenght", "steps", "nodesCreated", "time" -- per agent values
+           (time is the latency of the agent's query in seconds, including SafeMap update)
+         - "failures" -- indices of agents, for which a path was not found
+         - "safeMapTime" -- time of the initial SafeMap construction in seconds
+         - "totalTime" -- total time of planning in seconds
+         - "throughput" -- number of planned agents per second
+    '''
+
+    stat = dict()
+    stat["wasFind"] = []
+    stat["lenght"] = []
+    stat["steps"] = []
+    stat["nodesCreated"] = []
+    stat["time"] = []
+    stat["failures"] = []
+
+    total_start = time.perf_counter()
+    safe_map = SafeMap(grid_map, dyn_obst_traj)
+    stat["safeMapTime"] = time.perf_counter() - total_start
+
+    paths = []
+    for agent_id, agent in enumerate(agents):
+        start_i, start_j, goal_i, goal_j = agent[:4]
+        start_time = time.perf_counter()
+
+        result = (False, None, 0, 0)
+        if safe_map.traversable(start_i, start_j, 0):
+            result = sipp(safe_map, start_i, start_j, goal_i, goal_j, heuristic_func, search_tree, keep_lists=False,
+                          stay_at_goal=True)
+
+        path = None
+        if result[0]:
+            # positions keep the waits of the path (also at the start), so the reservation is not shifted in time
+            compact = compact_path(result[1])
+            length = compact.length
+            path = [tuple(position) for position in compact.positions().tolist()]
+            safe_map.add_obstacle(path)
+
+        stat["time"].append(time.perf_counter() - start_time)
+        stat["wasFind"].append(result[0])
+        stat["steps"].append(result[2])
+        stat["nodesCreated"].append(result[3])
+        stat["lenght"].append(length if result[0] else 0.0)
+        if not result[0]:
+            stat["failures"].append(agent_id)
+        paths.append(path)
+
+    stat["totalTime"] = time.perf_counter() - total_start
+    stat["throughput"] = len(paths) / stat["totalTime"] if stat["totalTime"] > 0 else 0.0
+
+    return paths, stat
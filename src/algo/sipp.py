@@ -1,18 +1,9 @@
-import copy
 import math
-import matplotlib.pyplot as plt
-import numpy as np
-import time
-
-from heapq import heappop, heappush, heapify
-from random import randint
-from IPython.display import HTML
-from PIL import Image, ImageDraw, ImageOps
-from IPython.display import Image as Img
-from IPython.display import display
+
 from sys import float_info
 
 from src.grid import Map, SafeMap, manhattan_distance
+from src.path import compact_path
 
 
 EPS = float_info.epsilon
@@ -132,7 +123,12 @@ def sipp(safe_grid_map,
          start_i, start_j, 
          goal_i, goal_j, 
          heuristic_func = None, 
-         search_tree = None):
+         search_tree = None,
+         stats = None,
+         trace = None,
+         keep_lists = True,
+         compact = False,
+         stay_at_goal = False):
     
     '''
     Runs A* search algorithm without re-expansion on dynamic obstacles domain.
@@ -149,29 +145,65 @@ def sipp(safe_grid_map,
         Heuristic function
     search_tree : type 
         Search tree data structure
+    stats : SearchStats
+        Optional instrumentation counters and timers (None -- no instrumentation)
+    trace : TraceBuffer or TraceFile
+        Optional sink of expansion trace records (None -- no tracing)
+    keep_lists : bool
+        Return OPEN and CLOSED (default). If False, they are None, so the search tree is released right after the search
+    compact : bool
+        Return CompactPath of the found path instead of the last node (it keeps no references to the search tree)
+    stay_at_goal : bool
+        The agent stays in the goal cell forever after the end of the path (e.g. in prioritized planning):
+        the goal is reached only in its last safe interval, which must be unbounded
 
     Returns
     -------
     path_found : bool
         Path was found or not.  
-    last_node : Node
-        The last node in path. None if path was not found.
+    last_node : Node or CompactPath
+        The last node in path (CompactPath if compact). None if path was not found.
     steps : int
         The number of search steps
     noodes_created : int
         The number of nodes, which were created and stored during the search process (size of the resultant search tree)
     open : iterable object
-        Iterable collection of OPEN nodes
+        Iterable collection of OPEN nodes (None if not keep_lists)
     expanded : iterable object
-        Iterable collection of the expanded nodes
+        Iterable collection of the expanded nodes (None if not keep_lists)
     '''
 
+    if stats is not None:
+        return stats.record(lambda domain, tree: sipp(domain, start_i, start_j, goal_i, goal_j, heuristic_func,
+                                          tree, trace=trace, keep_lists=keep_lists, compact=compact,
+                                          stay_at_goal=stay_at_goal),
+                            safe_grid_map, search_tree)
+    if trace is not None:
+        return trace.record(lambda tree: sipp(safe_grid_map, start_i, start_j, goal_i, goal_j, heuristic_func,
+                                          tree, keep_lists=keep_lists, compact=compact, stay_at_goal=stay_at_goal),
+                            search_tree)
+
     ast = search_tree()
     steps = 0
     nodes_created = 0
 
+    def lists():
+        return (ast.OPEN, ast.CLOSED) if keep_lists else (None, None)
+
+    if not safe_grid_map.connected(start_i, start_j, goal_i, goal_j):
+        # the goal is in another component of the static map
+        return (False, None, steps, nodes_created, *lists())
+
+    goal_interval = None
+    if stay_at_goal:
+        goal_intervals = safe_grid_map.intervals[goal_i][goal_j]
+        if len(goal_intervals) == 0 or goal_intervals[-1][1] != math.inf:
+            # an obstacle stays in the goal cell forever, the agent cannot park there
+            return (False, None, steps, nodes_created, *lists())
+        goal_interval = len(goal_intervals) - 1
+
     if not safe_grid_map.traversable(start_i, start_j, 0):
-        Exception("Bad start:", start_i, start_j)
+        raise Exception("Bad start:", start_i, start_j)
     
     start_node = Node(start_i, start_j, 
                       g=0, 
@@ -185,9 +217,9 @@ def sipp(safe_grid_map,
         steps += 1
         node = ast.get_best_node_from_open()
         if node is None:
-            return (False, None, steps, nodes_created, ast.OPEN, ast.CLOSED)
-        if node.i == goal_i and node.j == goal_j:
-            return (True, node, steps, nodes_created, ast.OPEN, ast.CLOSED)
+            return (False, None, steps, nodes_created, *lists())
+        if node.i == goal_i and node.j == goal_j and (goal_interval is None or node.interval == goal_interval):
+            return (True, compact_path(node) if compact else node, steps, nodes_created, *lists())
         
         neighbors = safe_grid_map.get_neighbors(node.i, node.j, node.g)
         for neighbor in neighbors:
@@ -201,6 +233,6 @@ def sipp(safe_grid_map,
                 
         ast.add_to_closed(node)
         
-    return False, None, steps, nodes_created, ast.OPEN, ast.CLOSED
+    return False, None, steps, nodes_created, *lists()
 
     
@@ -0,0 +1,81 @@
+import math
+
+from src.grid import SafeMapView
+from src.algo.sipp import sipp
+
+
+class WindowedSafeMap(SafeMapView):
+    '''
+    SafeMap, which honors dynamic obstacles only within the window: moments t < window.
+    From the moment window on every traversable cell is safe (statically free), so a safe interval,
+    which ends at or after the window, is merged with the rest of the timeline into one infinite interval.
+
+    Unlike other views, safe intervals are built eagerly, but only for the cells visited by dynamic obstacles:
+    only their rows are copied (shallowly), other rows and intervals of other cells are shared with the base map. So lookups are as fast
+    as in SafeMap, and one WindowedSafeMap can serve all queries with the same window.
+
+    - window -- the number of timesteps, in which dynamic obstacles are honored
+    '''
+
+    def __init__(self, safe_map, window):
+        super().__init__(safe_map)
+        self.window = window
+        base = safe_map.intervals
+        self.intervals = list(base)
+        cells = [(i, j) for (i, j) in safe_map._pos_time_table if self.in_bounds(i, j)]
+        for i in {i for (i, _) in cells}:
+            self.intervals[i] = list(base[i])
+        for (i, j) in cells:
+            self.intervals[i][j] = self._make_cell_intervals(i, j, base[i][j])
+
+
+    def free_mask(self):
+        # the window only removes unsafe moments, so free cells of the base map stay free
+        return self._base.free_mask()
+
+
+    def _make_cell_intervals(self, i, j, base_intervals):
+        if not self._grid_map.traversable(i, j):
+            return base_intervals
+        window = self.window
+        intervals = []
+        for (start, end, out_moves) in base_intervals:
+            if end < window:
+                intervals.append((start, end, out_moves))
+                continue
+            # the cell becomes unsafe only after the window
+            if start <= window - 1:
+                intervals.append((start, math.inf, out_moves))
+            else:
+                intervals.append((window - 1, math.inf, set()))
+            return intervals
+        # the cell is unsafe at the end of the window (or forever in the base map)
+        intervals.append((window - 1, math.inf, set()))
+        return intervals
+
+
+
+def windowed_sipp(safe_grid_map,
+                  start_i, start_j,
+                  goal_i, goal_j,
+                  window,
+                  heuristic_func = None,
+                  search_tree = None,
+                  stats = None,
+                  trace = None,
+                  keep_lists = True,
+                  compact = False):
+    '''
+    Windowed SIPP: runs sipp on WindowedSafeMap, i.e. resolves conflicts with dynamic obstacles only
+    within the next window timesteps and finishes the path by the static map with the (static) heuristic.
+    Positions of the found path at moments 0..window - 1 (and moves between them) are collision-free,
+    the rest of the path is only statically feasible, so the agent has to replan before the window ends.
+
+    Parameters are the same as of sipp, window is the number of timesteps, in which obstacles are taken into account.
+    safe_grid_map may be a WindowedSafeMap with this window already (build it once for many queries).
+    Returns the same as sipp.
+    '''
+    if not (isinstance(safe_grid_map, WindowedSafeMap) and safe_grid_map.window == window):
+        safe_grid_map = WindowedSafeMap(safe_grid_map, window)
+    return sipp(safe_grid_map, start_i, start_j, goal_i, goal_j, heuristic_func, search_tree,
+                stats=stats, trace=trace, keep_lists=keep_lists, compact=compact)
@@ -1,18 +1,7 @@
-import copy
-import math
-import matplotlib.pyplot as plt
-import numpy as np
-import time
-
-from heapq import heappop, heappush, heapify
-from random import randint
-from IPython.display import HTML
-from PIL import Image, ImageDraw, ImageOps
-from IPython.display import Image as Img
-from IPython.display import display
 from sys import float_info
 
 from src.grid import Map, SafeMap, manhattan_distance
+from src.path import compact_path
 
 EPS = float_info.epsilon
 
@@ -146,14 +135,34 @@ def wsipp_r(safe_grid_map,
           goal_i, goal_j, 
           w_param,
           heuristic_func = None,
-          search_tree = None):
+          search_tree = None,
+          stats = None,
+          trace = None,
+          keep_lists = True,
+          compact = False):
+
+    if stats is not None:
+        return stats.record(lambda domain, tree: wsipp_r(domain, start_i, start_j, goal_i, goal_j, w_param, heuristic_func,
+                                          tree, trace=trace, keep_lists=keep_lists, compact=compact),
+                            safe_grid_map, search_tree)
+    if trace is not None:
+        return trace.record(lambda tree: wsipp_r(safe_grid_map, start_i, start_j, goal_i, goal_j, w_param, heuristic_func,
+                                          tree, keep_lists=keep_lists, compact=compact),
+                            search_tree)
 
     ast = search_tree()
     steps = 0
     nodes_created = 0
 
+    def lists():
+        return (ast.OPEN, ast.CLOSED) if keep_lists else (None, None)
+
+    if not safe_grid_map.connected(start_i, start_j, goal_i, goal_j):
+        # the goal is in another component of the static map
+        return (False, None, steps, nodes_created, *lists())
+
     if not safe_grid_map.traversable(start_i, start_j, 0):
-        Exception("Bad start:", start_i, start_j)
+        raise Exception("Bad start:", start_i, start_j)
     
     start_node = Node(start_i, start_j, 
                       g=0, 
@@ -168,9 +177,9 @@ def wsipp_r(safe_grid_map,
         steps += 1
         node = ast.get_best_node_from_open()
         if node is None:
-            return (False, None, steps, nodes_created, ast.OPEN, ast.CLOSED)
+            return (False, None, steps, nodes_created, *lists())
         if node.i == goal_i and node.j == goal_j:
-            return (True, node, steps, nodes_created, ast.OPEN, ast.CLOSED)
+            return (True, compact_path(node) if compact else node, steps, nodes_created, *lists())
         
         neighbors = safe_grid_map.get_neighbors(node.i, node.j, node.g)
         for neighbor in neighbors:
@@ -184,6 +193,6 @@ def wsipp_r(safe_grid_map,
                 
         ast.add_to_closed(node)
     
-    return False, None, steps, nodes_created, ast.OPEN, ast.CLOSED
+    return False, None, steps, nodes_created, *lists()
 
 
@@ -0,0 +1,424 @@
+import argparse
+import cProfile
+import csv
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.grid import Map, SafeMap, manhattan_distance
+from src.workload import generate_tasks, TaskStore
+from src.scenario import iter_scenarios
+from src.experiment import job_seed, run_jobs, write_aggregate
+from src.refcache import ReferenceCostCache
+from src.stats import SearchStats
+from src.utils import LRUCache, make_path
+from src.algo.astar_timesteps import astar_timesteps, CATable, SearchTree as SearchTreeAStarTimesteps
+from src.algo.jps_sipp import jps_sipp, JumpMap
+from src.algo.sipp import sipp, SearchTree as SearchTreeSIPP
+from src.algo.wsipp_r import wsipp_r, SearchTree as SearchTreeWSIPPR
+from src.algo.wsipp_d import wsipp_d, SearchTree as SearchTreeWSIPPD
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# build_ns is the build time of the search domain, which is cached and shared by the jobs on the same task
+# (it is the same number in all their rows), search_ns is measured by every job
+TIMING_FIELDS = ("build_ns", "search_ns")
+# fields, which differ between runs, they are not written to the aggregate
+NONDETERMINISTIC_FIELDS = TIMING_FIELDS + ("build_peak_bytes", "search_peak_bytes")
+
+FIELDS = ["job", "job_seed", "map", "seed", "task", "obstacles", "algorithm", "w", "rep",
+          "scenario", "bucket", "start_i", "start_j", "goal_i", "goal_j", "optimal_length",
+          "found", "length", "reference_length", "suboptimality", "expansions", "nodes_created", "build_ns", "search_ns",
+          "build_peak_bytes", "search_peak_bytes"] + \
+         ["stats_" + name for name in SearchStats.COUNTERS]
+
+
+def _build_safe_map(grid_map, task):
+    return SafeMap(grid_map, task)
+
+
+def _build_jump_map(grid_map, task):
+    safe_map = SafeMap(grid_map, task)
+    return safe_map, JumpMap(safe_map)
+
+
+def _build_ca_table(grid_map, task):
+    return CATable(task)
+
+
+def _run_astar_timesteps(domain, grid_map, start_i, start_j, goal_i, goal_j, w, stats = None, **options):
+    return astar_timesteps(grid_map, domain, start_i, start_j, goal_i, goal_j, manhattan_distance, SearchTreeAStarTimesteps, stats, **options)
+
+
+def _run_sipp(domain, grid_map, start_i, start_j, goal_i, goal_j, w, stats = None, **options):
+    return sipp(domain, start_i, start_j, goal_i, goal_j, manhattan_distance, SearchTreeSIPP, stats, **options)
+
+
+def _run_jps_sipp(domain, grid_map, start_i, start_j, goal_i, goal_j, w, stats = None, **options):
+    safe_map, jump_map = domain
+    return jps_sipp(safe_map, start_i, start_j, goal_i, goal_j, manhattan_distance, SearchTreeSIPP, stats, jump_map=jump_map, **options)
+
+
+def _run_wsipp_r(domain, grid_map, start_i, start_j, goal_i, goal_j, w, stats = None, **options):
+    return wsipp_r(domain, start_i, start_j, goal_i, goal_j, w, manhattan_distance, SearchTreeWSIPPR, stats, **options)
+
+
+def _run_wsipp_d(domain, grid_map, start_i, start_j, goal_i, goal_j, w, stats = None, **options):
+    return wsipp_d(domain, start_i, start_j, goal_i, goal_j, w, manhattan_distance, SearchTreeWSIPPD, stats, **options)
+
+
+# name -> (builder of the search domain, planner, does the planner use weights);
+# options of the planner (keep_lists, compact) are passed through by the runners
+ALGORITHMS = {
+    "astar_timesteps": (_build_ca_table, _run_astar_timesteps, False),
+    "jps_sipp": (_build_jump_map, _run_jps_sipp, False),
+    "sipp": (_build_safe_map, _run_sipp, False),
+    "wsipp_r": (_build_safe_map, _run_wsipp_r, True),
+    "wsipp_d": (_build_safe_map, _run_wsipp_d, True),
+}
+
+
+def map_path(name):
+    '''
+    Returns the path of the map file: name can be a path or a name of the bundled map.
+    '''
+    if os.path.exists(name):
+        return name
+    return os.path.join(ROOT, "maps", name + ".map")
+
+
+def scen_path(name):
+    '''
+    Returns the path of the bundled scenario file of the map.
+    '''
+    return os.path.join(ROOT, "scens", os.path.basename(map_path(name)) + ".scen")
+
+
+def run_job(grid_map, algorithm, task, start_i, start_j, goal_i, goal_j, w):
+    '''
+    Builds the search domain of the algorithm for the task and runs the search.
+    Time is measured separately for both phases with perf_counter_ns.
+
+    Returns
+    -------
+    dict
+        found, length, expansions, nodes_created, build_ns, search_ns
+    '''
+    domain, build_ns = _build_domain(algorithm, grid_map, task)
+    result = _search(algorithm, domain, grid_map, start_i, start_j, goal_i, goal_j, w)
+    result["build_ns"] = build_ns
+    return result
+
+
+def _build_domain(algorithm, grid_map, task):
+    start_time = time.perf_counter_ns()
+    domain = ALGORITHMS[algorithm][0](grid_map, task)
+    return domain, time.perf_counter_ns() - start_time
+
+
+def _search(algorithm, domain, grid_map, start_i, start_j, goal_i, goal_j, w, stats = None):
+    start_time = time.perf_counter_ns()
+    result = ALGORITHMS[algorithm][1](domain, grid_map, start_i, start_j, goal_i, goal_j, w, stats, keep_lists=False)
+    search_ns = time.perf_counter_ns() - start_time
+
+    return {
+        "found": bool(result[0]),
+        "length": make_path(result[1])[1] if result[0] else None,
+        "expansions": result[2],
+        "nodes_created": result[3],
+        "search_ns": search_ns,
+    }
+
+
+def _top_allocations(snapshot, previous = None, top = 25):
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, "<frozen importlib._bootstrap>")])
+    if previous is None:
+        statistics = snapshot.statistics("lineno")
+    else:
+        statistics = snapshot.compare_to(previous, "lineno")
+    return [str(statistic) for statistic in statistics[:top]]
+
+
+def profile_job(job, grid_map, task, directory, top = 25):
+    '''
+    Runs the job once more under cProfile and tracemalloc: the search domain is built from scratch,
+    then the search runs. Writes to the directory:
+     - job-<id>-build.pstats, job-<id>-search.pstats -- profiles of both phases (open them with pstats or snakeviz)
+     - job-<id>-report.txt -- peak memory of both phases, top functions by cumulative time
+       and top allocations by line: of the built domain and of the search tree (it is taken in one more run
+       with OPEN and CLOSED kept alive, so that the profile is not affected by draining OPEN)
+
+    Returns
+    -------
+    tuple[int, int]
+        Peak traced memory of the build and of the search (over the built domain) in bytes
+    '''
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, "job-" + str(job["job"]))
+    build, run, _ = ALGORITHMS[job["algorithm"]]
+    query = (grid_map, job["start_i"], job["start_j"], job["goal_i"], job["goal_j"], job["w"])
+
+    tracemalloc.start()
+    try:
+        build_profile = cProfile.Profile()
+        build_profile.enable()
+        domain = build(grid_map, task)
+        build_profile.disable()
+        build_peak = tracemalloc.get_traced_memory()[1]
+        build_snapshot = tracemalloc.take_snapshot()
+
+        tracemalloc.reset_peak()
+        retained = tracemalloc.get_traced_memory()[0]
+        search_profile = cProfile.Profile()
+        search_profile.enable()
+        run(domain, *query, keep_lists=False)
+        search_profile.disable()
+        search_peak = tracemalloc.get_traced_memory()[1] - retained
+
+        result = run(domain, *query, keep_lists=True)
+        search_snapshot = tracemalloc.take_snapshot()
+        del result
+    finally:
+        tracemalloc.stop()
+
+    build_profile.dump_stats(prefix + "-build.pstats")
+    search_profile.dump_stats(prefix + "-search.pstats")
+    with open(prefix + "-report.txt", "w") as report:
+        report.write("job {job} map {map} task {task} algorithm {algorithm} w {w} "
+                     "query ({start_i}, {start_j}) -> ({goal_i}, {goal_j})\n".format(**job))
+        report.write("build peak memory: {} bytes\nsearch peak memory: {} bytes\n".format(build_peak, search_peak))
+        for phase, profile in (("build", build_profile), ("search", search_profile)):
+            report.write("\n=== {}: top functions by cumulative time ===\n".format(phase))
+            pstats.Stats(profile, stream=report).strip_dirs().sort_stats("cumulative").print_stats(top)
+        report.write("\n=== build: top allocations ===\n")
+        report.write("\n".join(_top_allocations(build_snapshot, top=top)) + "\n")
+        report.write("\n=== search: top allocations over the built domain ===\n")
+        report.write("\n".join(_top_allocations(search_snapshot, build_snapshot, top)) + "\n")
+    return build_peak, search_peak
+
+
+# maps, generated tasks and search domains reused by the jobs of one process
+_CACHE = LRUCache()
+
+
+def _load_map(path, max_size = None):
+    def read():
+        grid_map = Map()
+        grid_map.read_from_file(path, max_size)
+        return grid_map
+    return _CACHE.get(("map", path, max_size), read)
+
+
+def _load_tasks(path, seed, tasks, max_size = None):
+    return _CACHE.get(("tasks", path, max_size, seed, tasks), lambda: generate_tasks(_load_map(path, max_size), tasks, seed))
+
+
+def _load_task(job):
+    if job["task_store"] is None:
+        return _load_tasks(job["map_path"], job["seed"], job["tasks"], job["max_size"])[job["task"]]
+    store = _CACHE.get(("store", job["task_store"]), lambda: TaskStore(job["task_store"]))
+    return _CACHE.get(("task", job["task_store"], job["task"]), lambda: store[job["task"]])
+
+
+def execute_job(job):
+    '''
+    Runs one benchmark job (a dict from iter_jobs) and returns its row.
+    The map, the generated tasks and the search domain (SafeMap or CATable) are cached in the process,
+    so consecutive jobs of a worker on the same task do not rebuild them; build_ns is the time
+    of the build of the shared cached domain (the same in the rows of all jobs, which reuse it),
+    not of this job. The NumPy random state is seeded with the job seed.
+    '''
+    grid_map = _load_map(job["map_path"], job["max_size"])
+    task = _load_task(job)
+    domain, build_ns = _CACHE.get(("domain", job["map_path"], job["max_size"], job["task_store"], job["seed"], job["tasks"],
+                                   job["task"], ALGORITHMS[job["algorithm"]][0]),
+                                  lambda: _build_domain(job["algorithm"], grid_map, task))
+
+    np.random.seed(job["job_seed"])
+    query = (job["algorithm"], domain, grid_map, job["start_i"], job["start_j"], job["goal_i"], job["goal_j"], job["w"])
+    for _ in range(job["warmup"]):
+        _search(*query)
+
+    row = {name: job[name] for name in FIELDS if name in job}
+    row["obstacles"] = len(task)
+    row.update(_search(*query))
+    row["build_ns"] = build_ns
+
+    row["reference_length"] = None
+    row["suboptimality"] = None
+    if job["refcache"] is not None:
+        reference_costs = _CACHE.get(("refcache", job["refcache"]), lambda: ReferenceCostCache(job["refcache"]))
+        reference = reference_costs.reference_cost(grid_map, task, job["start_i"], job["start_j"], job["goal_i"], job["goal_j"],
+                                                   domain if isinstance(domain, SafeMap) else None)
+        row["reference_length"] = reference
+        if reference and row["found"]:
+            row["suboptimality"] = row["length"] / reference
+
+    if job["counters"]:
+        # counted in a separate run, so that the instrumentation does not affect search_ns
+        stats = SearchStats()
+        _search(*query, stats)
+        row.update({"stats_" + name: value for name, value in stats.as_dict().items()})
+
+    row["build_peak_bytes"] = None
+    row["search_peak_bytes"] = None
+    if job["profile"] is not None:
+        row["build_peak_bytes"], row["search_peak_bytes"] = profile_job(job, grid_map, task, job["profile"])
+    return row
+
+
+def iter_jobs(map_name, algorithms, weights = (1.0,), seeds = (100,), tasks = 5, warmup = 1, reps = 3,
+              scen = None, scenario_filter = None, refcache = None, task_store = None, counters = False,
+              profile = None, max_size = None):
+    '''
+    Yields benchmark jobs: one per (seed, task, scenario, algorithm, w, rep) with a sequential job id
+    and a deterministic job seed. Tasks with dynamic obstacles are generated by generate_tasks(map, tasks, seed)
+    for every seed (the same tasks as in a TaskStore written by python -m src.workload with this seed).
+    Scenarios are streamed from the scen file by iter_scenarios with scenario_filter as keyword arguments
+    (buckets, start, stop, sample, seed).
+    If refcache is a path of a reference cost cache, every row also gets the optimal length
+    (computed by sipp only once per task and query across runs) and the suboptimality of the found path.
+    If task_store is a path of a TaskStore, its tasks are used instead of the generated ones
+    (seeds and tasks are replaced by the seed and the size of the store), workers load them one by one.
+    If counters is True, rows also get counters of SearchStats with the "stats_" prefix.
+    If profile is a directory, every job is also profiled there by profile_job.
+    The map is cropped to max_size x max_size cells as in Map.read_from_file (None -- the whole map).
+    '''
+    if task_store is not None:
+        store = TaskStore(task_store)
+        seeds, tasks = (store.seed,), len(store)
+        store.close()
+    path = map_path(map_name)
+    grid_map = _load_map(path, max_size)
+    name = os.path.splitext(os.path.basename(path))[0]
+    algorithm_ids = {algorithm: number for number, algorithm in enumerate(sorted(ALGORITHMS))}
+
+    job_id = 0
+    for seed in seeds:
+        for task_id in range(tasks):
+            for scenario in iter_scenarios(scen or scen_path(map_name), grid_map=grid_map, **(scenario_filter or {})):
+                for algorithm in algorithms:
+                    for w in (weights if ALGORITHMS[algorithm][2] else (1.0,)):
+                        for rep in range(reps):
+                            yield {
+                                "job": job_id, "map": name, "map_path": path, "seed": seed, "tasks": tasks, "task": task_id,
+                                "algorithm": algorithm, "w": w, "rep": rep, "warmup": warmup if rep == 0 else 0,
+                                "job_seed": job_seed(seed, task_id, scenario.index, algorithm_ids[algorithm], round(w * 1000), rep),
+                                "scenario": scenario.index, "bucket": scenario.bucket,
+                                "start_i": scenario.start_i, "start_j": scenario.start_j,
+                                "goal_i": scenario.goal_i, "goal_j": scenario.goal_j,
+                                "optimal_length": scenario.optimal_length, "refcache": refcache, "task_store": task_store,
+                                "counters": counters, "profile": profile, "max_size": max_size,
+                            }
+                            job_id += 1
+
+
+def run_benchmark(map_name, algorithms, weights = (1.0,), seeds = (100,), tasks = 5, warmup = 1, reps = 3,
+                  scen = None, scenario_filter = None, workers = 1, refcache = None, task_store = None, counters = False,
+                  profile = None, only = None, max_size = None):
+    '''
+    Runs the jobs of iter_jobs on workers processes and yields their rows in completion order.
+    Before the measured repetitions every (task, scenario, algorithm, w) is run warmup times without recording.
+    If only is a collection of job ids, other jobs are skipped (job ids do not depend on it).
+    '''
+    jobs = iter_jobs(map_name, algorithms, weights, seeds, tasks, warmup, reps, scen, scenario_filter, refcache, task_store, counters,
+                     profile, max_size)
+    if only is not None:
+        only = set(only)
+        jobs = (job for job in jobs if job["job"] in only)
+    return run_jobs(jobs, execute_job, workers)
+
+
+def write_rows(rows, stream, output_format = "jsonl"):
+    '''
+    Writes rows to the stream as JSON lines or CSV, flushing after every row.
+    '''
+    writer = None
+    if output_format == "csv":
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+    for row in rows:
+        if writer is None:
+            stream.write(json.dumps(row) + "\n")
+        else:
+            writer.writerow(row)
+        stream.flush()
+
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(prog="python -m src.benchmark",
+                                     description="Headless benchmark of the planners on generated dynamic obstacles.")
+    parser.add_argument("--map", required=True, help="name of a bundled map (e.g. small) or path to a .map file")
+    parser.add_argument("--max-size", type=int, default=None,
+                        help="crop the map to MAX_SIZE x MAX_SIZE cells (default: the whole map)")
+    parser.add_argument("--scen", default=None, help="scenario file (default: the bundled one of the map)")
+    parser.add_argument("--buckets", nargs="+", type=int, default=None, help="keep only scenarios from these buckets")
+    parser.add_argument("--scen-range", nargs=2, type=int, default=None, metavar=("START", "STOP"),
+                        help="keep only scenarios with index in [START, STOP)")
+    parser.add_argument("--sample", type=float, default=None, help="keep every scenario with this probability")
+    parser.add_argument("--sample-seed", type=int, default=None)
+    parser.add_argument("--algorithms", nargs="+", default=["sipp"], choices=sorted(ALGORITHMS))
+    parser.add_argument("--weights", nargs="+", type=float, default=[1.0], help="weights of wsipp_*")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[100])
+    parser.add_argument("--tasks", type=int, default=5, help="number of generated tasks per seed")
+    parser.add_argument("--task-store", default=None,
+                        help="task store directory (python -m src.workload) to use instead of --seeds and --tasks")
+    parser.add_argument("--warmup", type=int, default=1, help="unrecorded runs before measurements")
+    parser.add_argument("--reps", type=int, default=3, help="measured repetitions")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--aggregate", default=None,
+                        help="also write rows sorted by job id without timings and peak memory to this file "
+                             "(identical for any number of workers)")
+    parser.add_argument("--refcache", default=None,
+                        help="SQLite file of the reference cost cache: report optimal lengths and suboptimality")
+    parser.add_argument("--counters", action="store_true", help="add instrumentation counters of SearchStats to rows")
+    parser.add_argument("--jobs", nargs="+", type=int, default=None, help="run only the jobs with these ids")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="also profile every job with cProfile and tracemalloc, reports are written to DIR")
+    parser.add_argument("--format", dest="output_format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--output", default="-", help="output file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv = None):
+    args = parse_args(argv)
+    scenario_filter = {
+        "buckets": args.buckets,
+        "start": args.scen_range[0] if args.scen_range else None,
+        "stop": args.scen_range[1] if args.scen_range else None,
+        "sample": args.sample,
+        "seed": args.sample_seed,
+    }
+    rows = run_benchmark(args.map, args.algorithms, args.weights, args.seeds, args.tasks, args.warmup, args.reps,
+                         args.scen, scenario_filter, args.workers, args.refcache, args.task_store, args.counters,
+                         args.profile, args.jobs, args.max_size)
+    if args.aggregate is not None:
+        collected = []
+        rows = _collect(rows, collected)
+
+    if args.output == "-":
+        write_rows(rows, sys.stdout, args.output_format)
+    else:
+        with open(args.output, "w", newline="") as stream:
+            write_rows(rows, stream, args.output_format)
+
+    if args.aggregate is not None:
+        with open(args.aggregate, "w") as stream:
+            write_aggregate(collected, stream, exclude=NONDETERMINISTIC_FIELDS)
+
+
+def _collect(rows, collected):
+    for row in rows:
+        collected.append(row)
+        yield row
+
+
+if __name__ == "__main__":
+    main()
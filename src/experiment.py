@@ -0,0 +1,56 @@
+import json
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+
+def job_seed(*key):
+    '''
+    Returns a deterministic 32-bit seed of the job, which depends only on its key (a tuple of ints),
+    not on the worker, which runs the job, or on the order of execution.
+    '''
+    return int(np.random.SeedSequence(list(key)).generate_state(1)[0])
+
+
+def run_jobs(jobs, function, workers = 1, max_pending = None):
+    '''
+    Runs function(job) for every job and yields the results in completion order.
+
+    With workers > 1 jobs are fanned out to a ProcessPoolExecutor (function and jobs must be picklable).
+    Jobs are consumed lazily: at most max_pending (4 * workers by default) jobs are submitted at once,
+    so generators of any length can be used.
+    '''
+    if workers <= 1:
+        for job in jobs:
+            yield function(job)
+        return
+
+    max_pending = max_pending or 4 * workers
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(function, job))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+
+def write_aggregate(rows, stream, key = "job", exclude = ()):
+    '''
+    Writes rows sorted by key as JSON lines with sorted fields, without the fields from exclude
+    (e.g. timings). If rows are deterministic, the output is byte-identical regardless of
+    the number of workers and of the completion order.
+    '''
+    for row in sorted(rows, key=lambda row: row[key]):
+        stream.write(json.dumps({name: value for name, value in row.items() if not name in exclude}, sort_keys=True) + "\n")
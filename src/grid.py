@@ -1,18 +1,13 @@
-import copy
 import math
-import matplotlib.pyplot as plt
 import numpy as np
-import time
-
-from heapq import heappop, heappush, heapify
-from random import randint
-from IPython.display import HTML
-from PIL import Image, ImageDraw, ImageOps
-from IPython.display import Image as Img
-from IPython.display import display
+
 from sys import float_info
 
+from src.utils import LRUCache
+
 EPS = float_info.epsilon
+# dead end masks of this many last queries are kept by every Map (see Map.dead_ends)
+DEAD_ENDS_CACHE = 16
 
 
 class Map:
@@ -30,6 +25,7 @@ class Map:
         self._width = 0
         self._height = 0
         self._cells = []
+        self._clear_preprocessing()
     
 
     def read_from_string(self, cell_str, width, height):
@@ -48,6 +44,7 @@ class Map:
         self._width = width
         self._height = height
         self._cells = [[0 for _ in range(width)] for _ in range(height)]
+        self._clear_preprocessing()
         cell_lines = cell_str.split("\n")
         i = 0
         j = 0
@@ -71,9 +68,10 @@ class Map:
             raise Exception("Size Error. Map height = ", i, ", but must be", height )
     
     
-    def read_from_file(self, path):
+    def read_from_file(self, path, max_size = 70):
         '''
         Read file with grid (with '@', 'T', '#' representing obstacles and '.' representing free cells)
+        The map is cropped to max_size x max_size cells (None -- the whole map)
         '''
         map_file = open(path)
     
@@ -82,17 +80,18 @@ class Map:
         width = int(map_file.readline().split()[1])
         map_file.readline()
         
-        if height > 70:
-        	self._height = 70
+        if max_size is not None and height > max_size:
+        	self._height = max_size
         else:
         	self._height = height
         	
-        if width > 70:
-        	self._width = 70
+        if max_size is not None and width > max_size:
+        	self._width = max_size
         else:
         	self._width = width		
         
         self._cells = [[0 for _ in range(width)] for _ in range(height)]
+        self._clear_preprocessing()
 
         i = 0
         j = 0
@@ -134,6 +133,15 @@ class Map:
         self._width = width
         self._height = height
         self._cells = grid_cells
+        self._clear_preprocessing()
+
+
+    def _clear_preprocessing(self):
+        # connectivity data is computed on the first use and dropped, when the cells are set again
+        self._labels = None
+        self._label_rows = None
+        self._block_tree = None
+        self._dead_ends = LRUCache(maxsize=DEAD_ENDS_CACHE)
 
 
     def in_bounds(self, i, j):
@@ -215,22 +223,276 @@ class Map:
         return (self._height, self._width)
 
 
+    def get_cells_array(self):
+        '''
+        Returns the map as a NumPy array
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array of shape (height, width), True -- cell is blocked
+        '''
+        return np.array([row[:self._width] for row in self._cells[:self._height]], dtype=bool).reshape(self._height, self._width)
+
+
+
+    def component_labels(self):
+        '''
+        Returns labels of the connected components of traversable cells (cardinal moves), computed once per map.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (height, width) of int32: 0 -- blocked cell, 1, 2, ... -- component of the cell
+        '''
+        if self._labels is None:
+            self._labels = _label_components(self.get_cells_array())
+            self._label_rows = self._labels.tolist()
+        return self._labels
+
+
+    def connected(self, i1, j1, i2, j2):
+        '''
+        Check in O(1) (after component_labels) if there is a static path between two cells.
+        Planners reject queries between different components without the search.
+        '''
+        if self._label_rows is None:
+            self.component_labels()
+        if not (self.in_bounds(i1, j1) and self.in_bounds(i2, j2)):
+            return False
+        label = self._label_rows[i1][j1]
+        return label != 0 and label == self._label_rows[i2][j2]
+
+
+    def dead_ends(self, start_i, start_j, goal_i, goal_j):
+        '''
+        Returns the mask of dead ends of the query: traversable cells, which lie on no simple path from the start
+        to the goal, so no shortest static path passes them (e.g. rooms with one door, which contain neither the start
+        nor the goal). They are found by the block-cut tree of the map (built once per map): only the biconnected
+        blocks on the path between the start and the goal in the tree are kept.
+
+        With dynamic obstacles an agent may need to step into a dead end to let an obstacle pass,
+        so pruning them (PrunedSafeMap, with_blocked) is optional and can make such paths longer or lose them.
+        Planners never prune by default. Masks of the last DEAD_ENDS_CACHE queries are cached (a repeated query
+        costs O(1)), so they are read-only.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array of shape (height, width), True -- the cell is a dead end
+        '''
+        return self._dead_ends.get((start_i, start_j, goal_i, goal_j),
+                                   lambda: self._find_dead_ends(start_i, start_j, goal_i, goal_j))
+
+
+    def _find_dead_ends(self, start_i, start_j, goal_i, goal_j):
+        traversable = ~self.get_cells_array()
+        if not self.connected(start_i, start_j, goal_i, goal_j) or (start_i, start_j) == (goal_i, goal_j):
+            mask = traversable.copy()
+        else:
+            if self._block_tree is None:
+                self._block_tree = _BlockCutTree(traversable)
+            mask = traversable & ~self._block_tree.allowed(start_i * self._width + start_j, goal_i * self._width + goal_j)
+        if self.in_bounds(start_i, start_j):
+            mask[start_i, start_j] = False
+        if self.in_bounds(goal_i, goal_j):
+            mask[goal_i, goal_j] = False
+        mask.flags.writeable = False
+        return mask
+
+
+    def with_blocked(self, mask):
+        '''
+        Returns a copy of the map, where the cells of the mask are blocked as well (e.g. dead_ends for astar_timesteps).
+        '''
+        grid_map = Map()
+        grid_map.set_grid_cells(self._width, self._height, (self.get_cells_array() | mask).astype(int).tolist())
+        return grid_map
+
+
+
+def _label_components(blocked):
+    '''
+    Labels connected components of free cells by union-find over runs of free cells in rows:
+    runs of neighbouring rows, which overlap, are in the same component.
+    '''
+    height, width = blocked.shape
+    free = np.zeros((height, width + 2), dtype=np.int8)
+    free[:, 1:-1] = ~blocked
+    changes = np.diff(free, axis=1)
+    rows, starts = np.nonzero(changes == 1)
+    ends = np.nonzero(changes == -1)[1]
+    parents = list(range(len(rows)))
+
+    def find(run):
+        while parents[run] != run:
+            parents[run] = parents[parents[run]]
+            run = parents[run]
+        return run
+
+    first = np.searchsorted(rows, np.arange(height + 1)).tolist()
+    starts_list, ends_list = starts.tolist(), ends.tolist()
+    for row in range(1, height):
+        above, above_end = first[row - 1], first[row]
+        below, below_end = first[row], first[row + 1]
+        while above < above_end and below < below_end:
+            if starts_list[above] < ends_list[below] and starts_list[below] < ends_list[above]:
+                root_above, root_below = find(above), find(below)
+                if root_above != root_below:
+                    parents[root_below] = root_above
+            if ends_list[above] < ends_list[below]:
+                above += 1
+            else:
+                below += 1
+
+    roots = np.array([find(run) for run in range(len(parents))], dtype=np.int64)
+    run_labels = np.unique(roots, return_inverse=True)[1].reshape(-1) + 1 if len(roots) else roots
+    labels = np.zeros((height, width), dtype=np.int32)
+    # free cells in the row-major order are exactly the cells of the runs in their order
+    labels[~blocked] = np.repeat(run_labels, ends - starts)
+    return labels
+
+
+
+class _BlockCutTree:
+    '''
+    Block-cut tree of the grid graph of traversable cells (cells are numbered i * width + j):
+    biconnected blocks are found by the iterative Tarjan algorithm, tree nodes are blocks and articulation cells.
+    '''
+
+    def __init__(self, traversable):
+        height, width = traversable.shape
+        cells = traversable.reshape(-1).tolist()
+        count = height * width
+        index = [-1] * count
+        low = [0] * count
+        blocks = []
+        counter = 0
+        for root in range(count):
+            if not cells[root] or index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            vertices = [root]
+            stack = [(root, self._neighbors(root, width, height, cells))]
+            while stack:
+                v, neighbors = stack[-1]
+                for w in neighbors:
+                    if index[w] == -1:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        vertices.append(w)
+                        stack.append((w, self._neighbors(w, width, height, cells)))
+                        break
+                    low[v] = min(low[v], index[w])
+                else:
+                    stack.pop()
+                    if stack:
+                        u = stack[-1][0]
+                        low[u] = min(low[u], low[v])
+                        if low[v] >= index[u]:
+                            # u separates the block of v: its vertices are on the stack above v
+                            block = [u]
+                            while True:
+                                w = vertices.pop()
+                                block.append(w)
+                                if w == v:
+                                    break
+                            blocks.append(block)
+                    elif len(vertices) == 1:
+                        blocks.append(vertices)
+
+        # cell -> block, articulation cells (in several blocks) -> -1
+        membership = dict()
+        for number, block in enumerate(blocks):
+            for cell in block:
+                membership.setdefault(cell, []).append(number)
+        self._blocks_count = len(blocks)
+        self._cell_block = np.full(count, -1, dtype=np.int64)
+        articulations = {cell: numbers for cell, numbers in membership.items() if len(numbers) > 1}
+        for cell, numbers in membership.items():
+            if len(numbers) == 1:
+                self._cell_block[cell] = numbers[0]
+        self._shape = (height, width)
+        self._articulation_node = {cell: len(blocks) + k for k, cell in enumerate(articulations)}
+        self._pair_cells = np.array([cell for cell, numbers in articulations.items() for _ in numbers], dtype=np.int64)
+        self._pair_blocks = np.array([number for numbers in articulations.values() for number in numbers], dtype=np.int64)
+
+        # the tree is rooted in every component, parent and depth of every node
+        adjacency = [[] for _ in range(len(blocks) + len(articulations))]
+        for cell, numbers in articulations.items():
+            node = self._articulation_node[cell]
+            for number in numbers:
+                adjacency[node].append(number)
+                adjacency[number].append(node)
+        self._parent = [-1] * len(adjacency)
+        self._depth = [-1] * len(adjacency)
+        for root in range(len(adjacency)):
+            if self._depth[root] != -1:
+                continue
+            self._depth[root] = 0
+            queue = [root]
+            for node in queue:
+                for other in adjacency[node]:
+                    if self._depth[other] == -1:
+                        self._depth[other] = self._depth[node] + 1
+                        self._parent[other] = node
+                        queue.append(other)
+
+
+    @staticmethod
+    def _neighbors(v, width, height, cells):
+        i, j = divmod(v, width)
+        neighbors = []
+        if j + 1 < width and cells[v + 1]:
+            neighbors.append(v + 1)
+        if i + 1 < height and cells[v + width]:
+            neighbors.append(v + width)
+        if j > 0 and cells[v - 1]:
+            neighbors.append(v - 1)
+        if i > 0 and cells[v - width]:
+            neighbors.append(v - width)
+        return iter(neighbors)
+
+
+    def _node(self, cell):
+        node = self._articulation_node.get(cell)
+        return node if node is not None else int(self._cell_block[cell])
+
+
+    def allowed(self, start, goal):
+        '''
+        Mask of the cells of the blocks on the tree path between the start and the goal cells (of one component).
+        '''
+        a, b = self._node(start), self._node(goal)
+        path = {a, b}
+        while a != b:
+            if self._depth[a] < self._depth[b]:
+                a, b = b, a
+            a = self._parent[a]
+            path.add(a)
+        allowed_blocks = np.zeros(self._blocks_count, dtype=bool)
+        allowed_blocks[[node for node in path if node < self._blocks_count]] = True
+        allowed = np.zeros(self._shape[0] * self._shape[1], dtype=bool)
+        inside = self._cell_block >= 0
+        allowed[inside] = allowed_blocks[self._cell_block[inside]]
+        np.logical_or.at(allowed, self._pair_cells, allowed_blocks[self._pair_blocks])
+        return allowed.reshape(self._shape)
+
+
 
 class SafeMap: # Map, but with safe intervals.
     
     def __init__(self, grid_map, dyn_obst_traj):       
-        pos_time_table = dict()
-        max_time_table = dict()
+        self._grid_map = grid_map
+        self._pos_time_table = dict()
+        self._max_time_table = dict()
+        # version is incremented by every change of safe intervals, _changes[v] -- cells changed by version v + 1
+        self.version = 0
+        self._changes = []
         
-        for obst_id, obstacle in enumerate(dyn_obst_traj):
-            for t, (i, j) in enumerate(obstacle):
-                if not (i, j) in pos_time_table:
-                    pos_time_table[(i, j)] = []
-                d_i = 0 if t == len(obstacle) - 1 else obstacle[t + 1][0] - i 
-                d_j = 0 if t == len(obstacle) - 1 else obstacle[t + 1][1] - j 
-                pos_time_table[(i, j)].append((t, d_i, d_j))
-
-            max_time_table[obstacle[-1]] = len(obstacle) - 1
+        for obstacle in dyn_obst_traj:
+            self._add_to_tables(obstacle)
         
         size = grid_map.get_size();
         self._height = size[0]
@@ -238,27 +500,113 @@ class SafeMap: # Map, but with safe intervals.
         self.intervals = [[[] for j in range(size[1])] for i in range(size[0])]
         for i in range(size[0]):
             for j in range(size[1]):
-                if not grid_map.traversable(i, j):
-                    continue
-                old_t = -1
+                self._build_cell_intervals(i, j)
+        
+    
+    def _add_to_tables(self, obstacle):
+        '''
+        Registers the trajectory of one dynamic obstacle in the position-time tables.
+        The last cell of the trajectory stays occupied forever after the trajectory ends.
+
+        Returns
+        -------
+        set[tuple[int, int]]
+            Cells visited by the obstacle
+        '''
+        touched = set()
+        for t, (i, j) in enumerate(obstacle):
+            if not (i, j) in self._pos_time_table:
+                self._pos_time_table[(i, j)] = []
+            d_i = 0 if t == len(obstacle) - 1 else obstacle[t + 1][0] - i 
+            d_j = 0 if t == len(obstacle) - 1 else obstacle[t + 1][1] - j 
+            self._pos_time_table[(i, j)].append((t, d_i, d_j))
+            touched.add((i, j))
+
+        last = tuple(obstacle[-1])
+        self._max_time_table[last] = min(len(obstacle) - 1, self._max_time_table.get(last, math.inf))
+        return touched
+    
+    
+    def _build_cell_intervals(self, i, j):
+        '''
+        (Re)builds the list of safe intervals of cell (i, j) from the position-time tables.
+        '''
+        intervals = []
+        self.intervals[i][j] = intervals
+        if not self._grid_map.traversable(i, j):
+            return
+        old_t = -1
+        out_moves = set()
+        if (i, j) not in self._pos_time_table:
+            intervals.append((old_t, math.inf, out_moves))
+            return
+        self._pos_time_table[(i, j)].sort()
+        for (t, d_i, d_j) in self._pos_time_table[(i, j)]:
+            if (i, j) in self._max_time_table and t > self._max_time_table[(i, j)]:
+                break
+            if t - old_t > 1:
+                intervals.append((old_t, t, out_moves))
+            if t != old_t:
                 out_moves = set()
-                if (i, j) not in pos_time_table:
-                    self.intervals[i][j].append((old_t, math.inf, out_moves))
-                    continue
-                pos_time_table[(i, j)].sort()
-                for (t, d_i, d_j) in pos_time_table[(i, j)]:
-                    if (i, j) in max_time_table and t > max_time_table[(i, j)]:
-                        break
-                    if t - old_t > 1:
-                        self.intervals[i][j].append((old_t, t, out_moves))
-                    if t != old_t:
-                        out_moves = set()
-                    old_t = t
-                    if d_i != 0 or d_j != 0:
-                        out_moves.add((d_i, d_j))
-                
-                if not (i, j) in max_time_table:
-                    self.intervals[i][j].append((old_t, math.inf, out_moves))
+            old_t = t
+            if d_i != 0 or d_j != 0:
+                out_moves.add((d_i, d_j))
+        
+        if not (i, j) in self._max_time_table:
+            intervals.append((old_t, math.inf, out_moves))
+    
+    
+    def add_obstacle(self, trajectory):
+        '''
+        Adds one more dynamic obstacle (e.g. the path of an already planned agent) to the map.
+        Only the safe intervals of the cells visited by the trajectory are rebuilt.
+
+        Parameters
+        ----------
+        trajectory : list[tuple[int, int]]
+            Position of the obstacle at every timestep. The obstacle stays in the last cell forever
+
+        Returns
+        -------
+        set[tuple[int, int]]
+            Cells of the map, whose safe intervals were changed
+        '''
+        touched = set()
+        for (i, j) in self._add_to_tables(trajectory):
+            if self.in_bounds(i, j):
+                self._build_cell_intervals(i, j)
+                touched.add((i, j))
+        self._changes.append(touched)
+        self.version += 1
+        return touched
+
+
+    def changed_cells(self, since_version):
+        '''
+        Returns the set of cells, whose safe intervals were changed after the version since_version.
+        '''
+        changed = set()
+        for cells in self._changes[since_version:]:
+            changed |= cells
+        return changed
+        
+
+
+    def free_mask(self):
+        '''
+        Returns the mask of cells, which are safe at any moment: traversable and never visited by dynamic obstacles
+        (their only safe interval is (-1, inf)).
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array of shape (height, width)
+        '''
+        mask = ~self._grid_map.get_cells_array()
+        for (i, j) in self._pos_time_table:
+            if self.in_bounds(i, j):
+                mask[i, j] = False
+        return mask
         
         
     # Check if the cell is on a grid.    
@@ -337,6 +685,148 @@ class SafeMap: # Map, but with safe intervals.
 
     def get_size(self): # Returns the size of the map in cells
         return (self._height, self._width)
+
+
+    def get_cells_array(self): # Static obstacles as a NumPy array (see Map.get_cells_array)
+        return self._grid_map.get_cells_array()
+
+
+    def connected(self, i1, j1, i2, j2): # Static connectivity of two cells (see Map.connected), views delegate it too
+        return self._grid_map.connected(i1, j1, i2, j2)
+    
+
+
+class _IntervalsRowView:
+    '''
+    One row of SafeMapView.intervals: changed cells are taken from the view, other cells from the base map.
+    '''
+    
+    def __init__(self, view, i):
+        self._view = view
+        self._i = i
+        self._base_row = view._base.intervals[i]
+        
+        
+    def __getitem__(self, j):
+        return self._view._get_cell_intervals(self._i, j, self._base_row)
+    
+    
+    def __len__(self):
+        return len(self._base_row)
+    
+    
+class _IntervalsView:
+    '''
+    SafeMapView.intervals: rows without changed cells are the rows of the base map itself.
+    '''
+    
+    def __init__(self, view):
+        self._view = view
+        self._rows = dict()
+        
+        
+    def __getitem__(self, i):
+        if not self._view._row_changed(i):
+            return self._view._base.intervals[i]
+        row = self._rows.get(i)
+        if row is None:
+            row = _IntervalsRowView(self._view, i)
+            self._rows[i] = row
+        return row
+    
+    
+    def __len__(self):
+        return len(self._view._base.intervals)
+    
+    
+class SafeMapView(SafeMap):
+    '''
+    Read-only SafeMap, which changes safe intervals of some cells of the base SafeMap.
+    Safe intervals of all other cells are shared with the base map (nothing is copied),
+    changed intervals are built lazily on the first access and cached.
+    Subclasses define which cells are changed (_row_changed, _cell_changed)
+    and how their intervals look (_make_cell_intervals).
+    '''
+    
+    def __init__(self, safe_map):
+        self._base = safe_map
+        self._grid_map = safe_map._grid_map
+        self._height, self._width = safe_map.get_size()
+        self._changed_intervals = dict()
+        self.intervals = _IntervalsView(self)
+        
+        
+    def _row_changed(self, i):
+        return True
+    
+    
+    def _cell_changed(self, i, j):
+        return True
+    
+    
+    def _make_cell_intervals(self, i, j, base_intervals):
+        return base_intervals
+    
+    
+    def _get_cell_intervals(self, i, j, base_row):
+        if not self._cell_changed(i, j):
+            return base_row[j]
+        intervals = self._changed_intervals.get((i, j))
+        if intervals is None:
+            intervals = self._make_cell_intervals(i, j, base_row[j])
+            self._changed_intervals[(i, j)] = intervals
+        return intervals
+    
+    
+    def add_obstacle(self, trajectory):
+        raise Exception("SafeMapView is read-only, add obstacles to the base SafeMap")
+
+
+    def free_mask(self):
+        # cells changed by the view are not considered free (subclasses may know better)
+        mask = self._base.free_mask()
+        for i in range(self._height):
+            if self._row_changed(i):
+                for j in np.flatnonzero(mask[i]).tolist():
+                    if self._cell_changed(i, j):
+                        mask[i, j] = False
+        return mask
+
+
+    @property
+    def version(self):
+        return self._base.version
+
+
+    def changed_cells(self, since_version):
+        return self._base.changed_cells(since_version)
+
+
+
+class PrunedSafeMap(SafeMapView):
+    '''
+    SafeMap without the cells of the mask: they have no safe intervals, so planners never generate them
+    (e.g. the dead ends of the query, Map.dead_ends). Like WindowedSafeMap, it is built eagerly, so lookups are as fast
+    as in SafeMap, but only the rows with pruned cells are copied (shallowly), other rows are shared with the base map.
+    '''
+
+    def __init__(self, safe_map, mask):
+        super().__init__(safe_map)
+        self._mask = mask
+        self.intervals = list(safe_map.intervals)
+        rows, columns = np.nonzero(mask)
+        for i in np.unique(rows).tolist():
+            self.intervals[i] = list(self.intervals[i])
+        for i, j in zip(rows.tolist(), columns.tolist()):
+            self.intervals[i][j] = []
+
+
+    def free_mask(self):
+        return self._base.free_mask() & ~self._mask
+
+
+    def get_cells_array(self):
+        return self._base.get_cells_array() | self._mask
     
 
 
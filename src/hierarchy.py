@@ -0,0 +1,169 @@
+import heapq
+import math
+
+from collections import deque
+
+import numpy as np
+
+from src.grid import manhattan_distance
+
+
+# borders of clusters shorter than this get one entrance in the middle, longer ones -- two at the ends (as in HPA*)
+LONG_ENTRANCE = 6
+
+
+class ClusterHierarchy:
+    '''
+    HPA*-style abstraction of a static Map: the map is split into square clusters of cluster_size cells,
+    every run of free cells along the border of two neighbouring clusters gets entrances (pairs of cells
+    on both sides of the border), and the distances between entrances of one cluster are precomputed
+    by BFS inside the cluster.
+
+    The abstract graph has entrances as nodes, edges of cost 1 between the cells of an entrance pair
+    and edges of the intra-cluster distances. Two cells are connected in it if and only if they are
+    connected in the map, so the abstract search fails only for really unreachable goals.
+
+    - cluster_size -- the size of a cluster in cells
+    - entrances -- cluster (ci, cj) -> list of its entrance cells
+    - edges -- entrance cell -> dict(neighbouring entrance cell -> cost)
+    '''
+
+    def __init__(self, grid_map, cluster_size = 16):
+        self.cluster_size = cluster_size
+        blocked = grid_map.get_cells_array()
+        self._height, self._width = blocked.shape
+        self._blocked = blocked.tolist()
+        self.entrances = dict()
+        self.edges = dict()
+        self._find_entrances(blocked)
+        for cluster, cells in self.entrances.items():
+            for cell in cells:
+                distances = self._distances(cell, cluster)
+                edges = self.edges[cell]
+                for other in cells:
+                    if other != cell and other in distances:
+                        edges[other] = distances[other]
+
+
+    def cluster_of(self, i, j):
+        return (i // self.cluster_size, j // self.cluster_size)
+
+
+    def _add_entrance(self, cell, other):
+        for a, b in ((cell, other), (other, cell)):
+            if not a in self.edges:
+                self.edges[a] = dict()
+                self.entrances.setdefault(self.cluster_of(*a), []).append(a)
+            self.edges[a][b] = 1
+
+
+    def _find_entrances(self, blocked):
+        size = self.cluster_size
+        free = ~blocked
+        for axis in (0, 1):
+            # axis 0: borders between clusters one above the other (rows), axis 1: side by side (columns)
+            length = self._height if axis == 0 else self._width
+            for border in range(size, length, size):
+                if axis == 0:
+                    both = free[border - 1, :] & free[border, :]
+                else:
+                    both = free[:, border - 1] & free[:, border]
+                for start in range(0, len(both), size):
+                    chunk = np.concatenate([[False], both[start:start + size], [False]]).astype(np.int8)
+                    bounds = np.flatnonzero(np.diff(chunk))
+                    for first, end in zip(bounds[::2].tolist(), bounds[1::2].tolist()):
+                        if end - first < LONG_ENTRANCE:
+                            offsets = ((first + end - 1) // 2,)
+                        else:
+                            offsets = (first, end - 1)
+                        for offset in offsets:
+                            k = start + offset
+                            if axis == 0:
+                                self._add_entrance((border - 1, k), (border, k))
+                            else:
+                                self._add_entrance((k, border - 1), (k, border))
+
+
+    def _distances(self, cell, cluster):
+        '''
+        BFS distances from the cell to the cells of the cluster, moving only inside the cluster.
+        '''
+        size = self.cluster_size
+        top, left = cluster[0] * size, cluster[1] * size
+        bottom, right = min(top + size, self._height), min(left + size, self._width)
+        blocked = self._blocked
+        distances = {cell: 0}
+        queue = deque([cell])
+        while queue:
+            i, j = queue.popleft()
+            d = distances[(i, j)] + 1
+            for ni, nj in ((i, j + 1), (i + 1, j), (i, j - 1), (i - 1, j)):
+                if top <= ni < bottom and left <= nj < right and not blocked[ni][nj] and not (ni, nj) in distances:
+                    distances[(ni, nj)] = d
+                    queue.append((ni, nj))
+        return distances
+
+
+    def _connect(self, cell, extra):
+        # temporary edges of a cell, which is not an entrance (start or goal), to the entrances of its cluster
+        if cell in self.edges or cell in extra:
+            return
+        distances = self._distances(cell, self.cluster_of(*cell))
+        extra[cell] = dict()
+        for other in list(extra) + self.entrances.get(self.cluster_of(*cell), []):
+            if other != cell and other in distances:
+                extra[cell][other] = distances[other]
+                extra.setdefault(other, dict())[cell] = distances[other]
+
+
+    def abstract_path(self, start_i, start_j, goal_i, goal_j):
+        '''
+        A* search in the abstract graph with the start and the goal connected to the entrances of their clusters.
+
+        Returns
+        -------
+        path : list[tuple[int, int]] or None
+            Cells of the abstract path from the start to the goal (None if the goal is unreachable)
+        steps : int
+            The number of expanded abstract nodes
+        '''
+        start, goal = (start_i, start_j), (goal_i, goal_j)
+        if self._blocked[start_i][start_j] or self._blocked[goal_i][goal_j]:
+            return None, 0
+        extra = dict()
+        self._connect(start, extra)
+        self._connect(goal, extra)
+        if start == goal:
+            return [start], 0
+
+        g = {start: 0}
+        parents = {start: None}
+        closed = set()
+        # (f, -g, counter, cell): ties are broken in favour of deeper nodes
+        open_heap = [(manhattan_distance(start_i, start_j, goal_i, goal_j), 0, 0, start)]
+        counter = 1
+        steps = 0
+        while open_heap:
+            _, _, _, cell = heapq.heappop(open_heap)
+            if cell in closed:
+                continue
+            steps += 1
+            if cell == goal:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = parents[cell]
+                return path[::-1], steps
+            closed.add(cell)
+            for edges in (self.edges.get(cell), extra.get(cell)):
+                if edges is None:
+                    continue
+                for other, cost in edges.items():
+                    new_g = g[cell] + cost
+                    if other in closed or new_g >= g.get(other, math.inf):
+                        continue
+                    g[other] = new_g
+                    parents[other] = cell
+                    heapq.heappush(open_heap, (new_g + manhattan_distance(*other, goal_i, goal_j), -new_g, counter, other))
+                    counter += 1
+        return None, steps
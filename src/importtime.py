@@ -0,0 +1,60 @@
+import argparse
+import json
+import subprocess
+import sys
+
+
+# planning core: it must be importable with the standard library and NumPy only
+CORE_MODULES = ("src.grid", "src.utils", "src.algo.sipp", "src.algo.wsipp_r", "src.algo.wsipp_d",
+                "src.algo.astar_timesteps", "src.algo.naive_arsipp", "src.algo.prioritized", "src.algo.cbs",
+                "src.path", "src.validate", "src.plancache", "src.hierarchy", "src.algo.hsipp", "src.algo.jps_sipp")
+
+# modules, which are loaded only by visualization and notebook helpers
+HEAVY_MODULES = ("matplotlib", "PIL", "IPython", "tqdm")
+
+_PROBE = '''
+import json, sys, time
+start_time = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start_time
+print(json.dumps({{"ms": 1000 * elapsed, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+'''
+
+
+def measure_import(modules, repeats = 5, cwd = None):
+    '''
+    Imports the modules in fresh interpreters repeats times.
+
+    Returns
+    -------
+    dict
+        "ms" -- the best import time in milliseconds, "heavy" -- heavy modules (HEAVY_MODULES), which were loaded
+    '''
+    code = _PROBE.format(modules=tuple(modules), heavy=HEAVY_MODULES)
+    best = None
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output)
+        if best is None or result["ms"] < best["ms"]:
+            best = result
+    return best
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog="python -m src.importtime",
+                                     description="Measures import time of the modules in fresh interpreters.")
+    parser.add_argument("modules", nargs="*", default=None, help="modules to measure (default: the planning core and numpy)")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    groups = [[name] for name in args.modules] if args.modules else \
+             [["numpy"], list(CORE_MODULES), ["src.benchmark"], ["src.launch"]]
+    for modules in groups:
+        result = measure_import(modules, args.repeats)
+        print("{:>9.1f} ms  {}{}".format(result["ms"], " + ".join(modules) if len(modules) < 3 else "planning core",
+                                       "  (loads " + ", ".join(result["heavy"]) + ")" if result["heavy"] else ""))
+
+
+if __name__ == "__main__":
+    main()
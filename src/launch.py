@@ -1,65 +1,29 @@
-import copy
-import math
-import matplotlib.pyplot as plt
 import numpy as np
 import time
 
-from heapq import heappop, heappush, heapify
-from random import randint
-from IPython.display import HTML
-from PIL import Image, ImageDraw, ImageOps
-from IPython.display import Image as Img
-from IPython.display import display
 from sys import float_info
 from datetime import datetime
 from tqdm import tqdm
 
 from src.grid import Map, SafeMap, manhattan_distance
+from src.scenario import iter_scenarios
+from src.workload import generate_tasks, generate_periodic_obstacles_confs, generate_agents
 from src.utils import make_path, draw
 from src.algo.astar_timesteps import astar_timesteps, SearchTree as SearchTreeAStarTimesteps
 from src.algo.sipp import sipp, SearchTree as SearchTreeSIPP
 from src.algo.wsipp_r import wsipp_r, SearchTree as SearchTreeWSIPPR
 from src.algo.wsipp_d import wsipp_d, SearchTree as SearchTreeWSIPPD
 from src.algo.naive_arsipp import naive_arsipp
+from src.algo.prioritized import prioritized_plan
+from src.algo.cbs import cbs
+from src.refcache import ReferenceCostCache, DEFAULT_PATH as REFERENCE_COSTS_PATH
 
 EPS = float_info.epsilon
-
-
-def generate_dynamic_obstacles_confs(count, height, width):    
-    delta = np.array([[0, 1], [1, 0], [0, -1], [-1, 0]])
-    tasks = []
-    
-    for num in range(count):
-        confs = []
-        count_obs = 0
-        if count < 10:
-            count_obs = 3 * num
-        else:
-            count_obs = 7 * num
-            
-        for i_obs in range(count_obs):
-            l = np.random.choice(range(3, 13))
-            conf = []
-            i = np.random.choice(height)
-            j = np.random.choice(width)
-            conf.append((i, j))
-            deltas = delta[np.random.choice(4, size=l-1)]
-            for pos in range(1, l):
-                conf.append((conf[pos-1][0] + deltas[pos-1][0], conf[pos-1][1] + deltas[pos-1][1])) 
-
-            conf = conf + conf[-2:0:-1]
-            conf_res = []
-            for _ in range(100):
-                conf_res = conf_res + conf
-            confs.append(conf_res)
-        
-        tasks.append(confs)
-    
-    return tasks
+# seed of the tasks with dynamic obstacles (generate_tasks), the same in all launches
+TASKS_SEED = 100
 
 
 def launch_astar_timesteps(file_name, tasks_count, *args):
-    np.random.seed(100)
     from src.algo.astar_timesteps import CATable, Node
         
     map_path = "maps/" + file_name + ".map"    
@@ -67,8 +31,7 @@ def launch_astar_timesteps(file_name, tasks_count, *args):
     grid.read_from_file(map_path)
     
     scens_path = "scens/" + file_name + ".map.scen"     
-    scens_file = open(scens_path) 
-    start_i, start_j, goal_i, goal_j = list(map(lambda i: int(i), scens_file.readline().split()))
+    start_i, start_j, goal_i, goal_j = next(iter_scenarios(scens_path))[:4]
         
     stat = dict()
     stat["wasFind"] = []
@@ -77,7 +40,7 @@ def launch_astar_timesteps(file_name, tasks_count, *args):
     stat["nodesCreated"] = []
     stat["time"] = []
     
-    tasks = generate_dynamic_obstacles_confs(tasks_count, grid.get_size()[0], grid.get_size()[1])
+    tasks = generate_tasks(grid, tasks_count, TASKS_SEED)
     
     for i, task in tqdm(enumerate(tasks)):
         try:   
@@ -120,8 +83,7 @@ def launch_sipp(file_name, tasks_count, *args):
     grid.read_from_file(map_path)
     
     scens_path = "scens/" + file_name + ".map.scen"     
-    scens_file = open(scens_path) 
-    start_i, start_j, goal_i, goal_j = list(map(lambda i: int(i), scens_file.readline().split()))
+    start_i, start_j, goal_i, goal_j = next(iter_scenarios(scens_path))[:4]
         
     stat = dict()
     stat["wasFind"] = []
@@ -130,7 +92,7 @@ def launch_sipp(file_name, tasks_count, *args):
     stat["nodesCreated"] = []
     stat["time"] = []
     
-    tasks = generate_dynamic_obstacles_confs(tasks_count, grid.get_size()[0], grid.get_size()[1])
+    tasks = generate_tasks(grid, tasks_count, TASKS_SEED)
     
     for i, task in tqdm(enumerate(tasks)):
         try:   
@@ -165,7 +127,12 @@ def launch_sipp(file_name, tasks_count, *args):
     return stat
 
 
-def launch_wsipp(file_name, search_fun, tasks_count, w, *args):
+def launch_wsipp(file_name, search_fun, tasks_count, w, *args, refcache = REFERENCE_COSTS_PATH):
+    '''
+    Runs the weighted planner search_fun on generated tasks and measures its suboptimality coefficient.
+    Optimal lengths are taken from the persistent reference cost cache in the refcache file
+    (":memory:" -- do not persist), so a sweep over weights runs sipp for every task only once.
+    '''
     from src.algo.astar_timesteps import CATable, Node
         
     map_path = "maps/" + file_name + ".map"    
@@ -173,8 +140,7 @@ def launch_wsipp(file_name, search_fun, tasks_count, w, *args):
     grid.read_from_file(map_path)
     
     scens_path = "scens/" + file_name + ".map.scen"     
-    scens_file = open(scens_path) 
-    start_i, start_j, goal_i, goal_j = list(map(lambda i: int(i), scens_file.readline().split()))
+    start_i, start_j, goal_i, goal_j = next(iter_scenarios(scens_path))[:4]
         
     stat = dict()
     stat["wasFind"] = []
@@ -184,14 +150,14 @@ def launch_wsipp(file_name, search_fun, tasks_count, w, *args):
     stat["nodesCreated"] = []
     stat["time"] = []
     
-    tasks = generate_dynamic_obstacles_confs(tasks_count, grid.get_size()[0], grid.get_size()[1])
+    tasks = generate_tasks(grid, tasks_count, TASKS_SEED)
+    reference_costs = ReferenceCostCache(refcache)
     
     for i, task in tqdm(enumerate(tasks)):
 #         try:   
             safe_task_map = SafeMap(grid, task)
             
-            expected = sipp(safe_task_map, start_i, start_j, goal_i, goal_j, manhattan_distance, SearchTreeSIPP)
-            expected_len = make_path(expected[1])[1]
+            expected_len = reference_costs.reference_cost(grid, task, start_i, start_j, goal_i, goal_j, safe_task_map)
                 
             start_time = datetime.now()
             result = search_fun(safe_task_map, start_i, start_j, goal_i, goal_j, w, *args)
@@ -206,7 +172,7 @@ def launch_wsipp(file_name, search_fun, tasks_count, w, *args):
                 path = make_path(result[1]) 
                 stat["lenght"].append(path[1])
             
-                coef = path[1] / expected_len
+                coef = path[1] / expected_len if expected_len else 1.0
                 stat["coef"].append(coef)
                 
                 print("Path found! Length: " + str(path[1]) +\
@@ -222,13 +188,213 @@ def launch_wsipp(file_name, search_fun, tasks_count, w, *args):
 #         except Exception as e:
 #             print("Execution error")
 #             print(e)
-        
+    
+    reference_costs.close()
     return stat
 
 
+def launch_prioritized(file_name, agents_counts, *args):
+    '''
+    Runs prioritized planning for groups of agents of different size on the map.
+    For every size the same set of dynamic obstacles (the largest task out of 10 generated) is used.
+    The map is not cropped, so groups of hundreds of agents fit on the 512 x 512 maps.
+    Returns stat dicts of prioritized_plan, one for every size from agents_counts.
+    '''
+    np.random.seed(100)
+        
+    map_path = "maps/" + file_name + ".map"    
+    grid = Map()
+    grid.read_from_file(map_path, max_size=None)
+    
+    task = generate_tasks(grid, 10, TASKS_SEED)[-1]
+    
+    stats = []
+    for count in agents_counts:
+        agents = generate_agents(grid, count)
+        paths, stat = prioritized_plan(grid, task, agents, *args)
+        stats.append(stat)
+        
+        print("Agents: " + str(count) + \
+              ". Failures: " + str(len(stat["failures"])) + \
+              ". Mean latency: " + str(np.mean(stat["time"])) + \
+              ". Throughput: " + str(stat["throughput"]))
+        
+    return stats
+
+
+def launch_cbs(file_name, agents_counts, instances_count, time_limit, *args):
+    '''
+    Runs Conflict-Based Search on instances_count random instances for every number of agents from agents_counts.
+    Every instance is limited by time_limit seconds. The map is not cropped (as in launch_prioritized).
+    Returns a stat dict with success rate and mean runtime (of all and of solved instances) per number of agents.
+    '''
+    np.random.seed(100)
+        
+    map_path = "maps/" + file_name + ".map"    
+    grid = Map()
+    grid.read_from_file(map_path, max_size=None)
+    
+    task = generate_tasks(grid, 10, TASKS_SEED)[-1]
+    safe_task_map = SafeMap(grid, task)
+    
+    stat = dict()
+    stat["agents"] = []
+    stat["successRate"] = []
+    stat["time"] = []
+    stat["solvedTime"] = []
+    stat["expandedNodes"] = []
+    
+    for count in agents_counts:
+        solved = 0
+        runtimes = []
+        solved_runtimes = []
+        expanded = []
+        for _ in range(instances_count):
+            agents = generate_agents(grid, count)
+            found, paths, result = cbs(grid, task, agents, *args, time_limit=time_limit, safe_map=safe_task_map)
+            solved += found
+            runtimes.append(result["time"])
+            expanded.append(result["expandedNodes"])
+            if found:
+                solved_runtimes.append(result["time"])
+        
+        stat["agents"].append(count)
+        stat["successRate"].append(solved / instances_count)
+        stat["time"].append(np.mean(runtimes))
+        stat["solvedTime"].append(np.mean(solved_runtimes) if solved_runtimes else 0.0)
+        stat["expandedNodes"].append(np.mean(expanded))
+        
+        print("Agents: " + str(count) + \
+              ". Success rate: " + str(solved / instances_count) + \
+              ". Mean time: " + str(np.mean(runtimes)))
+        
+    return stat
 
 
+def find_unreachable_goal(grid_map, start_i, start_j):
+    '''
+    Returns a traversable cell, which is not reachable from the start on the static map, or None.
+    '''
+    height, width = grid_map.get_size()
+    reached = {(start_i, start_j)}
+    stack = [(start_i, start_j)]
+    while stack:
+        for neighbor in grid_map.get_neighbors(*stack.pop()):
+            if not neighbor in reached:
+                reached.add(neighbor)
+                stack.append(neighbor)
+    for i in range(height):
+        for j in range(width):
+            if grid_map.traversable(i, j) and not (i, j) in reached:
+                return i, j
+    return None
 
 
+def launch_astar_periodic(file_name, obstacles_count, period, repeats, *args):
+    '''
+    Compares A* with timesteps on the finite CATable and on the periodic one (period is detected)
+    on a long-horizon task: the start and the goal from the scen file and an unreachable goal.
+    '''
+    from src.algo.astar_timesteps import CATable
+    np.random.seed(100)
+        
+    map_path = "maps/" + file_name + ".map"    
+    grid = Map()
+    grid.read_from_file(map_path)
+    
+    scens_path = "scens/" + file_name + ".map.scen"     
+    start_i, start_j, goal_i, goal_j = next(iter_scenarios(scens_path))[:4]
+    
+    task = generate_periodic_obstacles_confs(obstacles_count, grid.get_size()[0], grid.get_size()[1], period, repeats)
+    queries = [(goal_i, goal_j)]
+    unreachable = find_unreachable_goal(grid, start_i, start_j)
+    if unreachable is not None:
+        queries.append(unreachable)
+    
+    stat = dict()
+    stat["mode"] = []
+    stat["wasFind"] = []
+    stat["lenght"] = []
+    stat["closed"] = []
+    stat["time"] = []
+    
+    for mode, ca_table in (("finite", CATable(task)), ("periodic", CATable(task, period='auto'))):
+        for goal in queries:
+            start_time = datetime.now()
+            result = astar_timesteps(grid, ca_table, start_i, start_j, goal[0], goal[1], *args, keep_lists=True)
+            runtime = datetime.now() - start_time
+            
+            stat["mode"].append(mode)
+            stat["wasFind"].append(result[0])
+            stat["lenght"].append(result[1].g if result[0] else 0.0)
+            stat["closed"].append(len(result[5]))
+            stat["time"].append(runtime)
+            
+            print(mode + " (period " + str(ca_table.period) + "). Goal: " + str(goal) + \
+                  ". Found: " + str(result[0]) + \
+                  ". Closed: " + str(len(result[5])) + \
+                  ". Time: " + str(runtime))
+    
+    return stat
 
 
+def launch_catable_benchmark(file_name, tasks_count, queries_count, max_size = None):
+    '''
+    Compares the dict CATable and the bit-packed DenseCATable on generated tasks:
+    build time, memory (traced allocations), rate of batched check_moves over all five successors
+    of random nodes and rate of the vectorized check_moves_array (in moves per second).
+    The map is not cropped by default (max_size as in Map.read_from_file), so memory is measured on full maps.
+    '''
+    import tracemalloc
+    from src.algo.astar_timesteps import CATable, DenseCATable
+    np.random.seed(100)
+        
+    map_path = "maps/" + file_name + ".map"    
+    grid = Map()
+    grid.read_from_file(map_path, max_size)
+    height, width = grid.get_size()
+    
+    stat = dict()
+    for name in ("dict", "dense"):
+        stat[name] = dict()
+        stat[name]["buildTime"] = []
+        stat[name]["memory"] = []
+        stat[name]["movesPerSecond"] = []
+    stat["dense"]["vectorizedMovesPerSecond"] = []
+    
+    tasks = generate_tasks(grid, tasks_count, TASKS_SEED)
+    
+    for task in tasks:
+        horizon = max([len(obstacle) for obstacle in task], default=1)
+        nodes_i = np.random.randint(1, height - 1, size=queries_count)
+        nodes_j = np.random.randint(1, width - 1, size=queries_count)
+        nodes_t = np.random.randint(0, horizon, size=queries_count)
+        nodes = list(zip(nodes_i.tolist(), nodes_j.tolist(), nodes_t.tolist()))
+        
+        for name in ("dict", "dense"):
+            tracemalloc.start()
+            start_time = time.perf_counter()
+            ca_table = CATable(task) if name == "dict" else DenseCATable(grid, task)
+            stat[name]["buildTime"].append(time.perf_counter() - start_time)
+            stat[name]["memory"].append(tracemalloc.get_traced_memory()[0])
+            tracemalloc.stop()
+            
+            start_time = time.perf_counter()
+            for (i, j, t) in nodes:
+                ca_table.check_moves(i, j, t, ((i, j + 1), (i + 1, j), (i, j - 1), (i - 1, j), (i, j)))
+            stat[name]["movesPerSecond"].append(5 * queries_count / (time.perf_counter() - start_time))
+            
+            if name == "dense":
+                delta = np.array([[0, 1], [1, 0], [0, -1], [-1, 0], [0, 0]])
+                start_time = time.perf_counter()
+                ca_table.check_moves_array(nodes_i[:, None], nodes_j[:, None], 
+                                           nodes_i[:, None] + delta[:, 0], nodes_j[:, None] + delta[:, 1], nodes_t[:, None])
+                stat[name]["vectorizedMovesPerSecond"].append(5 * queries_count / (time.perf_counter() - start_time))
+        
+        print("Obstacles: " + str(len(task)) + \
+              ". Memory, bytes (dict / dense): " + str(stat["dict"]["memory"][-1]) + " / " + str(stat["dense"]["memory"][-1]) + \
+              ". Moves per second (dict / dense / vectorized): " + str(int(stat["dict"]["movesPerSecond"][-1])) + \
+              " / " + str(int(stat["dense"]["movesPerSecond"][-1])) + \
+              " / " + str(int(stat["dense"]["vectorizedMovesPerSecond"][-1])))
+    
+    return stat
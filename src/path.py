@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class CompactPath:
+    '''
+    Path as waypoints with explicit waits: the agent arrives to the cell (i[k], j[k]) at arrival[k],
+    waits there and leaves it at departure[k] (it is in the next cell at departure[k] + 1).
+    Departure of the last waypoint equals its arrival.
+
+    It keeps no references to search nodes, so the search tree can be released right after the search.
+    Positions at every timestep are built only on demand (positions, position).
+    '''
+
+    def __init__(self, i, j, arrival, departure):
+        self.i = np.asarray(i, dtype=np.int64)
+        self.j = np.asarray(j, dtype=np.int64)
+        self.arrival = np.asarray(arrival, dtype=np.int64)
+        self.departure = np.asarray(departure, dtype=np.int64)
+
+
+    def __len__(self):
+        '''
+        Number of waypoints
+        '''
+        return len(self.i)
+
+
+    def __repr__(self):
+        return "CompactPath(" + ", ".join("({}, {}, {}, {})".format(*waypoint) for waypoint in self.waypoints()) + ")"
+
+
+    @property
+    def length(self):
+        '''
+        Duration of the path (the same as the length returned by make_path)
+        '''
+        return int(self.arrival[-1] - self.arrival[0])
+
+
+    def waypoints(self):
+        '''
+        Returns waypoints as an array of shape (n, 4): i, j, arrival, departure.
+        '''
+        return np.stack([self.i, self.j, self.arrival, self.departure], axis=1)
+
+
+    def positions(self):
+        '''
+        Expands the path to positions at every timestep from arrival[0] to arrival[-1].
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (length + 1, 2): (i, j) of the agent at time arrival[0] + t
+        '''
+        counts = self.departure - self.arrival + 1
+        return np.repeat(np.stack([self.i, self.j], axis=1), counts, axis=0)
+
+
+    def position(self, t):
+        '''
+        Position of the agent at time t (it stays at the goal after the end of the path and at the start before it).
+        '''
+        k = max(int(np.searchsorted(self.arrival, t, side="right")) - 1, 0)
+        return int(self.i[k]), int(self.j[k])
+
+
+
+def compact_path(goal):
+    '''
+    Extracts the path to goal (the last node returned by a planner) in one pass over parent pointers.
+    Consecutive nodes in the same cell (waits of astar_timesteps) are merged into one waypoint.
+    Unlike make_path, it keeps a wait at the start cell.
+    '''
+    cells = []
+    times = []
+    current = goal
+    while current is not None:
+        cells.append((current.i, current.j))
+        times.append(current.g)
+        current = current.parent
+    cells = np.array(cells[::-1], dtype=np.int64).reshape(-1, 2)
+    times = np.array(times[::-1], dtype=np.int64)
+
+    moved = np.ones(len(cells), dtype=bool)
+    moved[1:] = (cells[1:] != cells[:-1]).any(axis=1)
+    cells = cells[moved]
+    arrival = times[moved]
+    departure = np.empty_like(arrival)
+    departure[:-1] = arrival[1:] - 1
+    departure[-1:] = arrival[-1:]
+    return CompactPath(cells[:, 0], cells[:, 1], arrival, departure)
@@ -0,0 +1,158 @@
+from collections import OrderedDict
+
+from src.algo.sipp import sipp, SearchTree as SearchTreeSIPP
+from src.algo.wsipp_d import wsipp_d, SearchTree as SearchTreeWSIPPD
+from src.algo.wsipp_r import wsipp_r, SearchTree as SearchTreeWSIPPR
+from src.grid import manhattan_distance
+from src.utils import with_mixin
+
+
+def _run_sipp(safe_map, start_i, start_j, goal_i, goal_j, w):
+    return sipp(safe_map, start_i, start_j, goal_i, goal_j, manhattan_distance, SearchTreeSIPP, keep_lists=False, compact=True)
+
+
+def _run_wsipp_r(safe_map, start_i, start_j, goal_i, goal_j, w):
+    return wsipp_r(safe_map, start_i, start_j, goal_i, goal_j, w, manhattan_distance, SearchTreeWSIPPR, keep_lists=False, compact=True)
+
+
+def _run_wsipp_d(safe_map, start_i, start_j, goal_i, goal_j, w):
+    return wsipp_d(safe_map, start_i, start_j, goal_i, goal_j, w, manhattan_distance, SearchTreeWSIPPD, keep_lists=False, compact=True)
+
+
+# name -> planner on a SafeMap, which returns CompactPath
+PLANNERS = {
+    "sipp": _run_sipp,
+    "wsipp_r": _run_wsipp_r,
+    "wsipp_d": _run_wsipp_d,
+}
+
+
+class _FootprintSafeMap:
+    '''
+    Hook of SafeMap, which collects the cells, whose safe intervals were read (see with_mixin).
+    '''
+
+    def get_interval(self, i, j, t):
+        self._footprint.add((i, j))
+        return super().get_interval(i, j, t)
+
+
+
+class PlanCache:
+    '''
+    LRU cache of planning results in front of sipp / wsipp_* on one SafeMap.
+
+    Entries are keyed by (algorithm, start, goal, w) and store the SafeMap version they are valid for
+    and the footprint of the search -- the cells, whose safe intervals the search read.
+    When the SafeMap changes (add_obstacle), only the entries whose footprints contain changed cells
+    are dropped; the search of any other entry would read the same intervals and find the same path,
+    so it stays valid for the new version.
+
+    The cache is bounded by the number of entries (maxsize) and, optionally, by the total number of
+    footprint cells (max_cells), which is proportional to its memory.
+    '''
+
+    def __init__(self, safe_map, maxsize = 1024, max_cells = None):
+        self._safe_map = safe_map
+        self._maxsize = maxsize
+        self._max_cells = max_cells
+        self._entries = OrderedDict()   # key -> (result, footprint)
+        self._by_cell = dict()          # cell -> keys of entries, whose footprint contains the cell
+        self._version = safe_map.version
+        self._cells = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def plan(self, algorithm, start_i, start_j, goal_i, goal_j, w = 1.0):
+        '''
+        Returns the result of the planner (path_found, CompactPath or None, steps, nodes_created)
+        for the current version of the SafeMap, running the search only on a cache miss.
+        steps and nodes_created are those of the search, which produced the cached result.
+        '''
+        self._sync()
+        key = (algorithm, start_i, start_j, goal_i, goal_j, float(w))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        footprint = set()
+        result = self._search(PLANNERS[algorithm], footprint, start_i, start_j, goal_i, goal_j, w)
+        result = result[:4]
+        self._insert(key, result, footprint)
+        return result
+
+
+    def stats(self):
+        '''
+        Returns counters of the cache as a dict: hits, misses, hit_rate, evictions (by the size bounds),
+        invalidations (by changes of the SafeMap), entries, cells (total size of footprints), version.
+        '''
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "cells": self._cells,
+            "version": self._version,
+        }
+
+
+    def clear(self):
+        self._entries.clear()
+        self._by_cell.clear()
+        self._cells = 0
+
+
+    def _search(self, planner, footprint, start_i, start_j, goal_i, goal_j, w):
+        # the footprint is collected by get_interval of a copy of the SafeMap (get_neighbors and traversable use it)
+        safe_map = with_mixin(self._safe_map, _FootprintSafeMap, _footprint=footprint)
+        return planner(safe_map, start_i, start_j, goal_i, goal_j, w)
+
+
+    def _sync(self):
+        version = self._safe_map.version
+        if version == self._version:
+            return
+        for cell in self._safe_map.changed_cells(self._version):
+            for key in list(self._by_cell.get(cell, ())):
+                self._remove(key)
+                self.invalidations += 1
+        self._version = version
+
+
+    def _insert(self, key, result, footprint):
+        self._entries[key] = (result, footprint)
+        for cell in footprint:
+            keys = self._by_cell.get(cell)
+            if keys is None:
+                keys = self._by_cell[cell] = set()
+            keys.add(key)
+        self._cells += len(footprint)
+
+        while len(self._entries) > 1 and (len(self._entries) > self._maxsize or
+                                          self._max_cells is not None and self._cells > self._max_cells):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+
+    def _remove(self, key):
+        result, footprint = self._entries.pop(key)
+        for cell in footprint:
+            keys = self._by_cell[cell]
+            keys.discard(key)
+            if not keys:
+                del self._by_cell[cell]
+        self._cells -= len(footprint)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import sqlite3
+
+from src.grid import SafeMap, manhattan_distance
+from src.utils import make_path
+from src.algo.sipp import sipp, SearchTree
+
+
+DEFAULT_PATH = "reference_costs.sqlite"
+
+
+def map_hash(grid_map):
+    '''
+    Returns a hash of the static map: its size and the traversability of every cell.
+    '''
+    height, width = grid_map.get_size()
+    digest = hashlib.sha1("{} {}\n".format(height, width).encode())
+    for i in range(height):
+        digest.update(bytes(0 if grid_map.traversable(i, j) else 1 for j in range(width)))
+    return digest.hexdigest()
+
+
+def obstacles_hash(dyn_obst_traj):
+    '''
+    Returns a hash of the trajectories of dynamic obstacles (the order of obstacles matters).
+    '''
+    trajectories = [[[int(i), int(j)] for (i, j) in obstacle] for obstacle in dyn_obst_traj]
+    return hashlib.sha1(json.dumps(trajectories, separators=(",", ":")).encode()).hexdigest()
+
+
+class ReferenceCostCache:
+    '''
+    Persistent cache of optimal path lengths (reference costs), which are used to measure
+    suboptimality of bounded-suboptimal planners.
+    Costs are stored in a SQLite file and keyed by (map hash, obstacles hash, start, goal),
+    so sweeps over weights or repeated runs compute every reference with SIPP only once.
+    An absent path is cached too (its cost is None).
+    '''
+
+    def __init__(self, path = DEFAULT_PATH):
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS reference_costs ("
+            "map TEXT, obstacles TEXT, start_i INTEGER, start_j INTEGER, goal_i INTEGER, goal_j INTEGER, "
+            "found INTEGER, cost REAL, "
+            "PRIMARY KEY (map, obstacles, start_i, start_j, goal_i, goal_j))")
+        self._connection.commit()
+        self._map_hashes = dict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def _map_key(self, grid_map):
+        # maps are immutable after reading, so their hashes are computed once per object
+        key = id(grid_map)
+        if not key in self._map_hashes:
+            self._map_hashes[key] = (grid_map, map_hash(grid_map))
+        return self._map_hashes[key][1]
+
+
+    def get(self, grid_map, dyn_obst_traj, start_i, start_j, goal_i, goal_j):
+        '''
+        Returns (found, cost) of the cached reference or None if it is not cached.
+        '''
+        row = self._connection.execute(
+            "SELECT found, cost FROM reference_costs "
+            "WHERE map = ? AND obstacles = ? AND start_i = ? AND start_j = ? AND goal_i = ? AND goal_j = ?",
+            (self._map_key(grid_map), obstacles_hash(dyn_obst_traj), start_i, start_j, goal_i, goal_j)).fetchone()
+        if row is None:
+            return None
+        return bool(row[0]), row[1]
+
+
+    def put(self, grid_map, dyn_obst_traj, start_i, start_j, goal_i, goal_j, cost):
+        '''
+        Stores the reference cost (None if there is no path).
+        '''
+        self._connection.execute(
+            "INSERT OR REPLACE INTO reference_costs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self._map_key(grid_map), obstacles_hash(dyn_obst_traj), start_i, start_j, goal_i, goal_j,
+             int(cost is not None), cost))
+        self._connection.commit()
+
+
+    def reference_cost(self, grid_map, dyn_obst_traj, start_i, start_j, goal_i, goal_j, safe_map = None):
+        '''
+        Returns the optimal path length from the cache or computes it with sipp and stores it.
+        None if there is no path.
+
+        Parameters
+        ----------
+        safe_map : SafeMap
+            Already built SafeMap of grid_map and dyn_obst_traj (None -- build a new one on a cache miss)
+        '''
+        cached = self.get(grid_map, dyn_obst_traj, start_i, start_j, goal_i, goal_j)
+        if cached is not None:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        if safe_map is None:
+            safe_map = SafeMap(grid_map, dyn_obst_traj)
+        cost = None
+        if safe_map.traversable(start_i, start_j, 0):
+            result = sipp(safe_map, start_i, start_j, goal_i, goal_j, manhattan_distance, SearchTree, keep_lists=False)
+            if result[0]:
+                cost = float(make_path(result[1])[1])
+        self.put(grid_map, dyn_obst_traj, start_i, start_j, goal_i, goal_j, cost)
+        return cost
+
+
+    def close(self):
+        self._connection.close()
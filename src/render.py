@@ -0,0 +1,220 @@
+import struct
+import zlib
+
+import numpy as np
+
+
+FREE_COLOR = (255, 255, 255)
+STATIC_COLOR = (70, 80, 80)
+OBSTACLE_COLOR = (50, 50, 50)
+BORDER = 2
+
+
+def render_background(grid_map, k = 30):
+    '''
+    Rasterizes static obstacles once: every cell becomes a k x k block of pixels.
+
+    Returns
+    -------
+    np.ndarray
+        RGB image of shape (height * k, width * k, 3), dtype uint8
+    '''
+    return _cell_colors(grid_map).repeat(k, axis=0).repeat(k, axis=1)
+
+
+def _cell_colors(grid_map):
+    colors = np.array([FREE_COLOR, STATIC_COLOR], dtype=np.uint8)
+    return colors[grid_map.get_cells_array().astype(np.intp)]
+
+
+def _background_window(cell_colors, k, top, left, height, width):
+    # rasterizes only the cells under the window, so big maps are never rasterized as a whole
+    i0, j0 = top // k, left // k
+    i1, j1 = -(-(top + height) // k), -(-(left + width) // k)
+    window = cell_colors[i0:i1, j0:j1].repeat(k, axis=0).repeat(k, axis=1)
+    return window[top - i0 * k:top - i0 * k + height, left - j0 * k:left - j0 * k + width]
+
+
+def _ellipse_mask(size):
+    center = (size - 1) / 2
+    yy, xx = np.mgrid[:size, :size]
+    return (yy - center) ** 2 + (xx - center) ** 2 <= (size / 2) ** 2
+
+
+def _rounded_rectangle_mask(size, radius):
+    yy, xx = np.mgrid[:size, :size]
+    dy = np.maximum(np.maximum(radius - yy, yy - (size - 1 - radius)), 0)
+    dx = np.maximum(np.maximum(radius - xx, xx - (size - 1 - radius)), 0)
+    return dy ** 2 + dx ** 2 <= radius ** 2
+
+
+def _paste(frame, mask, color, top, left):
+    # draws the mask with its top left corner at (top, left), clipped by the frame
+    size = mask.shape[0]
+    y0, x0 = max(top, 0), max(left, 0)
+    y1, x1 = min(top + size, frame.shape[0]), min(left + size, frame.shape[1])
+    if y0 >= y1 or x0 >= x1:
+        return
+    frame[y0:y1, x0:x1][mask[y0 - top:y1 - top, x0 - left:x1 - left]] = color
+
+
+def iter_frames(grid_map, dyn_obst_traj, path, agent_color, k = 30, quality = 6, viewport = None):
+    '''
+    Yields frames of the animation one by one as RGB arrays: quality frames per step of the path,
+    positions of the agent and of the dynamic obstacles are interpolated between the steps.
+    The static background is rasterized once (only the window around the agent is rasterized, if viewport is set),
+    every frame is a copy of it with sprites composited by array ops.
+
+    Parameters
+    ----------
+    path : list[Node] or list[tuple[int, int]]
+        Positions of the agent at every timestep
+    viewport : int
+        If not None, frames are cropped to (2 * viewport + 1) x (2 * viewport + 1) cells around the agent
+    '''
+    cell_colors = _cell_colors(grid_map)
+    height, width = cell_colors.shape[0] * k, cell_colors.shape[1] * k
+    background = render_background(grid_map, k) if viewport is None else None
+    size = int(round(0.6 * k))
+    agent_mask = _ellipse_mask(size)
+    obstacle_mask = _rounded_rectangle_mask(size, int(round(0.2 * k)))
+    cells = [(node.i, node.j) if hasattr(node, "i") else tuple(node) for node in path]
+
+    def position(trajectory, step, n):
+        current = trajectory[min(len(trajectory) - 1, step)]
+        following = trajectory[min(len(trajectory) - 1, step + min(n, 1))]
+        return (current[0] + n * (following[0] - current[0]) / quality,
+                current[1] + n * (following[1] - current[1]) / quality)
+
+    for step in range(len(cells)):
+        for n in range(quality):
+            agent_i, agent_j = position(cells, step, n)
+            top, left = 0, 0
+            frame_height, frame_width = height, width
+            if viewport is not None:
+                frame_height = min(height, (2 * viewport + 1) * k)
+                frame_width = min(width, (2 * viewport + 1) * k)
+                top = min(max(int(round((agent_i - viewport) * k)), 0), height - frame_height)
+                left = min(max(int(round((agent_j - viewport) * k)), 0), width - frame_width)
+
+            frame = np.zeros((frame_height + 2 * BORDER, frame_width + 2 * BORDER, 3), dtype=np.uint8)
+            inner = frame[BORDER:BORDER + frame_height, BORDER:BORDER + frame_width]
+            if background is None:
+                inner[...] = _background_window(cell_colors, k, top, left, frame_height, frame_width)
+            else:
+                inner[...] = background
+
+            _paste(inner, agent_mask, agent_color,
+                   int(round((agent_i + 0.2) * k)) - top, int(round((agent_j + 0.2) * k)) - left)
+            for trajectory in dyn_obst_traj:
+                obstacle_i, obstacle_j = position(trajectory, step, n)
+                _paste(inner, obstacle_mask, OBSTACLE_COLOR,
+                       int(round((obstacle_i + 0.2) * k)) - top, int(round((obstacle_j + 0.2) * k)) - left)
+            yield frame
+
+
+
+class APNGWriter:
+    '''
+    Streaming writer of animated PNG: every frame is compressed and written to the file right away,
+    so only the previous frame is kept in memory. All frames must have the size of the first one.
+    The number of frames must be known in advance (it is stored in the header).
+
+    Only the bounding box of the pixels, which differ from the previous frame, is encoded
+    (frames usually differ only around the moving sprites).
+    '''
+
+    def __init__(self, path, width, height, frames_count, delay_ms = 100, loop = 0, compression = 6):
+        self._file = open(path, "wb")
+        self._width = width
+        self._height = height
+        self._frames_count = frames_count
+        self._delay = int(round(delay_ms))
+        self._compression = compression
+        self._sequence = 0
+        self._written = 0
+        self._previous = None
+
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        self._chunk(b"acTL", struct.pack(">II", frames_count, loop))
+
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack(">I", len(data)) + kind + data +
+                         struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+
+    def write(self, frame):
+        '''
+        Writes the next frame (RGB array of shape (height, width, 3), dtype uint8).
+        '''
+        if frame.shape != (self._height, self._width, 3):
+            raise Exception("Frame size", frame.shape[:2], "differs from", (self._height, self._width))
+        if self._written == self._frames_count:
+            raise Exception("All", self._frames_count, "frames are already written")
+
+        top, left, bottom, right = 0, 0, self._height, self._width
+        if self._previous is not None:
+            changed = frame.reshape(self._height, -1) != self._previous.reshape(self._height, -1)
+            rows = np.flatnonzero(changed.any(axis=1))
+            if len(rows) == 0:
+                # APNG frames can not be empty, so a single pixel is rewritten
+                rows = np.zeros(1, dtype=np.intp)
+                columns = rows
+            else:
+                columns = np.flatnonzero(changed[rows[0]:rows[-1] + 1].any(axis=0))
+            top, bottom = rows[0], rows[-1] + 1
+            left, right = columns[0] // 3, columns[-1] // 3 + 1
+        self._previous = frame.copy()
+        region = frame[top:bottom, left:right]
+
+        self._chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._sequence, right - left, bottom - top, left, top,
+                                         self._delay, 1000, 0, 0))
+        self._sequence += 1
+
+        # every scanline starts with the filter type byte (2 -- difference with the previous scanline),
+        # rows of a cell repeat each other, so filtered scanlines are mostly zeros and compress fast
+        region = region.reshape(bottom - top, -1)
+        scanlines = np.empty((bottom - top, 1 + region.shape[1]), dtype=np.uint8)
+        scanlines[:, 0] = 2
+        scanlines[0, 1:] = region[0]
+        np.subtract(region[1:], region[:-1], out=scanlines[1:, 1:])
+        data = zlib.compress(scanlines.tobytes(), self._compression)
+        if self._written == 0:
+            self._chunk(b"IDAT", data)
+        else:
+            self._chunk(b"fdAT", struct.pack(">I", self._sequence) + data)
+            self._sequence += 1
+        self._written += 1
+
+
+    def close(self):
+        if self._written != self._frames_count:
+            raise Exception("Only", self._written, "of", self._frames_count, "frames were written")
+        self._chunk(b"IEND", b"")
+        self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+
+def write_animation(path, frames, frames_count, delay_ms = 100):
+    '''
+    Streams frames (an iterable of RGB arrays of the same size) to an animated PNG file.
+    '''
+    frames = iter(frames)
+    first = next(frames)
+    with APNGWriter(path, first.shape[1], first.shape[0], frames_count, delay_ms) as writer:
+        writer.write(first)
+        for frame in frames:
+            writer.write(frame)
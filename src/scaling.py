@@ -0,0 +1,309 @@
+import argparse
+import json
+import math
+import os
+import sys
+import tracemalloc
+
+from collections import namedtuple
+
+import numpy as np
+
+from src.grid import Map
+from src.workload import random_walks
+from src.experiment import run_jobs
+from src.utils import LRUCache
+from src.benchmark import ALGORITHMS, run_job
+
+
+TOPOLOGIES = ("random", "room", "maze")
+
+Case = namedtuple("Case", ["size", "ratio", "topology", "count", "speed", "period", "horizon", "seed"])
+Case.__doc__ = '''
+Parameters of one synthetic workload:
+ - size, ratio, topology -- side of the square grid, ratio of blocked cells and its topology
+ - count, speed, period, horizon -- number of dynamic obstacles, their speed (cells per moment, <= 1),
+   period of their patrol cycle (in moves, even) and length of their trajectories (in moments)
+ - seed -- seed of the grid, of the obstacles and of the queries
+'''
+
+BASE_CASE = Case(size=64, ratio=0.2, topology="random", count=20, speed=1.0, period=8, horizon=200, seed=0)
+
+# values of every parameter in the default sweep
+AXES = {
+    "size": (64, 128, 256, 512, 1024, 2048, 4096),
+    "ratio": (0.0, 0.1, 0.2, 0.3, 0.4),
+    "topology": TOPOLOGIES,
+    "count": (0, 10, 20, 40, 80, 160),
+    "speed": (0.25, 0.5, 1.0),
+    "period": (4, 8, 16, 32, 64),
+    "horizon": (50, 100, 200, 400, 800),
+}
+
+
+def grid_id(case):
+    '''
+    Stable ID of the grid of the case, it depends only on the parameters of the grid.
+    '''
+    return "{}-{}-r{:g}-s{}".format(case.topology, case.size, case.ratio, case.seed)
+
+
+def obstacles_id(case):
+    '''
+    Stable ID of the dynamic obstacles of the case.
+    '''
+    return "n{}-v{:g}-p{}-h{}-s{}".format(case.count, case.speed, case.period, case.horizon, case.seed)
+
+
+def case_id(case):
+    return grid_id(case) + "/" + obstacles_id(case)
+
+
+def generate_grid(size, ratio, topology, seed):
+    '''
+    Generates a square grid of the given topology as a boolean array (True -- cell is blocked).
+
+     - random: every cell is blocked with probability ratio
+     - room: 16x16 rooms separated by walls with a door between every two adjacent rooms,
+       cells inside rooms are blocked with probability ratio
+     - maze: perfect maze with corridors of width 1 (binary tree algorithm), about a half of cells is blocked,
+       ratio is not used
+
+    All topologies are built by array operations, so grids up to 4096x4096 are generated in seconds.
+    '''
+    rng = np.random.default_rng([seed, 0])
+    if topology == "random":
+        return rng.random((size, size)) < ratio
+
+    if topology == "room":
+        room = 16
+        blocked = rng.random((size, size)) < ratio
+        walls = np.arange(room, size, room)
+        blocked[walls, :] = True
+        blocked[:, walls] = True
+        starts = np.arange(0, size, room)
+        for wall in walls:
+            # one door in the wall in front of every room
+            doors = np.minimum(starts + 1 + rng.integers(0, room - 1, size=len(starts)), size - 1)
+            doors = doors[~np.isin(doors, walls)]
+            blocked[wall, doors] = False
+            blocked[doors, wall] = False
+        return blocked
+
+    if topology == "maze":
+        blocked = np.ones((size, size), dtype=bool)
+        cells = (size - 1) // 2
+        blocked[1:2 * cells:2, 1:2 * cells:2] = False
+        # every cell is connected to its upper or to its right neighbour, which gives a spanning tree
+        up = rng.random((cells, cells)) < 0.5
+        up[0, :] = False
+        up[1:, -1] = True
+        rows, cols = np.nonzero(up)
+        blocked[2 * rows, 2 * cols + 1] = False
+        rows, cols = np.nonzero(~up)
+        right = cols < cells - 1
+        blocked[2 * rows[right] + 1, 2 * cols[right] + 2] = False
+        return blocked
+
+    raise Exception("Unknown topology: " + str(topology))
+
+
+def generate_obstacles(blocked, count, speed, period, horizon, seed):
+    '''
+    Generates count dynamic obstacles on traversable cells. Every obstacle patrols back and forth along
+    a random walk of period // 2 moves and waits round(1 / speed) moments in every cell,
+    its trajectory has horizon moments.
+
+    Returns
+    -------
+    list[list[tuple[int, int]]]
+        Trajectories in the format of SafeMap and CATable
+    '''
+    if period < 2 or period % 2:
+        raise Exception("Period must be even and positive, got " + str(period))
+    rng = np.random.default_rng([seed, 1])
+    length = period // 2 + 1
+    walks, _ = random_walks(rng, blocked, count, length, length)
+    cycle = np.concatenate([np.arange(length), np.arange(length - 2, 0, -1)])
+    cycle = np.repeat(cycle, max(1, round(1 / speed)))
+    timeline = np.tile(cycle, math.ceil(horizon / len(cycle)))[:horizon]
+    cells = walks[:, timeline]
+    return [list(zip(obstacle[:, 0].tolist(), obstacle[:, 1].tolist())) for obstacle in cells]
+
+
+def generate_queries(blocked, count, seed, dyn_obst_traj = ()):
+    '''
+    Generates count pairs of different traversable cells (start_i, start_j, goal_i, goal_j),
+    which are not occupied by dynamic obstacles at moment 0.
+    Queries may be unsolvable, if the grid is not connected.
+    '''
+    rng = np.random.default_rng([seed, 2])
+    blocked = blocked.copy()
+    for obstacle in dyn_obst_traj:
+        blocked[obstacle[0]] = True
+    free = np.argwhere(~blocked)
+    queries = []
+    for _ in range(count):
+        start, goal = rng.choice(len(free), size=2, replace=False)
+        queries.append(tuple(free[start].tolist() + free[goal].tolist()))
+    return queries
+
+
+def make_map(blocked):
+    '''
+    Returns Map of the boolean array of blocked cells.
+    '''
+    grid_map = Map()
+    grid_map.set_grid_cells(blocked.shape[1], blocked.shape[0], blocked.astype(int).tolist())
+    return grid_map
+
+
+def iter_cases(base = BASE_CASE, axes = AXES, seeds = (0,)):
+    '''
+    Yields (parameter, case): the sweep over every parameter from axes, other parameters are taken from base.
+    '''
+    for seed in seeds:
+        for parameter, values in axes.items():
+            for value in values:
+                yield parameter, base._replace(**{parameter: value, "seed": seed})
+
+
+# grids of the cases of one process
+_GRIDS = LRUCache(maxsize=2)
+
+
+def run_case(job):
+    '''
+    Runs one job (parameter, case, algorithm, w, queries, memory) and returns rows, one per query.
+    Memory is the peak of traced allocations during building of the search domain and the search,
+    it is measured in a separate run, because tracing slows down the search.
+    '''
+    parameter, case, algorithm, w, queries_count, memory = job
+    blocked = _GRIDS.get(grid_id(case), lambda: generate_grid(case.size, case.ratio, case.topology, case.seed))
+    grid_map = _GRIDS.get(("map", grid_id(case)), lambda: make_map(blocked))
+    task = generate_obstacles(blocked, case.count, case.speed, case.period, case.horizon, case.seed)
+
+    rows = []
+    for query_id, query in enumerate(generate_queries(blocked, queries_count, case.seed, task)):
+        row = {"case": case_id(case), "grid": grid_id(case), "obstacles": obstacles_id(case),
+               "parameter": parameter, "value": getattr(case, parameter), "query": query_id,
+               "algorithm": algorithm, "w": w}
+        row.update(case._asdict())
+        row.update(run_job(grid_map, algorithm, task, *query, w))
+        row["peak_memory"] = None
+        if memory:
+            tracemalloc.start()
+            run_job(grid_map, algorithm, task, *query, w)
+            row["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        rows.append(row)
+    return rows
+
+
+def run_suite(algorithms, weights = (2.0,), base = BASE_CASE, axes = AXES, seeds = (0,), queries = 5,
+              memory = True, workers = 1):
+    '''
+    Runs every algorithm on every case of iter_cases and yields rows (see run_case) in completion order.
+    '''
+    jobs = ((parameter, case, algorithm, w, queries, memory)
+            for parameter, case in iter_cases(base, axes, seeds)
+            for algorithm in algorithms
+            for w in (weights if ALGORITHMS[algorithm][2] else (1.0,)))
+    for rows in run_jobs(jobs, run_case, workers):
+        yield from rows
+
+
+def scaling_curves(rows, metric):
+    '''
+    Aggregates rows into scaling curves: the median of the metric over queries and seeds
+    for every value of every parameter.
+
+    Returns
+    -------
+    dict
+        parameter -> "algorithm (w)" -> list of (value, median), sorted by value
+    '''
+    values = dict()
+    for row in rows:
+        if row[metric] is None:
+            continue
+        name = row["algorithm"] + (" (w={:g})".format(row["w"]) if ALGORITHMS[row["algorithm"]][2] else "")
+        values.setdefault(row["parameter"], dict()).setdefault(name, dict()).setdefault(row["value"], []).append(row[metric])
+
+    curves = dict()
+    for parameter, algorithms in values.items():
+        curves[parameter] = dict()
+        for name, points in algorithms.items():
+            order = sorted(points, key=lambda value: TOPOLOGIES.index(value) if parameter == "topology" else value)
+            curves[parameter][name] = [(value, float(np.median(points[value]))) for value in order]
+    return curves
+
+
+def plot_curves(rows, directory, metrics = ("search_ns", "expansions", "peak_memory")):
+    '''
+    Saves a plot of scaling curves for every parameter and metric to directory/<parameter>-<metric>.png.
+    '''
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    os.makedirs(directory, exist_ok=True)
+    for metric in metrics:
+        for parameter, algorithms in scaling_curves(rows, metric).items():
+            fig, ax = plt.subplots(figsize=(6, 4))
+            for name, points in algorithms.items():
+                ax.plot([str(value) for value, _ in points] if parameter == "topology" else [value for value, _ in points],
+                        [median for _, median in points], marker="o", label=name)
+            if parameter != "topology":
+                ax.set_xscale("log" if parameter in ("size", "count", "period", "horizon") and
+                              min(value for points in algorithms.values() for value, _ in points) > 0 else "linear")
+            ax.set_yscale("log")
+            ax.set_xlabel(parameter)
+            ax.set_ylabel(metric)
+            ax.legend()
+            fig.tight_layout()
+            fig.savefig(os.path.join(directory, parameter + "-" + metric + ".png"))
+            plt.close(fig)
+
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(prog="python -m src.scaling",
+                                     description="Scaling of the planners on synthetic grids and dynamic obstacles.")
+    parser.add_argument("--algorithms", nargs="+", default=sorted(ALGORITHMS), choices=sorted(ALGORITHMS))
+    parser.add_argument("--weights", nargs="+", type=float, default=[2.0], help="weights of wsipp_*")
+    parser.add_argument("--axes", nargs="+", default=list(AXES), choices=list(AXES), help="swept parameters")
+    for name, values in AXES.items():
+        kind = str if name == "topology" else type(getattr(BASE_CASE, name))
+        parser.add_argument("--" + name + "s", dest=name + "s", nargs="+", type=kind, default=list(values),
+                            help="values of " + name + " in the sweep")
+        parser.add_argument("--base-" + name, dest="base_" + name, type=kind, default=getattr(BASE_CASE, name),
+                            help="value of " + name + " when other parameters are swept")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--queries", type=int, default=5, help="number of queries per case")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="do not measure peak memory")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--output", default="-", help="output JSON lines file (default: stdout)")
+    parser.add_argument("--plots", default=None, help="directory for plots of scaling curves")
+    return parser.parse_args(argv)
+
+
+def main(argv = None):
+    args = parse_args(argv)
+    base = Case(**{name: getattr(args, "base_" + name) for name in AXES}, seed=0)
+    axes = {name: tuple(getattr(args, name + "s")) for name in args.axes}
+
+    rows = []
+    stream = sys.stdout if args.output == "-" else open(args.output, "w")
+    for row in run_suite(args.algorithms, args.weights, base, axes, args.seeds, args.queries, args.memory, args.workers):
+        rows.append(row)
+        stream.write(json.dumps(row) + "\n")
+        stream.flush()
+    if stream is not sys.stdout:
+        stream.close()
+
+    if args.plots is not None:
+        plot_curves(rows, args.plots, ("search_ns", "expansions", "peak_memory") if args.memory else ("search_ns", "expansions"))
+
+
+if __name__ == "__main__":
+    main()
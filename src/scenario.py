@@ -0,0 +1,81 @@
+import itertools
+
+from collections import namedtuple
+
+import numpy as np
+
+
+Scenario = namedtuple("Scenario", ["start_i", "start_j", "goal_i", "goal_j",
+                                   "bucket", "map", "width", "height", "optimal_length", "index"])
+Scenario.__doc__ = '''
+One query of a scenario file. The first four fields are (start_i, start_j, goal_i, goal_j),
+so a Scenario can be used wherever the planners expect an agent task.
+Fields, which are absent in the legacy format (map, width, height, optimal_length), are None.
+'''
+
+
+def _parse_line(line, moving_ai):
+    values = line.split()
+    if moving_ai:
+        # bucket, map, width, height, start_x, start_y, goal_x, goal_y, optimal_length
+        return (int(values[5]), int(values[4]), int(values[7]), int(values[6]),
+                int(values[0]), values[1], int(values[2]), int(values[3]), float(values[8]))
+    # legacy format of the bundled scens: start_i start_j goal_i goal_j
+    start_i, start_j, goal_i, goal_j = (int(v) for v in values[:4])
+    return start_i, start_j, goal_i, goal_j, 0, None, None, None, None
+
+
+def iter_scenarios(path, buckets = None, start = None, stop = None, sample = None, seed = None, grid_map = None):
+    '''
+    Lazily reads scenarios from the file, one line at a time.
+
+    Both the standard MovingAI format ("version 1" header, then
+    bucket, map, width, height, start x, start y, goal x, goal y, optimal length)
+    and the legacy format of the bundled scens (start_i start_j goal_i goal_j) are supported.
+    MovingAI x is a column and y is a row, so start_i = start y and start_j = start x.
+
+    Parameters
+    ----------
+    path : str
+        Path to the .scen file
+    buckets : iterable of int
+        Keep only scenarios from these buckets (None -- all buckets)
+    start, stop : int
+        Keep only scenarios with index in range [start, stop) (index is the number of the scenario in the file)
+    sample : float
+        Keep every scenario with this probability (None -- keep all)
+    seed : int
+        Seed of the sampling
+    grid_map : Map
+        Skip scenarios with start or goal outside of the map or in blocked cells
+        (e.g. because the map was cropped while reading)
+
+    Yields
+    ------
+    Scenario
+    '''
+    buckets = None if buckets is None else set(buckets)
+    rng = np.random.default_rng(seed) if sample is not None else None
+
+    with open(path) as scen_file:
+        lines = (line for line in scen_file if line.strip())
+        first = next(lines, None)
+        if first is None:
+            return
+        moving_ai = first.split()[0] == "version"
+        if not moving_ai:
+            lines = itertools.chain([first], lines)
+
+        for index, line in enumerate(itertools.islice(lines, 0, stop)):
+            if start is not None and index < start:
+                continue
+            scenario = Scenario(*_parse_line(line, moving_ai), index)
+            if buckets is not None and not scenario.bucket in buckets:
+                continue
+            if rng is not None and rng.random() >= sample:
+                continue
+            if grid_map is not None and not all(
+                    grid_map.in_bounds(i, j) and grid_map.traversable(i, j)
+                    for (i, j) in ((scenario.start_i, scenario.start_j), (scenario.goal_i, scenario.goal_j))):
+                continue
+            yield scenario
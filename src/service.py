@@ -0,0 +1,384 @@
+import asyncio
+import json
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.utils import LRUCache
+from src.grid import SafeMap
+from src.plancache import PLANNERS
+
+
+# SafeMaps built by the worker process, keyed by (map id, version)
+_SAFE_MAPS = LRUCache(maxsize=4)
+
+
+class _MapMissing(Exception):
+    pass
+
+
+def plan_batch(map_key, queries, map_data = None):
+    '''
+    Runs a batch of queries on one SafeMap. It is built once per worker process and map version: the map
+    is not sent with every batch, map_data (grid_map, dyn_obst_traj) is sent only after the worker reported,
+    that it has no SafeMap of map_key.
+    Queries are (algorithm, start_i, start_j, goal_i, goal_j, w, deadline), deadline is time.time() based:
+    queries, whose deadline has passed before their turn, are not searched.
+
+    Returns
+    -------
+    list[dict] or None
+        Result of every query: status ("ok", "not_found", "timeout" or "error"), waypoints
+        ([i, j, arrival, departure] of the CompactPath), length and search time in seconds.
+        None if the worker has no SafeMap of map_key and map_data is None
+    '''
+    def build():
+        if map_data is None:
+            raise _MapMissing()
+        return SafeMap(*map_data)
+
+    try:
+        safe_map = _SAFE_MAPS.get(map_key, build)
+    except _MapMissing:
+        return None
+    results = []
+    for algorithm, start_i, start_j, goal_i, goal_j, w, deadline in queries:
+        if deadline is not None and time.time() > deadline:
+            results.append({"status": "timeout"})
+            continue
+        start_time = time.perf_counter()
+        try:
+            found, path = PLANNERS[algorithm](safe_map, start_i, start_j, goal_i, goal_j, w)[:2]
+        except Exception as error:
+            results.append({"status": "error", "error": str(error)})
+            continue
+        result = {"status": "ok" if found else "not_found", "search_s": time.perf_counter() - start_time}
+        if found:
+            result["length"] = path.length
+            result["waypoints"] = path.waypoints().tolist()
+        results.append(result)
+    return results
+
+
+
+class _Request:
+
+    def __init__(self, map_id, query, deadline, future):
+        self.map_id = map_id
+        self.query = query
+        self.deadline = deadline
+        self.future = future
+        self.created = time.perf_counter()
+
+
+
+class PlanningService:
+    '''
+    Asynchronous planning service: callers await plans instead of blocking in the planners.
+
+    Requests (in-process by plan() or over a localhost socket by serve()) are put to one queue.
+    The dispatcher coalesces queued requests against the same map into batches (up to max_batch requests,
+    waiting up to batch_window seconds for more of them) and runs every batch by plan_batch on a process pool.
+    Batches carry only the map id and version: the map is shipped to a worker only when the worker misses it,
+    and its SafeMap is built once per worker and map version.
+    Every request has a deadline (timeout seconds after it was accepted): expired requests are answered
+    with the "timeout" status without waiting for the search.
+
+    Use it as an async context manager, metrics() returns the queue depth and latency percentiles.
+    '''
+
+    def __init__(self, workers = 2, max_batch = 16, batch_window = 0.002, default_timeout = 10.0, latency_window = 10000):
+        self._workers = workers
+        self._max_batch = max_batch
+        self._batch_window = batch_window
+        self._default_timeout = default_timeout
+        self._maps = dict()         # map id -> (version, grid_map, dyn_obst_traj)
+        self._queue = None
+        self._pool = None
+        self._dispatcher = None
+        self._batches = set()
+        self._latencies = deque(maxlen=latency_window)
+        self._counters = {"requests": 0, "ok": 0, "not_found": 0, "timeout": 0, "error": 0, "batches": 0, "batched": 0,
+                          "map_loads": 0}
+        self._in_flight = 0
+
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._pool = ProcessPoolExecutor(max_workers=self._workers)
+        self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        return self
+
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, *self._batches, return_exceptions=True)
+            self._dispatcher = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+    async def __aenter__(self):
+        return await self.start()
+
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+    def register_map(self, map_id, grid_map, dyn_obst_traj):
+        '''
+        Registers (or replaces) the map with dynamic obstacles, which requests refer to by map_id.
+        Requests accepted after the call are planned on the new version.
+        '''
+        version = self._maps[map_id][0] + 1 if map_id in self._maps else 0
+        self._maps[map_id] = (version, grid_map, [list(map(tuple, trajectory)) for trajectory in dyn_obst_traj])
+
+
+    async def plan(self, map_id, algorithm, start_i, start_j, goal_i, goal_j, w = 1.0, timeout = None):
+        '''
+        Plans a path on the registered map and returns the result dict of plan_batch
+        (with the status "timeout", if the deadline passed) extended by latency_s.
+        '''
+        if not map_id in self._maps:
+            raise Exception("Unknown map:", map_id)
+        if not algorithm in PLANNERS:
+            raise Exception("Unknown algorithm:", algorithm)
+        timeout = self._default_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        request = _Request(map_id, (algorithm, int(start_i), int(start_j), int(goal_i), int(goal_j), float(w)),
+                           time.time() + timeout, loop.create_future())
+        self._counters["requests"] += 1
+        self._in_flight += 1
+        self._queue.put_nowait(request)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(request.future), timeout)
+        except asyncio.TimeoutError:
+            result = {"status": "timeout"}
+        finally:
+            self._in_flight -= 1
+        result = dict(result, latency_s=time.perf_counter() - request.created)
+        self._counters[result["status"]] += 1
+        self._latencies.append(result["latency_s"])
+        return result
+
+
+    def metrics(self):
+        '''
+        Returns queue depth (requests waiting for a batch), requests in flight (accepted, not answered),
+        counters of requests by status and of batches, and latency percentiles (in milliseconds)
+        over the last latency_window answered requests.
+        '''
+        latencies = np.array(self._latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else [None] * 3
+        return dict(self._counters,
+                    queue_depth=self._queue.qsize() if self._queue is not None else 0,
+                    in_flight=self._in_flight,
+                    mean_batch=self._counters["batched"] / self._counters["batches"] if self._counters["batches"] else 0.0,
+                    p50_ms=percentiles[0], p90_ms=percentiles[1], p99_ms=percentiles[2])
+
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self._queue.get()]
+            # coalesce requests, which arrive within the batch window
+            until = loop.time() + self._batch_window
+            while True:
+                remaining = until - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    requests.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            by_map = dict()
+            for request in requests:
+                if request.future.done():
+                    continue
+                if time.time() > request.deadline:
+                    request.future.set_result({"status": "timeout"})
+                    continue
+                by_map.setdefault(request.map_id, []).append(request)
+            for map_id, map_requests in by_map.items():
+                for start in range(0, len(map_requests), self._max_batch):
+                    batch = loop.create_task(self._run_batch(map_id, map_requests[start:start + self._max_batch]))
+                    self._batches.add(batch)
+                    batch.add_done_callback(self._batches.discard)
+
+
+    async def _run_batch(self, map_id, requests):
+        version, grid_map, dyn_obst_traj = self._maps[map_id]
+        queries = [request.query + (request.deadline,) for request in requests]
+        self._counters["batches"] += 1
+        self._counters["batched"] += len(requests)
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._pool, plan_batch, (map_id, version), queries)
+            if results is None:
+                # the worker has not built this version of the map yet
+                self._counters["map_loads"] += 1
+                results = await loop.run_in_executor(self._pool, plan_batch, (map_id, version), queries,
+                                                     (grid_map, dyn_obst_traj))
+        except Exception as error:
+            results = [{"status": "error", "error": str(error)}] * len(requests)
+        for request, result in zip(requests, results):
+            if not request.future.done():
+                request.future.set_result(result)
+
+
+    async def serve(self, host = "127.0.0.1", port = 0):
+        '''
+        Starts a server of JSON lines on the local socket and returns the asyncio server
+        (server.sockets[0].getsockname() is the address, if port = 0).
+
+        Request: {"id": ..., "map": map_id, "algorithm": "sipp", "start": [i, j], "goal": [i, j], "w": 1.0, "timeout": 1.0}
+        or {"id": ..., "op": "metrics"}. Responses are written in completion order with the id of the request,
+        a line, which is not a JSON object, is answered by an error with the id null.
+        '''
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+
+    async def _handle_connection(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(response):
+            async with lock:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+
+        async def respond(message):
+            try:
+                if message.get("op") == "metrics":
+                    response = self.metrics()
+                else:
+                    response = await self.plan(message["map"], message.get("algorithm", "sipp"), *message["start"],
+                                               *message["goal"], message.get("w", 1.0), message.get("timeout"))
+            except Exception as error:
+                response = {"status": "error", "error": str(error)}
+            response["id"] = message.get("id")
+            await send(response)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("Request must be a JSON object")
+                except ValueError as error:
+                    # a malformed line is answered (without id), the connection stays open
+                    await send({"status": "error", "error": "Bad request: " + str(error), "id": None})
+                    continue
+                task = asyncio.get_running_loop().create_task(respond(message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+
+
+class PlanningClient:
+    '''
+    Client of PlanningService.serve: many requests can be awaited concurrently over one connection.
+    '''
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._pending = dict()
+        self._next_id = 0
+        self._receiver = asyncio.get_running_loop().create_task(self._receive())
+
+
+    @classmethod
+    async def connect(cls, host = "127.0.0.1", port = 8765):
+        return cls(*await asyncio.open_connection(host, port))
+
+
+    async def request(self, message):
+        request_id = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write((json.dumps(dict(message, id=request_id)) + "\n").encode())
+        await self._writer.drain()
+        return await future
+
+
+    async def plan(self, map_id, algorithm, start_i, start_j, goal_i, goal_j, w = 1.0, timeout = None):
+        message = {"map": map_id, "algorithm": algorithm, "start": [start_i, start_j], "goal": [goal_i, goal_j], "w": w}
+        if timeout is not None:
+            message["timeout"] = timeout
+        return await self.request(message)
+
+
+    async def metrics(self):
+        return await self.request({"op": "metrics"})
+
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receiver.cancel()
+        await asyncio.gather(self._receiver, return_exceptions=True)
+
+
+    async def _receive(self):
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self._pending.pop(response.pop("id"), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Connection closed"))
+
+
+
+async def _serve_forever(args):
+    from src.benchmark import map_path
+    from src.grid import Map
+    from src.workload import generate_tasks
+
+    grid_map = Map()
+    grid_map.read_from_file(map_path(args.map))
+    async with PlanningService(args.workers, args.max_batch, args.batch_window) as service:
+        service.register_map(args.map, grid_map, generate_tasks(grid_map, args.task + 1, args.seed)[args.task])
+        server = await service.serve(args.host, args.port)
+        print("Serving map", args.map, "on", *server.sockets[0].getsockname()[:2], flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m src.service",
+                                     description="Planning service on a local socket (JSON lines).")
+    parser.add_argument("--map", required=True, help="name of a bundled map or path to a .map file, it is also the map id")
+    parser.add_argument("--seed", type=int, default=100, help="seed of the generated dynamic obstacles")
+    parser.add_argument("--task", type=int, default=3, help="number of the generated task")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--batch-window", type=float, default=0.002, help="seconds to wait for more requests of a batch")
+    asyncio.run(_serve_forever(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
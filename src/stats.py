@@ -0,0 +1,172 @@
+import time
+
+from src.utils import with_mixin
+
+
+class SearchStats:
+    '''
+    Opt-in instrumentation of a search: pass an instance as stats to sipp, wsipp_r, wsipp_d or astar_timesteps.
+    Counters are accumulated over all searches, which used the object.
+
+    Counters
+    --------
+     - expansions -- nodes added to CLOSED
+     - generated -- created successors
+     - pruned -- successors, which were not added to OPEN (their state is already expanded)
+     - duplicates -- successors added to OPEN, whose state had already been added to OPEN before
+     - pushes, pops -- operations with OPEN
+     - stale_pops -- popped nodes, which were skipped, because their state had been expanded
+     - reexpansions -- nodes, which were reopened for re-expansion (size of REEXPANDED of wsipp_r)
+     - interval_lookups -- calls of get_interval of SafeMap (including the calls from get_neighbors)
+     - collision_checks -- moves checked by the CATable of astar_timesteps
+
+    Timers (if timers = True), in nanoseconds
+    ------
+     - search -- whole search
+     - neighbors -- get_neighbors of SafeMap / check_moves of CATable
+     - open -- add_to_open and get_best_node_from_open
+     - closed -- add_to_closed and was_expanded
+     - other -- the rest (node allocation, heuristic, loop)
+
+    Instrumentation is added only to the search of record: the planner runs on a tracked copy of the domain
+    and of the search tree (see with_mixin), so planners called without stats do not pay for it,
+    and the domain can be searched concurrently without stats.
+    '''
+
+    COUNTERS = ("expansions", "generated", "pruned", "duplicates", "pushes", "pops", "stale_pops",
+                "reexpansions", "interval_lookups", "collision_checks")
+    TIMERS = ("search", "neighbors", "open", "closed", "other")
+
+    def __init__(self, timers = False):
+        self.timers = timers
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.times = {name: 0 for name in self.TIMERS}
+
+
+    def as_dict(self):
+        '''
+        Returns counters (and timers with the "_ns" suffix, if they are enabled) as a flat dict.
+        '''
+        result = {name: getattr(self, name) for name in self.COUNTERS}
+        if self.timers:
+            result.update({name + "_ns": value for name, value in self.times.items()})
+        return result
+
+
+    def record(self, run, domain, search_tree):
+        '''
+        Runs run(tracked_domain, tracked_search_tree) and returns its result. The tracked domain is a copy
+        of domain (SafeMap or CATable), the tracked search tree is a copy of the tree created by search_tree
+        (see with_mixin): their hot methods update the counters and call the methods of the original classes.
+        '''
+        if hasattr(domain, "get_interval"):
+            domain = with_mixin(domain, _TrackedSafeMap, _stats=self)
+        elif hasattr(domain, "check_moves"):
+            domain = with_mixin(domain, _TrackedCATable, _stats=self)
+
+        def create():
+            return with_mixin(search_tree(), _TrackedSearchTree, _stats=self, _pushed=set())
+
+        start_time = time.perf_counter_ns()
+        result = run(domain, create)
+        elapsed = time.perf_counter_ns() - start_time
+        # the start node is not a generated successor (queries rejected without the search create no nodes)
+        self.generated += max(result[3] - 1, 0)
+        if self.timers:
+            self.times["search"] += elapsed
+            self.times["other"] = self.times["search"] - self.times["neighbors"] - self.times["open"] - self.times["closed"]
+        return result
+
+
+
+def _timed(phase):
+    # adds the time of the method to the timer of the phase (if timers of SearchStats are enabled)
+    def decorate(method):
+        def timed(self, *args):
+            stats = self._stats
+            if not stats.timers:
+                return method(self, *args)
+            start_time = time.perf_counter_ns()
+            result = method(self, *args)
+            stats.times[phase] += time.perf_counter_ns() - start_time
+            return result
+        return timed
+    return decorate
+
+
+
+class _TrackedSafeMap:
+    '''
+    SearchStats hooks of SafeMap (see with_mixin).
+    '''
+
+    def get_interval(self, i, j, t):
+        self._stats.interval_lookups += 1
+        return super().get_interval(i, j, t)
+
+
+    @_timed("neighbors")
+    def get_neighbors(self, i, j, t):
+        return super().get_neighbors(i, j, t)
+
+
+
+class _TrackedCATable:
+    '''
+    SearchStats hooks of CATable (see with_mixin).
+    '''
+
+    @_timed("neighbors")
+    def check_moves(self, i, j, t_start, cells):
+        self._stats.collision_checks += len(cells)
+        return super().check_moves(i, j, t_start, cells)
+
+
+
+class _TrackedSearchTree:
+    '''
+    SearchStats hooks of a search tree (see with_mixin).
+    '''
+
+    @_timed("open")
+    def add_to_open(self, item):
+        stats = self._stats
+        size = self._open_size
+        reexpanded = getattr(self, "_reexpanded", None)
+        reopened = len(reexpanded) if reexpanded is not None else 0
+        super().add_to_open(item)
+        if self._open_size > size:
+            stats.pushes += 1
+            if item in self._pushed:
+                stats.duplicates += 1
+            self._pushed.add(item)
+        else:
+            stats.pruned += 1
+        if reexpanded is not None:
+            stats.reexpansions += len(reexpanded) - reopened
+
+
+    @_timed("open")
+    def get_best_node_from_open(self):
+        stats = self._stats
+        size = self._open_size
+        best = super().get_best_node_from_open()
+        popped = size - self._open_size
+        stats.pops += popped
+        stats.stale_pops += popped - (best is not None)
+        return best
+
+
+    @_timed("closed")
+    def add_to_closed(self, item):
+        self._stats.expansions += 1
+        super().add_to_closed(item)
+
+
+    @_timed("closed")
+    def was_expanded(self, item):
+        expanded = super().was_expanded(item)
+        if expanded:
+            self._stats.pruned += 1
+        return expanded
@@ -0,0 +1,192 @@
+import abc
+
+import numpy as np
+
+from src.utils import with_mixin
+
+
+# events of the trace
+GENERATE = 0  # successor was added to OPEN
+EXPAND = 1    # node was expanded (added to CLOSED)
+PRUNE = 2     # successor was dropped, because its state had been expanded
+
+TRACE_DTYPE = np.dtype([("step", np.int32), ("i", np.int32), ("j", np.int32), ("interval", np.int32),
+                        ("g", np.float32), ("f", np.float32), ("event", np.uint8)])
+
+
+class _TraceSink(abc.ABC):
+    '''
+    Base class of trace sinks. Records are collected as tuples and converted to TRACE_DTYPE
+    in chunks of chunk_size records, so tracing a search costs about one list append per event.
+
+    The interval field is the number of the safe interval for SIPP-based planners
+    and the (folded) time of the state for astar_timesteps.
+    '''
+
+    def __init__(self, chunk_size = 4096):
+        self._chunk_size = chunk_size
+        self._pending = []
+        self._step = 0
+
+
+    def record(self, run, search_tree):
+        '''
+        Runs run(tracked_search_tree) and records events of the tracked search tree.
+        Steps are counted from 0 in every search.
+        '''
+        self._step = 0
+        try:
+            return run(self._tracked_tree(search_tree))
+        finally:
+            self.flush()
+
+
+    def flush(self):
+        if self._pending:
+            self._write_chunk(np.array(self._pending, dtype=TRACE_DTYPE))
+            self._pending = []
+
+
+    @abc.abstractmethod
+    def _write_chunk(self, chunk):
+        '''
+        Stores a chunk of records (an array of TRACE_DTYPE).
+        '''
+
+
+    def _add(self, node, event):
+        self._pending.append((self._step, node.i, node.j, getattr(node, "interval", getattr(node, "t", -1)),
+                              node.g, node.f, event))
+        if len(self._pending) >= self._chunk_size:
+            self.flush()
+
+
+    def _tracked_tree(self, search_tree):
+        def create():
+            return with_mixin(search_tree(), _TracedSearchTree, _sink=self)
+        return create
+
+
+
+class _TracedSearchTree:
+    '''
+    Hooks of a search tree, which add its events to the trace sink (see with_mixin).
+    '''
+
+    def add_to_open(self, item):
+        size = self._open_size
+        super().add_to_open(item)
+        self._sink._add(item, GENERATE if self._open_size > size else PRUNE)
+
+
+    def add_to_closed(self, item):
+        sink = self._sink
+        sink._add(item, EXPAND)
+        sink._step += 1
+        super().add_to_closed(item)
+
+
+    def was_expanded(self, item):
+        expanded = super().was_expanded(item)
+        if expanded:
+            self._sink._add(item, PRUNE)
+        return expanded
+
+
+
+class TraceBuffer(_TraceSink):
+    '''
+    Trace sink, which keeps records in a preallocated NumPy array (it is doubled when it is full).
+    '''
+
+    def __init__(self, capacity = 1 << 16, chunk_size = 4096):
+        super().__init__(chunk_size)
+        self._buffer = np.empty(capacity, dtype=TRACE_DTYPE)
+        self._size = 0
+
+
+    def _write_chunk(self, chunk):
+        if self._size + len(chunk) > len(self._buffer):
+            grown = np.empty(max(2 * len(self._buffer), self._size + len(chunk)), dtype=TRACE_DTYPE)
+            grown[:self._size] = self._buffer[:self._size]
+            self._buffer = grown
+        self._buffer[self._size:self._size + len(chunk)] = chunk
+        self._size += len(chunk)
+
+
+    @property
+    def records(self):
+        '''
+        Recorded events as an array of TRACE_DTYPE (a view of the buffer)
+        '''
+        self.flush()
+        return self._buffer[:self._size]
+
+
+    def clear(self):
+        self._pending = []
+        self._size = 0
+
+
+
+class TraceFile(_TraceSink):
+    '''
+    Trace sink, which appends raw TRACE_DTYPE records to a binary file (read it with read_trace).
+    '''
+
+    def __init__(self, path, chunk_size = 4096):
+        super().__init__(chunk_size)
+        self._file = open(path, "ab")
+
+
+    def _write_chunk(self, chunk):
+        chunk.tofile(self._file)
+
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+
+def read_trace(path):
+    '''
+    Returns records of the trace file as a read-only memory-mapped array of TRACE_DTYPE.
+    '''
+    return np.memmap(path, dtype=TRACE_DTYPE, mode="r")
+
+
+def expansion_heatmap(records, height, width, event = EXPAND):
+    '''
+    Returns the number of events (expansions by default) in every cell as an array of shape (height, width).
+    '''
+    selected = records[records["event"] == event]
+    cells = selected["i"].astype(np.int64) * width + selected["j"]
+    return np.bincount(cells, minlength=height * width).reshape(height, width)
+
+
+def draw_heatmap(heatmap, grid_map = None, output_filename = None):
+    '''
+    Draws the heatmap (static obstacles of grid_map in grey) and saves it to output_filename or shows it.
+    '''
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(6, 6))
+    image = ax.imshow(np.ma.masked_equal(heatmap, 0), cmap="hot_r", interpolation="nearest")
+    if grid_map is not None:
+        ax.imshow(np.ma.masked_equal(grid_map.get_cells_array(), False), cmap="Greys", vmin=0, vmax=2,
+                  interpolation="nearest")
+    fig.colorbar(image, ax=ax, label="events")
+    if output_filename is None:
+        plt.show()
+    else:
+        fig.savefig(output_filename)
+    plt.close(fig)
@@ -1,15 +1,5 @@
-import copy
-import math
-import matplotlib.pyplot as plt
-import numpy as np
-import time
-
-from heapq import heappop, heappush, heapify
+from collections import OrderedDict
 from random import randint
-from IPython.display import HTML
-from PIL import Image, ImageDraw, ImageOps
-from IPython.display import Image as Img
-from IPython.display import display
 from sys import float_info
 
 EPS = float_info.epsilon
@@ -19,6 +9,7 @@ def make_path(goal):
     '''
     Creates a path by tracing parent pointers from the goal node to the start node
     It also returns path's length.
+    Waits at the start cell are not included (see compact_path in src/path.py for a compact path with all waits).
     '''
     length = goal.g
     g = goal.g
@@ -33,67 +24,88 @@ def make_path(goal):
     return path[::-1], length
     
 
-def draw(grid_map, dyn_obst_traj, path, output_filename = 'animated_trajectories'):
+def draw(grid_map, dyn_obst_traj, path, output_filename = 'animated_trajectories', k = 30, quality = 6,
+         viewport = None, show = True):
     '''
     Auxiliary function that visualizes the environment.
-    
-    The function assumes that nodes_opened/nodes_expanded
-    are iterable collestions of search nodes
+
+    The static background is rasterized once, frames are composited with NumPy
+    and streamed to the animated PNG one by one (see src/render.py).
+
+    Parameters
+    ----------
+    k : int
+        Size of a cell in pixels
+    quality : int
+        Number of frames per step of the path
+    viewport : int
+        If not None, frames are cropped to (2 * viewport + 1) x (2 * viewport + 1) cells around the agent
+    show : bool
+        Whether to display the animation in the notebook
     '''
-    
-    k = 30
-    quality = 6
-    height, width = grid_map.get_size()
-    h_im = height * k
-    w_im = width * k
-    pathlen = len(path)
-    
-    step = 0
-    images = []
+    from src.render import iter_frames, write_animation
+
     agent_color = randint(0, 255), randint(0, 255), randint(0, 255)
-              
-    while step < pathlen:
-        for n in range(0, quality):
-            im = Image.new('RGB', (w_im, h_im), color = 'white')
-            draw = ImageDraw.Draw(im)
-            
-            # draw static obstacles
-            for i in range(height):
-                for j in range(width):
-                    if(not grid_map.traversable(i, j)):
-                        draw.rectangle((j * k, i * k, (j + 1) * k - 1, (i + 1) * k - 1), fill=( 70, 80, 80 ))
-                   
-            
-            #draw agent
-            curr_node = path[step]
-            next_node = path[min(pathlen - 1, step + min(n, 1))]
-
-            di = n * (next_node.i - curr_node.i) / quality
-            dj = n * (next_node.j - curr_node.j) / quality
-
-            draw.ellipse((float(curr_node.j + dj + 0.2) * k, 
-                          float(curr_node.i + di + 0.2) * k, 
-                          float(curr_node.j + dj + 0.8) * k - 1, 
-                          float(curr_node.i + di + 0.8) * k - 1), 
-                          fill=agent_color, width=0)
-            
-            # draw dynamic obstacles 
-            for i in range(len(dyn_obst_traj)):
-                curr_pos = dyn_obst_traj[i][min(len(dyn_obst_traj[i]) - 1, step)]
-                next_pos = dyn_obst_traj[i][min(len(dyn_obst_traj[i]) - 1, step + min(n, 1))]
-                
-                di = n * (next_pos[0] - curr_pos[0]) / quality
-                dj = n * (next_pos[1] - curr_pos[1]) / quality
-            
-                draw.rounded_rectangle((float(curr_pos[1] + dj + 0.2) * k, 
-                              float(curr_pos[0] + di + 0.2) * k, 
-                              float(curr_pos[1] + dj + 0.8) * k - 1, 
-                              float(curr_pos[0] + di + 0.8) * k - 1), 
-                              fill=(50, 50, 50), width=0, radius=k * 0.2)
-            im = ImageOps.expand(im, border=2, fill='black')
-            images.append(im)
-        step += 1
-    images[0].save('./'+output_filename+'.png', save_all=True, append_images=images[1:], optimize=False, duration=500/quality, loop=0)
-    display(Img(filename = './'+output_filename+'.png'))
-    
-    
+    frames = iter_frames(grid_map, dyn_obst_traj, path, agent_color, k, quality, viewport)
+    write_animation('./'+output_filename+'.png', frames, len(path) * quality, delay_ms=500/quality)
+
+    if show:
+        # IPython is imported only when it is needed, so that the planning core
+        # can be imported without visualization dependencies (e.g. on a headless server)
+        from IPython.display import Image as Img
+        from IPython.display import display
+        display(Img(filename = './'+output_filename+'.png'))
+
+
+_MIXED_CLASSES = dict()
+
+
+def mixin_class(mixin, cls):
+    '''
+    Returns the subclass of cls, whose methods are overridden by the methods of mixin (they call the methods of cls
+    by super()). The subclass is created once for every pair. Instrumentation (SearchStats, trace sinks, PlanCache)
+    hooks into search trees and domains this way instead of patching their instances.
+    '''
+    key = (mixin, cls)
+    mixed = _MIXED_CLASSES.get(key)
+    if mixed is None:
+        mixed = type(mixin.__name__.lstrip("_") + cls.__name__, (mixin, cls), {})
+        _MIXED_CLASSES[key] = mixed
+    return mixed
+
+
+def with_mixin(obj, mixin, **attributes):
+    '''
+    Returns a shallow copy of obj of the class mixin_class(mixin, type(obj)) with extra attributes.
+    The copy shares all data with obj (e.g. safe intervals of a SafeMap), obj itself is not changed.
+    '''
+    mixed = object.__new__(mixin_class(mixin, type(obj)))
+    mixed.__dict__.update(obj.__dict__)
+    mixed.__dict__.update(attributes)
+    return mixed
+
+
+
+class LRUCache:
+    '''
+    Small per-process cache of expensive objects (maps, generated tasks, SafeMaps, dead end masks of a Map).
+    Every worker process has its own instance, so objects are reused between the jobs of the worker.
+    '''
+
+    def __init__(self, maxsize = 8):
+        self._maxsize = maxsize
+        self._items = OrderedDict()
+
+
+    def get(self, key, factory):
+        '''
+        Returns the cached object for the key, creating it with factory() if it is absent.
+        '''
+        if key in self._items:
+            self._items.move_to_end(key)
+            return self._items[key]
+        value = factory()
+        self._items[key] = value
+        if len(self._items) > self._maxsize:
+            self._items.popitem(last=False)
+        return value
@@ -0,0 +1,137 @@
+from collections import namedtuple
+
+import numpy as np
+
+from src.path import CompactPath, compact_path
+
+
+# kind: "static" (blocked or out of map cell), "jump" (not a cardinal move or wait),
+# "vertex" (the agent and an obstacle are in the same cell), "swap" (they exchange cells during one step);
+# t is the time of the conflict (the start of the step for "jump" and "swap"), obstacle is -1 for "static" and "jump"
+Conflict = namedtuple("Conflict", ["kind", "t", "i", "j", "obstacle"])
+
+
+def path_positions(path):
+    '''
+    Returns positions of the agent at every timestep and the time of the first of them.
+
+    Parameters
+    ----------
+    path : CompactPath, list[Node] or array-like of shape (n, 2)
+        For a list of nodes (e.g. make_path output) the path is rebuilt from parent pointers of its last node,
+        so that waits at the start are taken into account; positions of an array start at time 0
+
+    Returns
+    -------
+    tuple[np.ndarray, int]
+        Array of shape (n, 2) of (i, j) and the start time
+    '''
+    if isinstance(path, CompactPath):
+        return path.positions(), int(path.arrival[0])
+    if len(path) > 0 and hasattr(path[-1], "parent"):
+        path = compact_path(path[-1])
+        return path.positions(), int(path.arrival[0])
+    return np.asarray(path, dtype=np.int64).reshape(-1, 2), 0
+
+
+class ObstacleIndex:
+    '''
+    Trajectories of dynamic obstacles converted to NumPy once: cells are encoded as i * width + j.
+    Build it once per task and pass it to validate_path instead of the trajectories to validate many paths.
+    Every obstacle stays in the last cell of its trajectory after it ends (as in SafeMap and CATable).
+    '''
+
+    def __init__(self, dyn_obst_traj, width):
+        self.width = width
+        self.lengths = np.array([len(trajectory) for trajectory in dyn_obst_traj], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype(np.int64)
+        cells = np.array([cell for trajectory in dyn_obst_traj for cell in trajectory], dtype=np.int64).reshape(-1, 2)
+        self.keys = cells[:, 0] * width + cells[:, 1]
+        # obstacles do not move after this time
+        self.horizon = int(self.lengths.max()) - 1 if len(self.lengths) > 0 else 0
+        self.final = self.keys[self.offsets + self.lengths - 1]
+
+
+    def __len__(self):
+        return len(self.lengths)
+
+
+    def keys_at(self, start_t, end_t):
+        '''
+        Cells of the obstacles at times start_t..end_t as an array of shape (obstacles, end_t - start_t + 1).
+        '''
+        times = np.arange(start_t, end_t + 1)
+        return self.keys[self.offsets[:, None] + np.minimum(times[None, :], self.lengths[:, None] - 1)]
+
+
+def validate_path(grid_map, dyn_obst_traj, path, stay_at_goal = False):
+    '''
+    Checks the path against the static map and the trajectories of dynamic obstacles:
+    the path is expanded to timesteps and compared with all obstacles at once by NumPy broadcasting.
+
+    Parameters
+    ----------
+    grid_map : Map
+        Static map
+    dyn_obst_traj : list[list[tuple[int, int]]] or ObstacleIndex
+        Trajectories of dynamic obstacles
+    path : CompactPath, list[Node] or array-like of shape (n, 2)
+        The path (see path_positions)
+    stay_at_goal : bool
+        Also check that the agent can stay at the goal forever after the end of the path
+
+    Returns
+    -------
+    list[Conflict]
+        Conflicts ordered by time (an empty list if the path is valid)
+    '''
+    positions, start_t = path_positions(path)
+    if len(positions) == 0:
+        return []
+    height, width = grid_map.get_size()
+    occupancy = dyn_obst_traj if isinstance(dyn_obst_traj, ObstacleIndex) else ObstacleIndex(dyn_obst_traj, width)
+    if occupancy.width != width:
+        raise Exception("ObstacleIndex is built for width", occupancy.width, "not", width)
+    conflicts = []
+
+    # cells are encoded as i * width + j, cells out of the map get negative keys
+    inside = (positions[:, 0] >= 0) & (positions[:, 0] < height) & (positions[:, 1] >= 0) & (positions[:, 1] < width)
+    keys = np.where(inside, positions[:, 0] * width + positions[:, 1], -1)
+
+    # only distinct cells of the path are looked up in the map (there are not more of them than moves)
+    cells, index = np.unique(keys, return_inverse=True)
+    blocked = np.array([key < 0 or not grid_map.traversable(key // width, key % width) for key in cells.tolist()], dtype=bool)
+    for k in np.flatnonzero(blocked[index]):
+        conflicts.append(Conflict("static", start_t + int(k), int(positions[k, 0]), int(positions[k, 1]), -1))
+
+    moves = np.abs(np.diff(positions, axis=0)).sum(axis=1)
+    for k in np.flatnonzero(moves > 1):
+        conflicts.append(Conflict("jump", start_t + int(k), int(positions[k, 0]), int(positions[k, 1]), -1))
+
+    end_t = start_t + len(positions) - 1
+    # obstacles do not move after the horizon, so there the agent is compared only with their last cells
+    horizon = occupancy.horizon
+    if stay_at_goal and horizon > end_t:
+        positions = np.concatenate([positions, np.repeat(positions[-1:], horizon - end_t, axis=0)])
+        keys = np.concatenate([keys, np.repeat(keys[-1:], horizon - end_t)])
+        end_t = horizon
+    moving = max(min(end_t, horizon) - start_t + 1, 0)
+    final = occupancy.final
+    obstacles = occupancy.keys_at(start_t, start_t + moving - 1)
+
+    # (obstacles, timesteps): the obstacle is in the cell of the agent
+    for obstacle, k in zip(*np.nonzero(obstacles == keys[None, :moving])):
+        conflicts.append(Conflict("vertex", start_t + int(k), int(positions[k, 0]), int(positions[k, 1]), int(obstacle)))
+    if moving < len(keys):
+        for k in moving + np.flatnonzero(np.isin(keys[moving:], final)):
+            for obstacle in np.flatnonzero(final == keys[k]):
+                conflicts.append(Conflict("vertex", start_t + int(k), int(positions[k, 0]), int(positions[k, 1]), int(obstacle)))
+
+    # the obstacle moves into the cell, which the agent leaves, and vice versa
+    head = keys[:moving]
+    swapped = (obstacles[:, :-1] == head[None, 1:]) & (obstacles[:, 1:] == head[None, :-1]) & (head[1:] != head[:-1])[None, :]
+    for obstacle, k in zip(*np.nonzero(swapped)):
+        conflicts.append(Conflict("swap", start_t + int(k), int(positions[k, 0]), int(positions[k, 1]), int(obstacle)))
+
+    conflicts.sort(key=lambda conflict: (conflict.t, conflict.obstacle))
+    return conflicts
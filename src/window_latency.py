@@ -0,0 +1,102 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from src.algo.sipp import sipp, SearchTree
+from src.algo.windowed_sipp import WindowedSafeMap, windowed_sipp
+from src.benchmark import map_path
+from src.grid import Map, SafeMap, manhattan_distance
+from src.scaling import generate_obstacles, generate_queries
+from src.validate import ObstacleIndex, validate_path
+
+
+MAPS = ("random512-15-0", "Paris_1_512")
+
+
+def measure_windows(grid_map, dyn_obst_traj, queries, windows, repeats = 1):
+    '''
+    Runs sipp and windowed_sipp with every window on the queries and yields one row per (query, planner):
+    search time (the best of repeats, ns), expansions, path length and the number of conflicts
+    of the path within the window (it must be 0).
+    '''
+    safe_map = SafeMap(grid_map, dyn_obst_traj)
+    obstacles = ObstacleIndex(dyn_obst_traj, grid_map.get_size()[1])
+    planners = [("sipp", None, lambda *query: sipp(safe_map, *query, manhattan_distance, SearchTree, keep_lists=False, compact=True))]
+    for window in windows:
+        # the windowed map is built once for all queries, like the SafeMap itself
+        windowed_map = WindowedSafeMap(safe_map, window)
+        planners.append(("windowed_sipp", window,
+                         lambda *query, windowed_map=windowed_map, window=window:
+                             windowed_sipp(windowed_map, *query, window, manhattan_distance, SearchTree, keep_lists=False, compact=True)))
+
+    for query_id, query in enumerate(queries):
+        for algorithm, window, planner in planners:
+            search_ns = None
+            for _ in range(repeats):
+                start_time = time.perf_counter_ns()
+                result = planner(*query)
+                elapsed = time.perf_counter_ns() - start_time
+                search_ns = elapsed if search_ns is None else min(search_ns, elapsed)
+            row = {"query": query_id, "algorithm": algorithm, "window": window, "found": bool(result[0]),
+                   "length": result[1].length if result[0] else None, "expansions": result[2], "search_ns": search_ns,
+                   "window_conflicts": None}
+            if result[0]:
+                positions = result[1].positions()
+                row["window_conflicts"] = len(validate_path(grid_map, obstacles, positions[:window]))
+            yield row
+
+
+def summarize(rows):
+    '''
+    Returns the median search time (ms), the median expansions and the median speedup over sipp
+    (ratio of search times on the same query) for every window.
+    '''
+    sipp_ns = {(row["map"], row["query"]): row["search_ns"] for row in rows if row["algorithm"] == "sipp"}
+    summary = dict()
+    for row in rows:
+        summary.setdefault(row["window"], []).append(row)
+    return {window: {"search_ms": float(np.median([row["search_ns"] for row in group])) / 1e6,
+                     "expansions": float(np.median([row["expansions"] for row in group])),
+                     "speedup": float(np.median([sipp_ns[(row["map"], row["query"])] / row["search_ns"] for row in group]))}
+            for window, group in summary.items()}
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog="python -m src.window_latency",
+                                     description="Search latency of windowed SIPP against full SIPP on the 512 maps.")
+    parser.add_argument("--maps", nargs="+", default=list(MAPS))
+    parser.add_argument("--windows", nargs="+", type=int, default=[8, 16, 32, 64, 128])
+    parser.add_argument("--obstacles", type=int, default=500, help="number of dynamic obstacles")
+    parser.add_argument("--period", type=int, default=16)
+    parser.add_argument("--horizon", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON lines file of all rows")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for name in args.maps:
+        grid_map = Map()
+        grid_map.read_from_file(map_path(name), max_size=None)
+        blocked = grid_map.get_cells_array()
+        task = generate_obstacles(blocked, args.obstacles, 1.0, args.period, args.horizon, args.seed)
+        queries = generate_queries(blocked, args.queries, args.seed, task)
+        for row in measure_windows(grid_map, task, queries, args.windows, args.repeats):
+            row["map"] = name
+            rows.append(row)
+
+    if args.output is not None:
+        with open(args.output, "w") as stream:
+            for row in rows:
+                stream.write(json.dumps(row) + "\n")
+    for window, values in summarize(rows).items():
+        sys.stdout.write("{:>14} search {:9.2f} ms  expansions {:9.0f}  speedup {:5.2f}x\n".format(
+            "sipp" if window is None else "window " + str(window), values["search_ms"], values["expansions"], values["speedup"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import os
+
+import numpy as np
+
+
+def generate_dynamic_obstacles_confs(count, height, width):    
+    '''
+    Generates count tasks with dynamic obstacles, the task number k contains 3 * k obstacles
+    (7 * k if count >= 10). Every obstacle patrols back and forth along a random walk
+    of 3-12 cells, the cycle is repeated 100 times. Uses the global NumPy random state.
+    '''
+    delta = np.array([[0, 1], [1, 0], [0, -1], [-1, 0]])
+    tasks = []
+    
+    for num in range(count):
+        confs = []
+        count_obs = 0
+        if count < 10:
+            count_obs = 3 * num
+        else:
+            count_obs = 7 * num
+            
+        for i_obs in range(count_obs):
+            l = np.random.choice(range(3, 13))
+            conf = []
+            i = np.random.choice(height)
+            j = np.random.choice(width)
+            conf.append((i, j))
+            deltas = delta[np.random.choice(4, size=l-1)]
+            for pos in range(1, l):
+                conf.append((conf[pos-1][0] + deltas[pos-1][0], conf[pos-1][1] + deltas[pos-1][1])) 
+
+            conf = conf + conf[-2:0:-1]
+            conf_res = []
+            for _ in range(100):
+                conf_res = conf_res + conf
+            confs.append(conf_res)
+        
+        tasks.append(confs)
+    
+    return tasks
+
+
+def generate_periodic_obstacles_confs(count, height, width, period, repeats):
+    '''
+    Generates count obstacles, which patrol back and forth along random walks with the same cycle
+    of period moments (period must be even), repeated repeats times.
+    '''
+    delta = np.array([[0, 1], [1, 0], [0, -1], [-1, 0]])
+    confs = []
+    for _ in range(count):
+        conf = [(np.random.choice(height), np.random.choice(width))]
+        deltas = delta[np.random.choice(4, size=period // 2)]
+        for d in deltas:
+            conf.append((conf[-1][0] + d[0], conf[-1][1] + d[1]))
+        confs.append((conf + conf[-2:0:-1]) * repeats)
+    return confs
+
+
+def generate_agents(grid_map, count):
+    '''
+    Generates start and goal cells of count agents. Starts are pairwise different
+    free cells, goals are pairwise different free cells too.
+    '''
+    height, width = grid_map.get_size()
+    free = [(i, j) for i in range(height) for j in range(width) if grid_map.traversable(i, j)]
+    starts = np.random.choice(len(free), size=count, replace=False)
+    goals = np.random.choice(len(free), size=count, replace=False)
+    return [free[s] + free[g] for s, g in zip(starts, goals)]
+
+
+DELTA = np.array([[0, 1], [1, 0], [0, -1], [-1, 0]])
+
+
+def random_walks(rng, blocked, count, min_length = 3, max_length = 12):
+    '''
+    Generates count random walks over traversable cells, all walks are built at once:
+    every step moves all walks to a random traversable neighbour (a walk without such neighbours stays).
+
+    Parameters
+    ----------
+    rng : np.random.Generator
+        Source of randomness
+    blocked : np.ndarray
+        Boolean array of blocked cells (see Map.get_cells_array)
+    count : int
+        Number of walks
+    min_length, max_length : int
+        Bounds of the number of cells of a walk
+
+    Returns
+    -------
+    walks : np.ndarray
+        Array of shape (count, max_length, 2) of (i, j) cells, cells after the end of the walk are undefined
+    lengths : np.ndarray
+        Number of cells of every walk
+    '''
+    free = np.argwhere(~blocked)
+    if len(free) == 0:
+        raise Exception("Map has no traversable cells")
+    padded = np.pad(blocked, 1, constant_values=True)
+
+    lengths = rng.integers(min_length, max_length + 1, size=count)
+    walks = np.empty((count, max_length, 2), dtype=np.int64)
+    walks[:, 0] = free[rng.integers(len(free), size=count)]
+    rows = np.arange(count)
+    for step in range(1, max_length):
+        candidates = walks[:, step - 1, None, :] + DELTA[None]
+        valid = ~padded[candidates[..., 0] + 1, candidates[..., 1] + 1]
+        scores = np.where(valid, rng.random((count, 4)), -1.0)
+        moves = candidates[rows, scores.argmax(axis=1)]
+        walks[:, step] = np.where(valid.any(axis=1)[:, None], moves, walks[:, step - 1])
+    return walks, lengths
+
+
+def patrol_trajectories(walks, lengths, repeats = 100):
+    '''
+    Turns walks into trajectories of obstacles, which patrol back and forth along the walks:
+    the cycle (c_0, ..., c_{l-1}, c_{l-2}, ..., c_1) is repeated repeats times.
+
+    Returns
+    -------
+    list[list[tuple[int, int]]]
+        Trajectories in the format of SafeMap and CATable
+    '''
+    trajectories = [None] * len(lengths)
+    for length in np.unique(lengths):
+        group = np.flatnonzero(lengths == length)
+        cycle = np.concatenate([np.arange(length), np.arange(length - 2, 0, -1)])
+        cells = walks[group][:, np.tile(cycle, repeats)]
+        for number, obstacle in zip(group.tolist(), cells):
+            trajectories[number] = list(zip(obstacle[:, 0].tolist(), obstacle[:, 1].tolist()))
+    return trajectories
+
+
+def tasks_obstacles_counts(count):
+    '''
+    Number of obstacles in every task of generate_dynamic_obstacles_confs: 3 * k (7 * k if count >= 10).
+    '''
+    return [(3 if count < 10 else 7) * num for num in range(count)]
+
+
+def generate_task_walks(grid_map, count, seed = None, min_length = 3, max_length = 12):
+    '''
+    Seedable counterpart of generate_dynamic_obstacles_confs: the same numbers of obstacles,
+    but walks of all tasks are generated by one random_walks call with np.random.Generator(seed)
+    and stay on traversable cells of the map.
+
+    Returns
+    -------
+    list[tuple[np.ndarray, np.ndarray]]
+        (walks, lengths) of every task, see random_walks
+    '''
+    rng = np.random.default_rng(seed)
+    counts = tasks_obstacles_counts(count)
+    walks, lengths = random_walks(rng, grid_map.get_cells_array(), sum(counts), min_length, max_length)
+    bounds = np.cumsum([0] + counts)
+    return [(walks[start:stop], lengths[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def generate_tasks(grid_map, count, seed = None, repeats = 100):
+    '''
+    Generates count tasks with dynamic obstacles on traversable cells of the map (see generate_task_walks).
+    '''
+    return [patrol_trajectories(walks, lengths, repeats) for walks, lengths in generate_task_walks(grid_map, count, seed)]
+
+
+def save_task_store(path, task_walks, repeats = 100, seed = None):
+    '''
+    Writes tasks (walks from generate_task_walks) to the store: the directory path with uncompressed .npy files
+    (walks of all tasks one after another, their lengths, bounds of the tasks and the header), which TaskStore
+    maps into memory. Only walks are stored, trajectories are unrolled on loading, so the store is small.
+    '''
+    os.makedirs(path, exist_ok=True)
+    counts = [len(walks) for walks, _ in task_walks]
+    bounds = np.cumsum([0] + counts)
+    width = max([walks.shape[1] for walks, _ in task_walks], default=1)
+    all_walks = np.zeros((bounds[-1], width, 2), dtype=np.int32)
+    all_lengths = np.zeros(bounds[-1], dtype=np.int32)
+    for (walks, lengths), start, stop in zip(task_walks, bounds[:-1], bounds[1:]):
+        all_walks[start:stop, :walks.shape[1]] = walks
+        all_lengths[start:stop] = lengths
+    np.save(os.path.join(path, "walks.npy"), all_walks)
+    np.save(os.path.join(path, "lengths.npy"), all_lengths)
+    np.save(os.path.join(path, "bounds.npy"), bounds.astype(np.int64))
+    np.save(os.path.join(path, "header.npy"), np.array([repeats, -1 if seed is None else seed], dtype=np.int64))
+
+
+class TaskStore:
+    '''
+    Read-only store of tasks written by save_task_store. Its arrays are memory-mapped (mmap_mode='r'),
+    so tasks are loaded one by one (store[k] or iteration), only the pages of the walks of the task are read,
+    and worker processes share them through the page cache.
+    '''
+
+    def __init__(self, path):
+        self._walks = np.load(os.path.join(path, "walks.npy"), mmap_mode='r')
+        self._lengths = np.load(os.path.join(path, "lengths.npy"), mmap_mode='r')
+        self._bounds = np.load(os.path.join(path, "bounds.npy")).tolist()
+        self.repeats, self.seed = np.load(os.path.join(path, "header.npy")).tolist()
+        self._count = len(self._bounds) - 1
+
+
+    def __len__(self):
+        return self._count
+
+
+    def walks(self, number):
+        '''
+        Returns (walks, lengths) of the task (views of the mapped arrays)
+        '''
+        if not 0 <= number < self._count:
+            raise IndexError("Task " + str(number) + " is not in the store")
+        start, stop = self._bounds[number], self._bounds[number + 1]
+        return self._walks[start:stop], self._lengths[start:stop]
+
+
+    def __getitem__(self, number):
+        return patrol_trajectories(*self.walks(number), self.repeats)
+
+
+    def __iter__(self):
+        for number in range(self._count):
+            yield self[number]
+
+
+    def close(self):
+        # the files are unmapped, when the arrays are released
+        self._walks = None
+        self._lengths = None
+
+
+def main(argv = None):
+    import argparse
+    from src.grid import Map
+    from src.benchmark import map_path
+
+    parser = argparse.ArgumentParser(prog="python -m src.workload",
+                                     description="Generates tasks with dynamic obstacles and writes them to a task store.")
+    parser.add_argument("--map", required=True, help="name of a bundled map (e.g. small) or path to a .map file")
+    parser.add_argument("--max-size", type=int, default=None,
+                        help="crop the map to MAX_SIZE x MAX_SIZE cells as in the benchmark (default: the whole map)")
+    parser.add_argument("--tasks", type=int, default=5, help="number of tasks")
+    parser.add_argument("--seed", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=100, help="repeats of the patrol cycle")
+    parser.add_argument("--output", required=True, help="directory of the store")
+    args = parser.parse_args(argv)
+
+    grid_map = Map()
+    grid_map.read_from_file(map_path(args.map), args.max_size)
+    save_task_store(args.output, generate_task_walks(grid_map, args.tasks, args.seed), args.repeats, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import json
+import os
+import time
+
+from heapq import heappop, heappush
+
+import pytest
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("perf", "performance regression suite")
+    group.addoption("--update-baseline", action="store_true", default=False,
+                    help="record the measured values into tests/perf_baseline.json instead of comparing")
+    group.addoption("--perf-tolerance", type=float, default=1.0,
+                    help="allowed relative growth of the normalized runtime (1.0 -- twice as slow)")
+    group.addoption("--perf-repeats", type=int, default=5,
+                    help="runtime is the best of this number of runs")
+
+
+def calibration_workload():
+    '''
+    Fixed pure-Python workload similar to a search (heap and dict operations), runtimes of planners
+    are divided by its runtime, so baselines can be compared between machines.
+    '''
+    heap = []
+    seen = dict()
+    for k in range(100000):
+        key = (k * 7919) % 10007
+        heappush(heap, (key, k))
+        seen[(key, k & 63)] = k
+        if k % 3 == 0:
+            heappop(heap)
+    return len(seen)
+
+
+@pytest.fixture
+def calibration():
+    # measured right before every case, so that slowdowns of the machine during the session are compensated
+    best = None
+    for _ in range(5):
+        start_time = time.perf_counter()
+        calibration_workload()
+        runtime = time.perf_counter() - start_time
+        best = runtime if best is None else min(best, runtime)
+    return best
+
+
+class Baseline:
+    '''
+    Baseline values of the cases: expansions, nodes created, path length and normalized runtime.
+    '''
+
+    def __init__(self, config):
+        self.update = config.getoption("--update-baseline")
+        self.tolerance = config.getoption("--perf-tolerance")
+        self.repeats = config.getoption("--perf-repeats")
+        self.cases = dict()
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as baseline_file:
+                self.cases = json.load(baseline_file)["cases"]
+        self.changed = False
+
+
+    def check(self, case, measured):
+        if self.update:
+            self.cases[case] = measured
+            self.changed = True
+            return
+
+        if not case in self.cases:
+            pytest.fail("No baseline for " + case + ", run pytest with --update-baseline")
+        expected = self.cases[case]
+        for name in ("found", "expansions", "nodes_created", "length"):
+            assert measured[name] == expected[name], \
+                "{} changed for {}: {} -> {} (run with --update-baseline if it is expected)".format(
+                    name, case, expected[name], measured[name])
+        limit = expected["runtime"] * (1 + self.tolerance)
+        assert measured["runtime"] <= limit, \
+            "runtime of {} regressed: {:.3f} -> {:.3f} calibration units (limit {:.3f})".format(
+                case, expected["runtime"], measured["runtime"], limit)
+
+
+    def save(self):
+        with open(BASELINE_PATH, "w") as baseline_file:
+            json.dump({"cases": dict(sorted(self.cases.items()))}, baseline_file, indent=1)
+            baseline_file.write("\n")
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    baseline = Baseline(request.config)
+    yield baseline
+    if baseline.changed:
+        baseline.save()
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from src.algo.astar_timesteps import astar_timesteps, CATable, DenseCATable, detect_period, obstacle_period, \
+    SearchTree as SearchTreeAStarTimesteps
+from src.algo.sipp import sipp, SearchTree
+from src.benchmark import map_path
+from src.grid import Map, SafeMap, manhattan_distance
+from src.scaling import generate_obstacles, generate_queries
+from src.workload import generate_tasks
+
+
+SEED = 7
+QUERIES = 8
+
+
+@pytest.fixture(scope="module")
+def grid_map():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    return grid_map
+
+
+def assert_costs_match_sipp(grid_map, task, queries, ca_tables):
+    safe_map = SafeMap(grid_map, task)
+    solved = 0
+    for query in queries:
+        full = sipp(safe_map, *query, manhattan_distance, SearchTree, compact=True)
+        for ca_table in ca_tables:
+            result = astar_timesteps(grid_map, ca_table, *query, manhattan_distance, SearchTreeAStarTimesteps, compact=True)
+            assert result[0] == full[0]
+            if result[0]:
+                assert result[1].length == full[1].length
+        solved += full[0]
+    assert solved > 0
+
+
+def test_goal_walled_off_in_time_is_unreachable():
+    grid_map = Map()
+    grid_map.read_from_string(".......", 7, 1)
+    # the obstacle parks at (0, 3) at t = 1: the goal is reachable in the static map only
+    task = [[(0, 4), (0, 3)]]
+    ca_table = CATable(task)
+    assert ca_table.horizon == 1
+    assert [ca_table.state_time(t) for t in range(4)] == [0, 1, 1, 1]
+    assert grid_map.connected(0, 0, 0, 6)
+
+    result = astar_timesteps(grid_map, ca_table, 0, 0, 0, 6, manhattan_distance, SearchTreeAStarTimesteps)
+    assert result[:2] == (False, None)
+    # after the horizon every cell is one state: the left part of the corridor is expanded twice at most
+    assert result[2] <= 2 * 3 + 1
+    assert not sipp(SafeMap(grid_map, task), 0, 0, 0, 6, manhattan_distance, SearchTree)[0]
+
+
+def test_costs_match_sipp(grid_map):
+    task = generate_tasks(grid_map, 1, SEED)[0]
+    queries = generate_queries(grid_map.get_cells_array(), QUERIES, SEED, task)
+    assert_costs_match_sipp(grid_map, task, queries, [CATable(task), DenseCATable(grid_map, task)])
+
+
+def test_period_detection():
+    assert obstacle_period([(0, 0), (0, 1)] * 3) == 2
+    assert obstacle_period([(5, 5), (5, 5)] + [(0, 0), (0, 1), (0, 2), (0, 1)] * 2, prefix=2) == 4
+    assert obstacle_period([(0, 0), (0, 1), (0, 2)]) is None
+    # one cycle is not enough to detect the period
+    assert detect_period([[(0, 0), (0, 1), (0, 2), (0, 1)]]) is None
+    assert detect_period([[(0, 0), (0, 1)] * 4, [(1, 0), (1, 1), (1, 2)] * 3]) == 6
+
+    blocked = np.zeros((10, 10), dtype=bool)
+    # patrols of 4 moves, 2 moments in every cell: the cycle is 16 moments
+    task = generate_obstacles(blocked, 5, 0.5, 8, 64, SEED)
+    assert 16 % detect_period(task) == 0
+    ca_table = CATable(task, period='auto')
+    assert ca_table.period == detect_period(task) and ca_table.horizon is None
+    assert ca_table.state_time(ca_table.period + 3) == 3
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_folded_costs_match_unfolded(grid_map, seed):
+    blocked = grid_map.get_cells_array()
+    # trajectories are much longer than the paths, so parking at their ends does not change the costs
+    task = generate_obstacles(blocked, 30, 0.5, 8, 300, seed)
+    queries = generate_queries(blocked, QUERIES, seed, task)
+    folded = CATable(task, period='auto')
+    assert folded.period is not None
+    assert_costs_match_sipp(grid_map, task, queries, [CATable(task), folded])
+
+
+def test_dense_folding_matches_dict_table(grid_map):
+    height, width = grid_map.get_size()
+    task = generate_obstacles(grid_map.get_cells_array(), 30, 0.5, 8, 300, SEED)
+    table, dense = CATable(task, period='auto'), DenseCATable(grid_map, task, period='auto')
+    assert dense.period == table.period and dense.bits.shape[0] == dense.prefix + dense.period
+
+    rng = np.random.default_rng(SEED)
+    # moments far beyond the trajectories are folded by the period
+    nodes = np.stack([rng.integers(1, height - 1, 500), rng.integers(1, width - 1, 500),
+                      rng.integers(0, 1000, 500)], axis=1)
+    delta = np.array([[0, 1], [1, 0], [0, -1], [-1, 0], [0, 0]])
+    valid = dense.check_moves_array(nodes[:, :1], nodes[:, 1:2], nodes[:, :1] + delta[:, 0], nodes[:, 1:2] + delta[:, 1],
+                                    nodes[:, 2:])
+    for (i, j, t), row in zip(nodes.tolist(), valid.tolist()):
+        cells = [(i + d_i, j + d_j) for d_i, d_j in delta.tolist()]
+        assert [cell for cell, ok in zip(cells, row) if ok] == table.check_moves(i, j, t, cells)
@@ -0,0 +1,42 @@
+import json
+import pstats
+
+from src.benchmark import main, run_benchmark
+
+
+def test_aggregate_is_deterministic_with_profiling(tmp_path):
+    aggregates = []
+    for run in range(2):
+        aggregate = tmp_path / "aggregate-{}.jsonl".format(run)
+        main(["--map", "small", "--tasks", "2", "--reps", "1", "--warmup", "0", "--scen-range", "0", "2",
+              "--profile", str(tmp_path / "profile-{}".format(run)), "--output", str(tmp_path / "rows.jsonl"),
+              "--aggregate", str(aggregate)])
+        aggregates.append(aggregate.read_bytes())
+    assert aggregates[0] == aggregates[1]
+
+    rows = [json.loads(line) for line in aggregates[0].decode().splitlines()]
+    assert len(rows) > 0
+    for name in ("build_ns", "search_ns", "build_peak_bytes", "search_peak_bytes"):
+        assert all(not name in row for row in rows)
+
+
+def test_profile_writes_reports(tmp_path):
+    rows = list(run_benchmark("small", ["sipp", "astar_timesteps"], tasks=2, warmup=0, reps=1,
+                              scenario_filter={"start": 0, "stop": 1}, profile=str(tmp_path)))
+    assert len(rows) == 4
+    for row in rows:
+        assert row["build_peak_bytes"] > 0 and row["search_peak_bytes"] > 0
+        prefix = tmp_path / "job-{}".format(row["job"])
+        for phase in ("build", "search"):
+            functions = pstats.Stats(str(prefix) + "-" + phase + ".pstats").stats
+            assert len(functions) > 0
+        report = (tmp_path / "job-{}-report.txt".format(row["job"])).read_text()
+        assert "build peak memory: {} bytes".format(row["build_peak_bytes"]) in report
+        assert "=== search: top allocations over the built domain ===" in report
+
+    # profiling does not change the measured search
+    plain = list(run_benchmark("small", ["sipp", "astar_timesteps"], tasks=2, warmup=0, reps=1,
+                               scenario_filter={"start": 0, "stop": 1}))
+    for row, other in zip(sorted(rows, key=lambda row: row["job"]), sorted(plain, key=lambda row: row["job"])):
+        assert (row["expansions"], row["length"]) == (other["expansions"], other["length"])
+        assert other["build_peak_bytes"] is None
@@ -0,0 +1,32 @@
+import numpy as np
+
+from src.algo.astar_timesteps import CATable, DenseCATable
+from src.benchmark import map_path
+from src.grid import Map
+from src.workload import generate_tasks
+
+
+SEED = 4
+
+
+def test_dense_table_matches_dict_table():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    height, width = grid_map.get_size()
+    task = generate_tasks(grid_map, 1, SEED)[0]
+    table, dense = CATable(task), DenseCATable(grid_map, task)
+    # only the cells visited by obstacles get columns of the bit matrix
+    assert dense.bits.shape[1] < height * width // 8
+
+    rng = np.random.default_rng(SEED)
+    nodes = np.stack([rng.integers(1, height - 1, 500), rng.integers(1, width - 1, 500),
+                      rng.integers(0, table.horizon + 10, 500)], axis=1)
+    delta = np.array([[0, 1], [1, 0], [0, -1], [-1, 0], [0, 0]])
+    valid = dense.check_moves_array(nodes[:, :1], nodes[:, 1:2], nodes[:, :1] + delta[:, 0], nodes[:, 1:2] + delta[:, 1],
+                                    nodes[:, 2:])
+    for (i, j, t), row in zip(nodes.tolist(), valid.tolist()):
+        cells = [(i + d_i, j + d_j) for d_i, d_j in delta.tolist()]
+        expected = table.check_moves(i, j, t, cells)
+        assert dense.check_moves(i, j, t, cells) == expected
+        assert [cell for cell, ok in zip(cells, row) if ok] == expected
+        assert dense.occupied(i, j, t + 1) == (not table.check_move(i, j, i, j, t))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from src.algo.cbs import ConstrainedSafeMap, cbs, find_conflict
+from src.benchmark import map_path
+from src.grid import Map, SafeMap
+from src.validate import validate_path
+from src.workload import generate_tasks
+
+
+SEED = 1
+AGENTS = 12
+
+
+def assert_conflict_free(grid_map, dyn_obst_traj, paths):
+    for agent, path in enumerate(paths):
+        others = paths[:agent] + paths[agent + 1:]
+        assert validate_path(grid_map, dyn_obst_traj + others, path, stay_at_goal=True) == []
+
+
+def test_swap_is_resolved_by_edge_constraints():
+    grid_map = Map()
+    grid_map.read_from_string("..\n..", 2, 2)
+    conflict = find_conflict([[(0, 0), (0, 1)], [(0, 1), (0, 0)]])
+    assert conflict == (0, 1, (0, 0, 0, 1, 1), (0, 1, 0, 0, 1))
+
+    # the move is forbidden, the cells are not
+    safe_map = ConstrainedSafeMap(SafeMap(grid_map, []), {conflict[2]})
+    assert safe_map.traversable(0, 1, 1)
+    assert sorted(safe_map.get_neighbors(0, 0, 0)) == [(0, 1, 2), (1, 0, 1)]
+
+    found, paths, stat = cbs(grid_map, [], [(0, 0, 0, 1), (0, 1, 0, 0)])
+    assert found
+    assert stat["cost"] == 4
+    assert_conflict_free(grid_map, [], paths)
+
+
+def test_agent_passes_its_goal():
+    grid_map = Map()
+    # a corridor with a pocket under (0, 2): the second agent steps into it to let the first one pass its goal
+    grid_map.read_from_string(".....\n##.##", 5, 2)
+    agents = [(0, 0, 0, 4), (0, 1, 0, 2)]
+    found, paths, stat = cbs(grid_map, [], agents)
+    assert found
+    assert stat["cost"] == 7
+    assert paths[1][-1] == (0, 2) and (0, 2) in paths[1][:-1] and (1, 2) in paths[1]
+    assert_conflict_free(grid_map, [], paths)
+
+
+def test_paths_are_conflict_free():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    task = generate_tasks(grid_map, 1, SEED)[0]
+    starts = {tuple(trajectory[0]) for trajectory in task}
+    free = [cell for cell in map(tuple, np.argwhere(~grid_map.get_cells_array()).tolist()) if not cell in starts]
+    rng = np.random.default_rng(SEED)
+    cells = [free[k] for k in rng.choice(len(free), 2 * AGENTS, replace=False)]
+    agents = [cells[k] + cells[AGENTS + k] for k in range(AGENTS)]
+
+    found, paths, stat = cbs(grid_map, task, agents, max_nodes=200)
+    assert found
+    # the agents of the root node are in conflict
+    assert stat["expandedNodes"] > 1
+    for agent, path in enumerate(paths):
+        assert path[0] == agents[agent][:2] and path[-1] == agents[agent][2:]
+    assert stat["cost"] == sum(len(path) - 1 for path in paths)
+    assert_conflict_free(grid_map, task, paths)
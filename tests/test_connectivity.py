@@ -0,0 +1,94 @@
+import numpy as np
+
+from src.algo.astar_timesteps import astar_timesteps, CATable, SearchTree as SearchTreeAStarTimesteps
+from src.algo.sipp import sipp, SearchTree
+from src.benchmark import map_path
+from src.grid import Map, PrunedSafeMap, SafeMap, manhattan_distance
+from src.workload import generate_tasks
+
+
+def closed_room_map():
+    # 32room_007 with closed doors of the top left room
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    cells = grid_map.get_cells_array().astype(int).tolist()
+    for i, j in ((0, 6), (23, 0), (17, 32), (32, 27)):
+        cells[i][j] = 1
+    closed = Map()
+    closed.set_grid_cells(70, 70, cells)
+    return closed
+
+
+def test_component_labels():
+    grid_map = Map()
+    grid_map.set_grid_cells(5, 3, [[0, 0, 1, 0, 0], [1, 0, 1, 0, 1], [0, 0, 1, 1, 0]])
+    assert grid_map.component_labels().tolist() == [[1, 1, 0, 2, 2], [0, 1, 0, 2, 0], [1, 1, 0, 0, 3]]
+    assert grid_map.connected(0, 0, 2, 0)
+    assert not grid_map.connected(0, 0, 0, 4)
+    assert not grid_map.connected(0, 0, 1, 0)
+
+
+def test_planners_reject_unreachable_goal():
+    grid_map = closed_room_map()
+    task = generate_tasks(grid_map, 2, 100)[1]
+    result = sipp(SafeMap(grid_map, task), 5, 5, 60, 60, manhattan_distance, SearchTree)
+    assert result[:4] == (False, None, 0, 0)
+    result = astar_timesteps(grid_map, CATable(task), 5, 5, 60, 60, manhattan_distance, SearchTreeAStarTimesteps)
+    assert result[:4] == (False, None, 0, 0)
+    assert sipp(SafeMap(grid_map, task), 5, 5, 20, 20, manhattan_distance, SearchTree)[0]
+
+
+def test_dead_ends():
+    grid_map = Map()
+    # the room at the right is connected to the corridor only by (1, 3)
+    grid_map.set_grid_cells(6, 4, [[0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0], [1, 1, 1, 1, 1, 1]])
+    dead_ends = grid_map.dead_ends(0, 0, 2, 2)
+    assert np.argwhere(dead_ends).tolist() == [[0, 4], [0, 5], [1, 3], [1, 4], [1, 5], [2, 4], [2, 5]]
+    assert not grid_map.dead_ends(0, 0, 0, 5).any()
+
+
+def test_dead_ends_are_cached():
+    grid_map = Map()
+    grid_map.set_grid_cells(6, 4, [[0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0], [1, 1, 1, 1, 1, 1]])
+    dead_ends = grid_map.dead_ends(0, 0, 2, 2)
+    assert grid_map.dead_ends(0, 0, 2, 2) is dead_ends
+    assert not dead_ends.flags.writeable
+    # the cache is dropped, when the cells are set again
+    grid_map.set_grid_cells(6, 4, [[0] * 6] * 4)
+    assert not grid_map.dead_ends(0, 0, 2, 2).any()
+
+
+def test_views_delegate_connected():
+    grid_map = Map()
+    # (0, 4) and (1, 4) are the dead ends of the query (0, 0) -> (0, 3), the row 2 is blocked
+    grid_map.set_grid_cells(5, 3, [[0, 0, 0, 0, 0], [1, 1, 1, 1, 0], [1, 1, 1, 1, 1]])
+    safe_map = SafeMap(grid_map, [[(0, 1), (0, 2)]])
+    pruned = PrunedSafeMap(safe_map, grid_map.dead_ends(0, 0, 0, 3))
+    for view in (safe_map, pruned):
+        assert view.connected(0, 0, 0, 3)
+        assert not view.connected(0, 0, 2, 0)
+    # only the rows with pruned cells are copied
+    assert pruned.intervals[0][4] == [] and pruned.intervals[1][4] == [] and pruned.intervals[0][3] != []
+    assert safe_map.intervals[0][4] != []
+    assert pruned.intervals[2] is safe_map.intervals[2]
+
+
+def test_pruned_search_keeps_lengths():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    free = np.argwhere(~grid_map.get_cells_array())
+    pairs = np.random.default_rng(1).integers(0, len(free), (10, 2))
+    task = generate_tasks(grid_map, 2, 100)[1]
+    safe_map = SafeMap(grid_map, task)
+    starts = {tuple(trajectory[0]) for trajectory in task}
+    for a, b in pairs:
+        query = tuple(free[a].tolist() + free[b].tolist())
+        if query[:2] in starts:
+            continue
+        full = sipp(safe_map, *query, manhattan_distance, SearchTree, compact=True)
+        dead_ends = grid_map.dead_ends(*query)
+        pruned = sipp(PrunedSafeMap(safe_map, dead_ends), *query, manhattan_distance, SearchTree, compact=True)
+        assert pruned[0] == full[0]
+        if pruned[0]:
+            assert pruned[1].length == full[1].length
+            assert not dead_ends[tuple(pruned[1].positions().T)].any()
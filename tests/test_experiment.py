@@ -0,0 +1,50 @@
+import io
+import json
+
+from src.benchmark import main
+from src.experiment import job_seed, run_jobs, write_aggregate
+
+
+def test_job_seed_depends_only_on_key():
+    assert job_seed(100, 1, 2) == job_seed(100, 1, 2)
+    seeds = {job_seed(100, task, rep) for task in range(10) for rep in range(10)}
+    assert len(seeds) == 100
+    assert all(0 <= seed < 2 ** 32 for seed in seeds)
+
+
+def test_run_jobs_consumes_jobs_lazily():
+    consumed = []
+
+    def jobs():
+        for job in range(20):
+            consumed.append(job)
+            yield (job, job)
+
+    results = run_jobs(jobs(), sum, workers=2, max_pending=3)
+    first = next(results)
+    # only max_pending jobs are submitted before the first result
+    assert len(consumed) <= 4
+    assert sorted([first] + list(results)) == [2 * job for job in range(20)]
+    assert list(run_jobs(jobs(), sum)) == [2 * job for job in range(20)]
+
+
+def test_write_aggregate_sorts_rows_and_fields():
+    rows = [{"job": 1, "b": 2, "time": 5}, {"time": 3, "a": 1, "job": 0}]
+    stream = io.StringIO()
+    write_aggregate(rows, stream, exclude=("time",))
+    assert stream.getvalue() == '{"a": 1, "job": 0}\n{"b": 2, "job": 1}\n'
+
+
+def test_aggregate_does_not_depend_on_workers(tmp_path):
+    aggregates = []
+    for workers in (1, 3):
+        aggregate = tmp_path / "aggregate-{}.jsonl".format(workers)
+        main(["--map", "small", "--algorithms", "sipp", "astar_timesteps", "wsipp_r", "--weights", "1.5",
+              "--tasks", "3", "--reps", "2", "--warmup", "0", "--scen-range", "0", "2", "--workers", str(workers),
+              "--output", str(tmp_path / "rows-{}.jsonl".format(workers)), "--aggregate", str(aggregate)])
+        aggregates.append(aggregate.read_bytes())
+    assert aggregates[0] == aggregates[1]
+    rows = [json.loads(line) for line in aggregates[0].decode().splitlines()]
+    assert [row["job"] for row in rows] == list(range(len(rows)))
+    assert {row["algorithm"] for row in rows} == {"sipp", "astar_timesteps", "wsipp_r"}
+    assert {row["task"] for row in rows} == {0, 1, 2}
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from src.algo.hsipp import hsipp, hsipp_segments
+from src.algo.sipp import sipp, SearchTree
+from src.benchmark import map_path
+from src.grid import Map, SafeMap, manhattan_distance
+from src.hierarchy import ClusterHierarchy
+from src.validate import ObstacleIndex, validate_path
+from src.workload import generate_tasks
+
+
+SEED = 11
+TASKS = 3
+
+
+@pytest.fixture(scope="module")
+def domain():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    free = np.argwhere(~grid_map.get_cells_array())
+    pairs = np.random.default_rng(3).integers(0, len(free), (15, 2))
+    queries = [tuple(free[a].tolist() + free[b].tolist()) for a, b in pairs]
+    return grid_map, ClusterHierarchy(grid_map, 8), queries, generate_tasks(grid_map, TASKS, SEED)
+
+
+def test_paths_are_valid(domain):
+    grid_map, hierarchy, queries, tasks = domain
+    for task in tasks:
+        safe_map = SafeMap(grid_map, task)
+        obstacles = ObstacleIndex(task, grid_map.get_size()[1])
+        starts = {tuple(trajectory[0]) for trajectory in task}
+        for query in queries:
+            if query[:2] in starts:
+                continue
+            full = sipp(safe_map, *query, manhattan_distance, SearchTree, compact=True)
+            result = hsipp(safe_map, hierarchy, *query, manhattan_distance, SearchTree, compact=True)
+            assert result[0] == full[0]
+            if not result[0]:
+                continue
+            positions = result[1].positions()
+            assert tuple(positions[0]) == query[:2] and tuple(positions[-1]) == query[2:]
+            assert validate_path(grid_map, obstacles, result[1]) == []
+            assert result[1].length >= full[1].length
+
+
+def test_unreachable_goal():
+    grid_map = Map()
+    grid_map.set_grid_cells(6, 3, [[0, 0, 1, 0, 0, 0], [0, 0, 1, 0, 0, 0], [0, 0, 1, 0, 0, 0]])
+    hierarchy = ClusterHierarchy(grid_map, 2)
+    assert hierarchy.abstract_path(0, 0, 2, 5)[0] is None
+    assert hierarchy.abstract_path(0, 0, 2, 1)[0] is not None
+    result = hsipp(SafeMap(grid_map, []), hierarchy, 0, 0, 2, 5, manhattan_distance, SearchTree)
+    assert result[:2] == (False, None)
+
+
+def test_segments_are_chained(domain):
+    grid_map, hierarchy, queries, tasks = domain
+    safe_map = SafeMap(grid_map, tasks[0])
+    query = queries[0]
+    segments = [node for node, _, _, _ in hsipp_segments(safe_map, hierarchy, *query, manhattan_distance, SearchTree)]
+    assert len(segments) > 1
+    last = hsipp(safe_map, hierarchy, *query, manhattan_distance, SearchTree)[1]
+    assert (segments[-1].i, segments[-1].j, segments[-1].g) == (last.i, last.j, last.g)
+    # every segment ends on the path of the next one
+    for previous, node in zip(segments, segments[1:]):
+        while node is not None and node.g > previous.g:
+            node = node.parent
+        assert (node.i, node.j, node.g) == (previous.i, previous.j, previous.g)
+
+
+def test_fallback_keeps_yielded_segments():
+    grid_map = Map()
+    grid_map.read_from_string("\n".join(["......"] * 6), 6, 6)
+    hierarchy = ClusterHierarchy(grid_map, 2)
+    # the obstacle parks at the waypoint (4, 2): the third segment is not found in the corridor
+    obstacles = [[(5, 2), (4, 2)]]
+    safe_map = SafeMap(grid_map, obstacles)
+    segments = [node for node, _, _, _ in hsipp_segments(safe_map, hierarchy, 0, 0, 5, 5, manhattan_distance, SearchTree)]
+    assert [(node.i, node.j, node.g) for node in segments] == [(2, 0, 2), (4, 0, 4), (5, 5, 10)]
+    # the rest of the path continues the yielded segments
+    node = segments[-1]
+    while node.g > segments[1].g:
+        node = node.parent
+    assert (node.i, node.j, node.g) == (4, 0, 4)
+    result = hsipp(safe_map, hierarchy, 0, 0, 5, 5, manhattan_distance, SearchTree, compact=True)
+    assert result[0] and result[1].length == 10
+    assert validate_path(grid_map, obstacles, result[1]) == []
+
+
+def test_dead_end_segments_are_replanned_from_start():
+    grid_map = Map()
+    grid_map.read_from_string("\n".join(["......"] * 6), 6, 6)
+    # the obstacle parks at the goal (3, 4) at t = 3: the first corridor segment reaches (2, 4) only at t = 3
+    obstacles = [[(2, 4), (2, 3), (2, 4), (3, 4)]]
+    safe_map = SafeMap(grid_map, obstacles)
+    hierarchy = ClusterHierarchy(grid_map, 2)
+    segments = [node for node, _, _, _ in hsipp_segments(safe_map, hierarchy, 2, 3, 3, 4, manhattan_distance, SearchTree)]
+    # the yielded segment is never changed, the goal is unreachable from its end
+    assert (segments[0].i, segments[0].j, segments[0].g) == (2, 4, 3)
+    assert segments[-1] is None
+
+    full = sipp(safe_map, 2, 3, 3, 4, manhattan_distance, SearchTree, compact=True)
+    assert full[0] and full[1].length == 2
+    result = hsipp(safe_map, hierarchy, 2, 3, 3, 4, manhattan_distance, SearchTree, compact=True)
+    assert result[0] and result[1].length == 2
+    assert validate_path(grid_map, obstacles, result[1]) == []
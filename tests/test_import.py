@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+from src.importtime import CORE_MODULES, measure_import
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("modules", [CORE_MODULES, ("src.benchmark",)], ids=["core", "benchmark"])
+def test_import_without_visualization_dependencies(modules):
+    result = measure_import(modules, repeats=1, cwd=ROOT)
+    assert result["heavy"] == [], "{} load {}".format(", ".join(modules), ", ".join(result["heavy"]))
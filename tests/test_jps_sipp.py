@@ -0,0 +1,44 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.algo.jps_sipp import JumpMap, jps_sipp
+from src.algo.sipp import sipp, SearchTree
+from src.benchmark import map_path
+from src.grid import Map, SafeMap, manhattan_distance
+from src.workload import generate_tasks
+
+
+SEED = 7
+TASKS = 3
+
+
+def test_free_mask():
+    grid_map = Map()
+    grid_map.set_grid_cells(4, 2, [[0, 0, 1, 0], [0, 0, 0, 0]])
+    safe_map = SafeMap(grid_map, [[(1, 0), (1, 1)]])
+    assert safe_map.free_mask().tolist() == [[True, True, False, True], [False, False, True, True]]
+    for i, j in zip(*np.nonzero(safe_map.free_mask())):
+        assert safe_map.intervals[i][j] == [(-1, math.inf, set())]
+
+
+@pytest.mark.parametrize("map_name", ["small", "32room_007"])
+def test_lengths_equal_sipp(map_name):
+    grid_map = Map()
+    grid_map.read_from_file(map_path(map_name))
+    free = np.argwhere(~grid_map.get_cells_array())
+    pairs = np.random.default_rng(5).integers(0, len(free), (10, 2))
+    queries = [tuple(free[a].tolist() + free[b].tolist()) for a, b in pairs]
+    for task in generate_tasks(grid_map, TASKS, SEED):
+        safe_map = SafeMap(grid_map, task)
+        jump_map = JumpMap(safe_map)
+        starts = {tuple(trajectory[0]) for trajectory in task}
+        for query in queries:
+            if query[:2] in starts:
+                continue
+            full = sipp(safe_map, *query, manhattan_distance, SearchTree, compact=True)
+            result = jps_sipp(safe_map, *query, manhattan_distance, SearchTree, compact=True, jump_map=jump_map)
+            assert result[0] == full[0]
+            if result[0]:
+                assert result[1].length == full[1].length
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from src.benchmark import ALGORITHMS, map_path, scen_path
+from src.grid import Map
+from src.path import CompactPath, compact_path
+from src.scenario import iter_scenarios
+from src.utils import make_path
+from src.workload import generate_tasks
+
+
+SEED = 100
+TASKS = 3
+
+
+@pytest.fixture(scope="module")
+def domain():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    queries = [scenario[:4] for _, scenario in zip(range(5), iter_scenarios(scen_path("32room_007"), grid_map=grid_map))]
+    return grid_map, queries, generate_tasks(grid_map, TASKS, SEED)
+
+
+def test_positions_expand_waits():
+    path = CompactPath([0, 0, 1], [0, 1, 1], [0, 1, 4], [0, 3, 4])
+    assert path.length == 4
+    assert path.positions().tolist() == [[0, 0], [0, 1], [0, 1], [0, 1], [1, 1]]
+    assert [path.position(t) for t in (-1, 0, 2, 4, 10)] == [(0, 0), (0, 0), (0, 1), (1, 1), (1, 1)]
+
+
+@pytest.mark.parametrize("algorithm", sorted(ALGORITHMS))
+def test_compact_path_matches_make_path(domain, algorithm):
+    grid_map, queries, tasks = domain
+    build, run, uses_w = ALGORITHMS[algorithm]
+    for task in tasks:
+        search_domain = build(grid_map, task)
+        for query in queries:
+            result = run(search_domain, grid_map, *query, 2.0 if uses_w else 1.0)
+            compact = run(search_domain, grid_map, *query, 2.0 if uses_w else 1.0, compact=True)[1]
+            if not result[0]:
+                assert compact is None
+                continue
+            assert (compact.waypoints() == compact_path(result[1]).waypoints()).all()
+            nodes, length = make_path(result[1])
+            positions = compact.positions()
+            assert compact.length == length
+            assert len(positions) == length + 1
+            assert tuple(positions[0]) == query[:2] and tuple(positions[-1]) == query[2:]
+            assert (np.abs(np.diff(positions, axis=0)).sum(axis=1) <= 1).all()
+            # make_path drops waits at the start cell, the rest of the paths is the same
+            assert positions[-len(nodes):].tolist() == [[node.i, node.j] for node in nodes]
+
+
+@pytest.mark.parametrize("algorithm", sorted(ALGORITHMS))
+def test_lists_are_returned_by_default(domain, algorithm):
+    grid_map, queries, tasks = domain
+    build, run, uses_w = ALGORITHMS[algorithm]
+    search_domain = build(grid_map, tasks[0])
+    result = run(search_domain, grid_map, *queries[0], 2.0 if uses_w else 1.0)
+    assert len(result) == 6 and result[4] is not None and len(result[5]) > 0
+    assert run(search_domain, grid_map, *queries[0], 2.0 if uses_w else 1.0, keep_lists=False)[4:] == (None, None)
@@ -0,0 +1,57 @@
+import gc
+import time
+
+import pytest
+
+from src.benchmark import ALGORITHMS, map_path, scen_path, run_job
+from src.grid import Map
+from src.scenario import iter_scenarios
+from src.workload import generate_tasks
+
+
+MAPS = ("small", "32room_007")
+SEED = 100
+TASKS = 3
+WEIGHT = 2.0
+
+
+_maps = dict()
+
+
+def load(map_name):
+    if not map_name in _maps:
+        grid_map = Map()
+        grid_map.read_from_file(map_path(map_name))
+        query = next(iter_scenarios(scen_path(map_name), grid_map=grid_map))[:4]
+        _maps[map_name] = grid_map, query, generate_tasks(grid_map, TASKS, SEED)
+    return _maps[map_name]
+
+
+@pytest.mark.parametrize("task", range(TASKS))
+@pytest.mark.parametrize("algorithm", sorted(ALGORITHMS))
+@pytest.mark.parametrize("map_name", MAPS)
+def test_planner_performance(map_name, algorithm, task, baseline, calibration):
+    grid_map, query, tasks = load(map_name)
+    w = WEIGHT if ALGORITHMS[algorithm][2] else 1.0
+
+    # warm-up run, then the best of the measured runs without garbage collection
+    result = run_job(grid_map, algorithm, tasks[task], *query, w)
+    runtime = None
+    gc.disable()
+    try:
+        for _ in range(baseline.repeats):
+            start_time = time.perf_counter()
+            run_job(grid_map, algorithm, tasks[task], *query, w)
+            elapsed = time.perf_counter() - start_time
+            runtime = elapsed if runtime is None else min(runtime, elapsed)
+    finally:
+        gc.enable()
+
+    measured = {
+        "found": result["found"],
+        "expansions": result["expansions"],
+        "nodes_created": result["nodes_created"],
+        "length": result["length"],
+        "runtime": round(runtime / calibration, 3),
+    }
+    baseline.check("{}-{}-task{}".format(map_name, algorithm, task), measured)
@@ -0,0 +1,42 @@
+from src.grid import Map, SafeMap
+from src.plancache import PLANNERS, PlanCache
+
+
+def corridor_map():
+    # two corridors, which are connected only at the left end
+    grid_map = Map()
+    grid_map.set_grid_cells(8, 3, [[0] * 8, [0] + [1] * 7, [0] * 8])
+    return grid_map
+
+
+def test_hits_and_per_cell_invalidation():
+    safe_map = SafeMap(corridor_map(), [[(0, 7), (0, 6)]])
+    cache = PlanCache(safe_map)
+    top = cache.plan("sipp", 0, 0, 0, 5)
+    bottom = cache.plan("sipp", 2, 1, 2, 6)
+    assert cache.plan("sipp", 0, 0, 0, 5) is top
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+    # the obstacle in the bottom corridor does not change cells read by the search in the top one
+    safe_map.add_obstacle([(2, 3), (2, 4), (2, 5), (2, 6), (2, 7)])
+    assert cache.plan("sipp", 0, 0, 0, 5) is top
+    replanned = cache.plan("sipp", 2, 1, 2, 6)
+    assert replanned is not bottom
+    assert (replanned[1].waypoints() == PLANNERS["sipp"](safe_map, 2, 1, 2, 6, 1.0)[1].waypoints()).all()
+    stats = cache.stats()
+    assert (stats["invalidations"], stats["hits"], stats["misses"], stats["version"]) == (1, 2, 3, 1)
+
+
+def test_size_bounds():
+    safe_map = SafeMap(corridor_map(), [])
+    cache = PlanCache(safe_map, maxsize=2)
+    for goal_j in range(1, 5):
+        cache.plan("wsipp_d", 0, 0, 0, goal_j, 2.0)
+    assert len(cache) == 2 and cache.stats()["evictions"] == 2
+
+    cache = PlanCache(safe_map, max_cells=10)
+    for goal_j in range(1, 5):
+        cache.plan("sipp", 0, 0, 0, goal_j)
+    # the newest entry is kept even if its footprint alone exceeds the bound
+    assert cache.stats()["cells"] <= 10 or len(cache) == 1
+    assert cache.stats()["evictions"] > 0
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from src.algo.prioritized import prioritized_plan
+from src.algo.sipp import sipp, SearchTree
+from src.benchmark import map_path
+from src.grid import Map, SafeMap, manhattan_distance
+from src.validate import validate_path
+from src.workload import generate_tasks
+
+
+SEED = 5
+AGENTS = 12
+
+
+@pytest.fixture(scope="module")
+def domain():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    task = generate_tasks(grid_map, 1, SEED)[0]
+    starts = {tuple(trajectory[0]) for trajectory in task}
+    free = [cell for cell in map(tuple, np.argwhere(~grid_map.get_cells_array()).tolist()) if not cell in starts]
+    rng = np.random.default_rng(SEED)
+    cells = [free[k] for k in rng.choice(len(free), 2 * AGENTS, replace=False)]
+    agents = [cells[k] + cells[AGENTS + k] for k in range(AGENTS)]
+    return grid_map, task, agents
+
+
+def test_joint_plan_is_conflict_free(domain):
+    grid_map, task, agents = domain
+    paths, stat = prioritized_plan(grid_map, task, agents)
+    assert len(paths) == len(agents)
+    planned = [path for path in paths if path is not None]
+    assert len(planned) > 0
+    for agent, path in enumerate(paths):
+        if path is None:
+            assert agent in stat["failures"]
+            continue
+        assert path[0] == agents[agent][:2] and path[-1] == agents[agent][2:]
+        assert len(path) == stat["lenght"][agent] + 1
+        # obstacles and all other agents (they stay in their goals too): no vertex or swap conflicts
+        others = [other for other in planned if other is not path]
+        assert validate_path(grid_map, task + others, path, stay_at_goal=True) == []
+
+
+def test_goal_is_reached_in_last_interval():
+    grid_map = Map()
+    grid_map.read_from_string(".....", 5, 1)
+    # the obstacle passes the goal (0, 2) at t = 3 and then parks at (0, 4)
+    obstacle = [(0, 4), (0, 3), (0, 3), (0, 2), (0, 3), (0, 4)]
+    agent = (0, 0, 0, 2)
+
+    plain = sipp(SafeMap(grid_map, [obstacle]), *agent, manhattan_distance, SearchTree, compact=True)
+    assert plain[0] and plain[1].length == 2
+
+    paths, stat = prioritized_plan(grid_map, [obstacle], [agent])
+    assert stat["wasFind"] == [True]
+    assert len(paths[0]) == 5 and paths[0][-1] == (0, 2)
+    assert validate_path(grid_map, [obstacle], paths[0], stay_at_goal=True) == []
+
+
+def test_goal_occupied_forever_fails():
+    grid_map = Map()
+    grid_map.read_from_string(".....", 5, 1)
+    paths, stat = prioritized_plan(grid_map, [[(0, 4), (0, 3), (0, 2)]], [(0, 0, 0, 2)])
+    assert paths == [None]
+    assert stat["failures"] == [0]
@@ -0,0 +1,74 @@
+from src.algo.sipp import sipp, SearchTree
+from src.benchmark import map_path
+from src.grid import Map, SafeMap, manhattan_distance
+from src.refcache import map_hash, obstacles_hash, ReferenceCostCache
+from src.workload import generate_tasks
+
+
+QUERY = (1, 1, 12, 20)
+
+
+def small_map():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("small"))
+    return grid_map
+
+
+def test_hit_and_miss(tmp_path):
+    grid_map = small_map()
+    task = generate_tasks(grid_map, 3, 1)[2]
+    cache = ReferenceCostCache(str(tmp_path / "costs.sqlite"))
+    assert cache.get(grid_map, task, *QUERY) is None
+
+    cost = cache.reference_cost(grid_map, task, *QUERY)
+    full = sipp(SafeMap(grid_map, task), *QUERY, manhattan_distance, SearchTree, compact=True)
+    assert full[0] and cost == full[1].length
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.reference_cost(grid_map, task, *QUERY) == cost
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.get(grid_map, task, *QUERY) == (True, cost)
+
+    # an absent path is cached too: (0, 3) is blocked
+    assert cache.reference_cost(grid_map, task, 1, 1, 0, 3) is None
+    assert cache.reference_cost(grid_map, task, 1, 1, 0, 3) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert cache.get(grid_map, task, 1, 1, 0, 3) == (False, None)
+    cache.close()
+
+
+def test_changed_map_or_obstacles_miss(tmp_path):
+    grid_map = small_map()
+    tasks = generate_tasks(grid_map, 3, 1)
+    cache = ReferenceCostCache(str(tmp_path / "costs.sqlite"))
+    cache.reference_cost(grid_map, tasks[2], *QUERY)
+
+    assert obstacles_hash(tasks[2]) != obstacles_hash(tasks[2][::-1])
+    assert cache.get(grid_map, tasks[1], *QUERY) is None
+    assert cache.get(grid_map, tasks[2][::-1], *QUERY) is None
+    cache.reference_cost(grid_map, tasks[1], *QUERY)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # the same cells give the same hash, one more blocked cell -- another one
+    assert map_hash(small_map()) == map_hash(grid_map)
+    assert cache.get(small_map(), tasks[2], *QUERY) is not None
+    cells = grid_map.get_cells_array().astype(int).tolist()
+    cells[14][0] = 1
+    changed = Map()
+    changed.set_grid_cells(30, 15, cells)
+    assert map_hash(changed) != map_hash(grid_map)
+    assert cache.get(changed, tasks[2], *QUERY) is None
+    cache.close()
+
+
+def test_reopened_database_keeps_costs(tmp_path):
+    path = str(tmp_path / "costs.sqlite")
+    grid_map = small_map()
+    task = generate_tasks(grid_map, 3, 1)[2]
+    cache = ReferenceCostCache(path)
+    cost = cache.reference_cost(grid_map, task, *QUERY)
+    cache.close()
+
+    cache = ReferenceCostCache(path)
+    assert cache.reference_cost(small_map(), task, *QUERY) == cost
+    assert (cache.hits, cache.misses) == (1, 0)
+    cache.close()
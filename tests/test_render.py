@@ -0,0 +1,81 @@
+import struct
+import zlib
+
+import numpy as np
+
+from src.grid import Map
+from src.render import BORDER, FREE_COLOR, STATIC_COLOR, iter_frames, render_background, write_animation
+
+
+def read_apng(path):
+    '''
+    Decodes an APNG written by APNGWriter (8-bit RGB, "up" filter, frames without disposal and blending).
+    '''
+    with open(path, "rb") as png_file:
+        data = png_file.read()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    frames = []
+    canvas = None
+    region = None
+    offset = 8
+    while offset < len(data):
+        length, kind = struct.unpack(">I4s", data[offset:offset + 8])
+        body = data[offset + 8:offset + 8 + length]
+        assert struct.unpack(">I", data[offset + 8 + length:offset + 12 + length])[0] == zlib.crc32(kind + body)
+        offset += 12 + length
+        if kind == b"IHDR":
+            width, height = struct.unpack(">II", body[:8])
+            canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        elif kind == b"fcTL":
+            region = struct.unpack(">IIIII", body[:20])[1:]
+        elif kind in (b"IDAT", b"fdAT"):
+            width, height, left, top = region
+            scanlines = np.frombuffer(zlib.decompress(body if kind == b"IDAT" else body[4:]), dtype=np.uint8)
+            scanlines = scanlines.reshape(height, 1 + 3 * width)
+            assert (scanlines[:, 0] == 2).all()
+            pixels = np.cumsum(scanlines[:, 1:], axis=0, dtype=np.uint8)
+            canvas[top:top + height, left:left + width] = pixels.reshape(height, width, 3)
+            frames.append(canvas.copy())
+    return frames
+
+
+def make_domain():
+    grid_map = Map()
+    grid_map.read_from_string("...#\n.#..\n....", 4, 3)
+    dyn_obst_traj = [[(2, 3), (2, 2), (2, 1), (2, 2)]]
+    path = [(0, 0), (1, 0), (2, 0), (2, 0)]
+    return grid_map, dyn_obst_traj, path
+
+
+def test_background():
+    grid_map, _, _ = make_domain()
+    background = render_background(grid_map, 5)
+    assert background.shape == (15, 20, 3)
+    assert (background[5:10, 5:10] == STATIC_COLOR).all()
+    assert (background[:5, :5] == FREE_COLOR).all()
+
+
+def test_frames():
+    grid_map, dyn_obst_traj, path = make_domain()
+    frames = list(iter_frames(grid_map, dyn_obst_traj, path, (200, 0, 0), k=10, quality=3))
+    assert len(frames) == len(path) * 3
+    assert all(frame.shape == (30 + 2 * BORDER, 40 + 2 * BORDER, 3) for frame in frames)
+    assert any((frame == (200, 0, 0)).all(axis=2).any() for frame in frames)
+    # sprites are interpolated between the steps
+    assert not (frames[0] == frames[1]).all()
+
+    cropped = list(iter_frames(grid_map, dyn_obst_traj, path, (200, 0, 0), k=10, quality=3, viewport=0))
+    assert len(cropped) == len(frames)
+    assert all(frame.shape == (10 + 2 * BORDER, 10 + 2 * BORDER, 3) for frame in cropped)
+
+
+def test_animation_decodes_to_frames(tmp_path):
+    grid_map, dyn_obst_traj, path = make_domain()
+    frames = list(iter_frames(grid_map, dyn_obst_traj, path, (200, 0, 0), k=8, quality=2))
+    # a repeated frame is written as well
+    frames.append(frames[-1])
+    write_animation(str(tmp_path / "animation.png"), iter(frames), len(frames), delay_ms=50)
+    decoded = read_apng(str(tmp_path / "animation.png"))
+    assert len(decoded) == len(frames)
+    for frame, pixels in zip(frames, decoded):
+        assert (frame == pixels).all()
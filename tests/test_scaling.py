@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from src.scaling import BASE_CASE, TOPOLOGIES, case_id, generate_grid, generate_obstacles, generate_queries, \
+    iter_cases, run_case
+
+
+def test_ids_are_stable():
+    assert case_id(BASE_CASE) == "random-64-r0.2-s0/n20-v1-p8-h200-s0"
+    case = BASE_CASE._replace(speed=0.25, ratio=0.0, seed=3)
+    assert case_id(case) == "random-64-r0-s3/n20-v0.25-p8-h200-s3"
+    # every case of the sweep is different (the base value of every axis is repeated once per axis)
+    ids = [case_id(case) for _, case in iter_cases()]
+    assert len(set(ids)) == len(ids) - 6
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+def test_generation_is_stable_for_seed(topology):
+    grids = [generate_grid(64, 0.2, topology, seed) for seed in (1, 1, 2)]
+    assert grids[0].shape == (64, 64) and grids[0].dtype == bool
+    assert (grids[0] == grids[1]).all()
+    assert not (grids[0] == grids[2]).all()
+
+    obstacles = [generate_obstacles(grids[0], 10, 0.5, 8, 50, seed) for seed in (1, 1)]
+    assert obstacles[0] == obstacles[1]
+    assert len(obstacles[0]) == 10 and all(len(trajectory) == 50 for trajectory in obstacles[0])
+    for trajectory in obstacles[0]:
+        cells = np.array(trajectory)
+        assert not grids[0][cells[:, 0], cells[:, 1]].any()
+        assert (np.abs(np.diff(cells, axis=0)).sum(axis=1) <= 1).all()
+
+    queries = generate_queries(grids[0], 5, 1, obstacles[0])
+    assert queries == generate_queries(grids[0], 5, 1, obstacles[0])
+    starts = {trajectory[0] for trajectory in obstacles[0]}
+    for start_i, start_j, goal_i, goal_j in queries:
+        assert not grids[0][start_i, start_j] and not grids[0][goal_i, goal_j]
+        assert not (start_i, start_j) in starts and (start_i, start_j) != (goal_i, goal_j)
+
+
+def test_run_case_rows():
+    case = BASE_CASE._replace(size=32, count=5, horizon=40)
+    rows = run_case(("count", case, "sipp", 1.0, 3, False))
+    assert [row["query"] for row in rows] == [0, 1, 2]
+    for row in rows:
+        assert row["case"] == case_id(case) and row["value"] == 5
+        assert row["peak_memory"] is None
+    assert [row["expansions"] for row in rows] == [row["expansions"] for row in run_case(("count", case, "sipp", 1.0, 3, False))]
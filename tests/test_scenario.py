@@ -0,0 +1,44 @@
+import os
+
+from src.benchmark import map_path, scen_path
+from src.grid import Map
+from src.scenario import iter_scenarios, Scenario
+
+
+# MovingAI format: bucket, map, width, height, start x, start y, goal x, goal y, optimal length
+SCEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "small.map.scen")
+
+
+def indices(**kwargs):
+    return [scenario.index for scenario in iter_scenarios(SCEN_PATH, **kwargs)]
+
+
+def test_moving_ai_format():
+    scenarios = list(iter_scenarios(SCEN_PATH))
+    assert len(scenarios) == 5
+    # x is a column and y is a row
+    assert scenarios[0] == Scenario(0, 1, 12, 2, 0, "small.map", 30, 15, 12.0, 0)
+    assert scenarios[1][:4] == (13, 29, 13, 16)
+    assert [scenario.bucket for scenario in scenarios] == [0, 0, 1, 1, 2]
+
+
+def test_legacy_format():
+    scenario = next(iter_scenarios(scen_path("small")))
+    assert scenario == Scenario(1, 28, 0, 1, 0, None, None, None, None, 0)
+
+
+def test_filters():
+    assert indices(buckets=[1]) == [2, 3]
+    assert indices(start=1, stop=3) == [1, 2]
+    assert indices(buckets=[0, 2], start=1) == [1, 4]
+
+    grid_map = Map()
+    grid_map.read_from_file(map_path("small"))
+    # the start (0, 3) is blocked, the start x = 40 is outside of the map
+    assert indices(grid_map=grid_map) == [0, 1, 4]
+
+    assert indices(sample=1.0) == [0, 1, 2, 3, 4]
+    assert indices(sample=0.0) == []
+    sampled = indices(sample=0.5, seed=3)
+    assert sampled == indices(sample=0.5, seed=3)
+    assert set(sampled) <= {0, 1, 2, 3, 4}
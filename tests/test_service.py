@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from src.benchmark import map_path
+from src.grid import Map, SafeMap
+from src.plancache import PLANNERS
+from src.service import PlanningClient, PlanningService
+from src.workload import generate_tasks
+
+
+QUERIES = [(0, 0, 14, 29), (0, 9, 2, 24), (1, 27, 0, 0), (14, 29, 0, 27)]
+
+
+def load():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("small"))
+    task = generate_tasks(grid_map, 3, 100)[2]
+    starts = {tuple(trajectory[0]) for trajectory in task}
+    queries = [query for query in QUERIES if not query[:2] in starts]
+    return grid_map, task, queries
+
+
+def test_service_in_process_and_socket():
+    grid_map, task, queries = load()
+    safe_map = SafeMap(grid_map, task)
+    expected = [PLANNERS["sipp"](safe_map, *query, 1.0) for query in queries]
+
+    async def scenario():
+        async with PlanningService(workers=1, batch_window=0.05) as service:
+            service.register_map("small", grid_map, task)
+
+            # concurrent requests are coalesced into batches
+            results = await asyncio.gather(*(service.plan("small", "sipp", *query) for query in queries * 4))
+            for result, (found, path) in zip(results, [result[:2] for result in expected] * 4):
+                assert result["status"] == ("ok" if found else "not_found")
+                if found:
+                    assert result["waypoints"] == path.waypoints().tolist()
+            metrics = service.metrics()
+            assert metrics["requests"] == len(results) and metrics["batches"] < len(results)
+            assert metrics["p50_ms"] <= metrics["p99_ms"] and metrics["queue_depth"] == 0 and metrics["in_flight"] == 0
+            # the map is shipped to the only worker once, later batches send only its id and version
+            assert metrics["map_loads"] == 1
+
+            # an expired deadline is answered without waiting for the search
+            assert (await service.plan("small", "sipp", *queries[0], timeout=0))["status"] == "timeout"
+
+            server = await service.serve("127.0.0.1", 0)
+            async with server:
+                client = await PlanningClient.connect(*server.sockets[0].getsockname()[:2])
+                remote = await asyncio.gather(*(client.plan("small", "wsipp_d", *query, 2.0) for query in queries))
+                assert [result["status"] for result in remote] == [result["status"] for result in results[:len(queries)]]
+                assert (await client.metrics())["requests"] == len(results) + 1 + len(queries)
+                assert (await client.plan("unknown", "sipp", 0, 0, 1, 1))["status"] == "error"
+                await client.close()
+
+                # malformed lines are answered by errors, the connection stays open
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                for line in (b"{not json\n", b"[1, 2]\n", b'{"id": 7, "op": "metrics"}\n'):
+                    writer.write(line)
+                responses = [json.loads(await reader.readline()) for _ in range(3)]
+                assert [response["status"] for response in responses[:2]] == ["error", "error"]
+                assert responses[0]["id"] is None and responses[2]["id"] == 7
+                writer.close()
+                await writer.wait_closed()
+
+            # a new version of the map is shipped again
+            service.register_map("small", grid_map, task[:1])
+            assert (await service.plan("small", "sipp", *queries[0]))["status"] in ("ok", "not_found")
+            assert service.metrics()["map_loads"] == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,51 @@
+import pytest
+
+from src.benchmark import ALGORITHMS, map_path
+from src.grid import Map
+from src.stats import SearchStats
+from src.workload import generate_tasks
+
+
+SEED = 100
+QUERY = (1, 1, 25, 28)
+
+
+@pytest.fixture(scope="module")
+def domain():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"), 32)
+    return grid_map, generate_tasks(grid_map, 1, SEED)[0]
+
+
+@pytest.mark.parametrize("algorithm", sorted(ALGORITHMS))
+def test_counters_match_search(domain, algorithm):
+    grid_map, task = domain
+    build, run, uses_w = ALGORITHMS[algorithm]
+    w = 2.0 if uses_w else 1.0
+    search_domain = build(grid_map, task)
+    plain = run(search_domain, grid_map, *QUERY, w)
+    assert plain[0]
+
+    stats = SearchStats(timers=True)
+    result = run(search_domain, grid_map, *QUERY, w, stats)
+    assert result[0] == plain[0] and result[2:4] == plain[2:4]
+    counters = stats.as_dict()
+    assert counters["generated"] == result[3] - 1
+    assert 0 < counters["expansions"] <= result[2]
+    assert counters["pops"] >= counters["expansions"]
+    if algorithm == "astar_timesteps":
+        assert counters["collision_checks"] > 0 and counters["interval_lookups"] == 0
+    else:
+        assert counters["interval_lookups"] > 0 and counters["collision_checks"] == 0
+    assert counters["other_ns"] >= 0
+    assert counters["search_ns"] >= counters["neighbors_ns"] + counters["open_ns"] + counters["closed_ns"]
+
+    # the instrumentation is removed after the search, later searches without stats do not change the counters
+    assert run(search_domain, grid_map, *QUERY, w)[2:4] == plain[2:4]
+    assert stats.as_dict() == counters
+
+    # counters are accumulated over searches
+    run(search_domain, grid_map, *QUERY, w, stats)
+    again = stats.as_dict()
+    for name in SearchStats.COUNTERS:
+        assert again[name] == 2 * counters[name]
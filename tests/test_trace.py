@@ -0,0 +1,38 @@
+import pytest
+
+from src.algo.sipp import sipp, SearchTree
+from src.benchmark import map_path
+from src.grid import Map, SafeMap, manhattan_distance
+from src.stats import SearchStats
+from src.trace import EXPAND, GENERATE, TraceBuffer, TraceFile, _TraceSink, read_trace
+from src.workload import generate_tasks
+
+
+QUERY = (1, 1, 25, 28)
+
+
+def test_sink_is_abstract():
+    with pytest.raises(TypeError):
+        _TraceSink()
+
+
+def test_trace_matches_stats(tmp_path):
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"), 32)
+    safe_map = SafeMap(grid_map, generate_tasks(grid_map, 1, 100)[0])
+    attributes = dict(vars(safe_map))
+    stats = SearchStats()
+    buffer = TraceBuffer(capacity=16, chunk_size=8)
+    result = sipp(safe_map, *QUERY, manhattan_distance, SearchTree, stats=stats, trace=buffer)
+    assert result[0]
+    # hooks are installed on copies, the SafeMap is not changed
+    assert vars(safe_map) == attributes
+
+    records = buffer.records
+    assert (records["event"] == EXPAND).sum() == stats.expansions
+    assert (records["event"] == GENERATE).sum() == stats.pushes
+    assert records["step"][-1] == stats.expansions - 1
+
+    with TraceFile(str(tmp_path / "trace.bin")) as trace_file:
+        sipp(safe_map, *QUERY, manhattan_distance, SearchTree, trace=trace_file)
+    assert (read_trace(str(tmp_path / "trace.bin")) == records).all()
@@ -0,0 +1,58 @@
+import pytest
+
+from src.benchmark import ALGORITHMS, map_path, scen_path
+from src.grid import Map
+from src.path import CompactPath
+from src.scenario import iter_scenarios
+from src.validate import Conflict, ObstacleIndex, validate_path
+from src.workload import generate_tasks
+
+
+SEEDS = (100, 101, 102)
+TASKS = 4
+QUERIES = 5
+
+
+def open_map(height, width):
+    grid_map = Map()
+    grid_map.set_grid_cells(width, height, [[0] * width for _ in range(height)])
+    return grid_map
+
+
+def test_conflicts():
+    grid_map = open_map(3, 3)
+    grid_map.set_grid_cells(3, 3, [[0, 0, 0], [0, 1, 0], [0, 0, 0]])
+    assert validate_path(grid_map, [], [(0, 0), (0, 1), (1, 1), (1, 3)]) == [
+        Conflict("static", 2, 1, 1, -1), Conflict("jump", 2, 1, 1, -1), Conflict("static", 3, 1, 3, -1)]
+    assert validate_path(grid_map, [[(0, 1), (0, 0)]], [(0, 0), (0, 1)]) == [Conflict("swap", 0, 0, 0, 0)]
+    # the obstacle stays in the last cell of its trajectory
+    assert validate_path(grid_map, [[(2, 2), (2, 1)]], [(2, 0), (2, 0), (2, 0), (2, 1)]) == [Conflict("vertex", 3, 2, 1, 0)]
+    assert validate_path(grid_map, [[(0, 2), (0, 2), (0, 2), (0, 1)]], [(0, 0), (0, 1)]) == []
+    assert validate_path(grid_map, [[(0, 2), (0, 2), (0, 2), (0, 1)]], [(0, 0), (0, 1)], stay_at_goal=True) == \
+        [Conflict("vertex", 3, 0, 1, 0)]
+    # waits of a compact path are expanded, its time starts at the arrival to the first waypoint
+    path = CompactPath([0, 0], [0, 1], [2, 5], [4, 5])
+    assert validate_path(grid_map, ObstacleIndex([[(2, 2)] * 5 + [(0, 1)]], 3), path) == [Conflict("vertex", 5, 0, 1, 0)]
+    assert validate_path(grid_map, [[(1, 0)] * 4 + [(0, 0)]], path) == [Conflict("vertex", 4, 0, 0, 0)]
+
+
+@pytest.mark.parametrize("map_name", ["small", "32room_007"])
+def test_planners_return_valid_paths(map_name):
+    grid_map = Map()
+    grid_map.read_from_file(map_path(map_name))
+    queries = [scenario[:4] for _, scenario in zip(range(QUERIES), iter_scenarios(scen_path(map_name), grid_map=grid_map))]
+    for seed in SEEDS:
+        # the first task has no obstacles
+        for task in generate_tasks(grid_map, TASKS, seed)[1:]:
+            obstacles = ObstacleIndex(task, grid_map.get_size()[1])
+            for query in queries:
+                if any(tuple(trajectory[0]) == query[:2] for trajectory in task):
+                    continue  # the start is occupied at time 0
+                lengths = dict()
+                for algorithm, (build, run, uses_w) in ALGORITHMS.items():
+                    result = run(build(grid_map, task), grid_map, *query, 2.0 if uses_w else 1.0, compact=True)
+                    lengths[algorithm] = result[1].length if result[0] else None
+                    if result[0]:
+                        assert validate_path(grid_map, obstacles, result[1]) == [], (algorithm, seed, query)
+                # both are optimal
+                assert lengths["sipp"] == lengths["astar_timesteps"], (seed, query)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from src.algo.sipp import sipp, SearchTree
+from src.algo.windowed_sipp import WindowedSafeMap, windowed_sipp
+from src.benchmark import map_path
+from src.grid import Map, SafeMap, manhattan_distance
+from src.validate import ObstacleIndex, validate_path
+from src.workload import generate_tasks
+
+
+SEED = 11
+TASKS = 4
+
+
+@pytest.fixture(scope="module")
+def domain():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("32room_007"))
+    free = np.argwhere(~grid_map.get_cells_array())
+    pairs = np.random.default_rng(3).integers(0, len(free), (10, 2))
+    queries = [tuple(free[a].tolist() + free[b].tolist()) for a, b in pairs]
+    return grid_map, queries, generate_tasks(grid_map, TASKS, SEED)[1:]
+
+
+def test_window_is_collision_free(domain):
+    grid_map, queries, tasks = domain
+    for task in tasks:
+        safe_map = SafeMap(grid_map, task)
+        obstacles = ObstacleIndex(task, grid_map.get_size()[1])
+        starts = {tuple(trajectory[0]) for trajectory in task}
+        for window in (1, 8, 32):
+            windowed_map = WindowedSafeMap(safe_map, window)
+            for query in queries:
+                if query[:2] in starts:
+                    continue
+                full = sipp(safe_map, *query, manhattan_distance, SearchTree, compact=True)
+                result = windowed_sipp(windowed_map, *query, window, manhattan_distance, SearchTree, compact=True)
+                # obstacles after the window are ignored (also the parked ones), so every path of sipp is feasible
+                assert result[0] or not full[0]
+                if not result[0]:
+                    continue
+                # the first window positions avoid every obstacle
+                assert validate_path(grid_map, obstacles, result[1].positions()[:window]) == []
+                if full[0]:
+                    assert result[1].length <= full[1].length
+
+
+def test_large_window_avoids_moving_obstacles(domain):
+    grid_map, queries, tasks = domain
+    task = tasks[-1]
+    safe_map = SafeMap(grid_map, task)
+    obstacles = ObstacleIndex(task, grid_map.get_size()[1])
+    starts = {tuple(trajectory[0]) for trajectory in task}
+    window = max(len(trajectory) for trajectory in task) + 1
+    windowed_map = WindowedSafeMap(safe_map, window)
+    assert windowed_map.window == window
+    for query in queries:
+        if query[:2] in starts:
+            continue
+        full = sipp(safe_map, *query, manhattan_distance, SearchTree, compact=True)
+        result = windowed_sipp(windowed_map, *query, window, manhattan_distance, SearchTree, compact=True)
+        assert result[0] or not full[0]
+        if not result[0]:
+            continue
+        # the window covers all moves of the obstacles, only the cells, where they park, may be entered after it
+        positions = result[1].positions()
+        assert validate_path(grid_map, obstacles, positions[:window]) == []
+        if full[0]:
+            assert result[1].length <= full[1].length
+
+
+def test_only_visited_rows_are_copied(domain):
+    grid_map, _, tasks = domain
+    safe_map = SafeMap(grid_map, tasks[0])
+    windowed_map = WindowedSafeMap(safe_map, 8)
+    visited = {i for trajectory in tasks[0] for (i, _) in trajectory}
+    for i, row in enumerate(windowed_map.intervals):
+        assert (row is safe_map.intervals[i]) == (i not in visited)
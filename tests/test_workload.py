@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from src.benchmark import map_path
+from src.grid import Map
+from src.workload import generate_task_walks, generate_tasks, main, save_task_store, TaskStore
+
+
+SEED = 12
+TASKS = 4
+
+
+@pytest.fixture(scope="module")
+def grid_map():
+    grid_map = Map()
+    grid_map.read_from_file(map_path("small"))
+    return grid_map
+
+
+def test_store_round_trip(grid_map, tmp_path):
+    path = str(tmp_path / "tasks")
+    save_task_store(path, generate_task_walks(grid_map, TASKS, SEED), repeats=3, seed=SEED)
+    store = TaskStore(path)
+    assert len(store) == TASKS
+    assert (store.seed, store.repeats) == (SEED, 3)
+
+    walks, lengths = store.walks(2)
+    assert isinstance(walks, np.memmap) and not walks.flags.writeable
+    assert len(walks) == len(lengths) == 6
+    # the stored tasks are the generated ones, loaded one by one
+    assert list(store) == generate_tasks(grid_map, TASKS, SEED, repeats=3)
+    assert store[0] == []
+    with pytest.raises(IndexError):
+        store.walks(TASKS)
+    store.close()
+
+
+def test_cli_writes_store(grid_map, tmp_path):
+    path = str(tmp_path / "tasks")
+    main(["--map", "small", "--tasks", "2", "--seed", str(SEED), "--output", path])
+    store = TaskStore(path)
+    assert store.seed == SEED and store.repeats == 100
+    assert list(store) == generate_tasks(grid_map, 2, SEED)
+    store.close()